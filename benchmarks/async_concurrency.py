@@ -0,0 +1,149 @@
+"""
+Throughput of the read endpoints served by gunicorn with sync WSGI workers versus
+uvicorn ASGI workers running the async views, at increasing numbers of concurrent
+clients. Both servers are started from gunicorn.conf.py with SERVER_INTERFACE set,
+against a scratch database seeded by this script.
+
+    python -m benchmarks.async_concurrency --concurrency 10 100 500 --endpoint expenses
+
+Needs gunicorn, uvicorn and uvicorn-worker (see requirements.txt). The scratch
+database defaults to a SQLite file, pass --database-url to use PostgreSQL instead.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.utils import ROOT_DIR, setup_django
+
+ENDPOINTS = {
+    'expenses': '/api/groups/{group_id}/expenses/',
+    'groups': '/api/groups/',
+    'settle': '/api/groups/{group_id}/settle/',
+}
+
+
+def seed(members, expenses):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import AccessToken
+    from expenses.balances import rebuild_group_balances
+    from expenses.models import Expense, Group
+    from expenses.splits import get_membership_snapshot
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(username='bench-async', password='password123')
+    others = User.objects.bulk_create([User(username=f'bench-async-{i}') for i in range(members - 1)])
+    group = Group.objects.create(name='Bench async', owner=user)
+    group.members.add(user, *others)
+    payers = [user] + others
+
+    snapshot = get_membership_snapshot(group.id, payers)
+    Expense.objects.bulk_create([
+        Expense(group=group, description=f'Expense {i}', amount=Decimal('10.00') + i % 50, paid_by=payers[i % len(payers)], snapshot=snapshot)
+        for i in range(expenses)
+    ])
+    rebuild_group_balances([group.id])
+    return group.id, str(AccessToken.for_user(user))
+
+
+def start_server(interface, port, workers, env):
+    server_env = dict(env, SERVER_INTERFACE=interface)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)],
+        cwd=ROOT_DIR, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(request_once('127.0.0.1', port, '/api/groups/', None))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{interface} server did not start")
+
+
+async def request_once(host, port, path, token):
+    """
+    One GET on a fresh connection; returns the status code, or None when the server
+    dropped the connection.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    headers = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+    if token:
+        headers += f"Authorization: Bearer {token}\r\n"
+    writer.write((headers + "\r\n").encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    if not response:
+        return None
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, path, token, clients, requests_per_client):
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                status = await request_once('127.0.0.1', port, path, token)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--requests-per-client', type=int, default=10)
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='expenses')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--expenses', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--database-url', default='sqlite:////tmp/bench-async-concurrency.sqlite3')
+    args = parser.parse_args()
+
+    if args.database_url.startswith('sqlite:///') and os.path.exists(args.database_url[len('sqlite:///'):]):
+        os.remove(args.database_url[len('sqlite:///'):])
+    env = dict(os.environ, DATABASE_URL=args.database_url, DEBUG='False', ALLOWED_HOSTS='127.0.0.1 localhost')
+    env.setdefault('SECRET_KEY', 'benchmark-only-secret-key')
+    os.environ.update(env)
+    setup_django()
+    group_id, token = seed(args.members, args.expenses)
+    path = ENDPOINTS[args.endpoint].format(group_id=group_id)
+
+    print(f"GET {path} ({args.expenses} expenses), {args.workers} worker(s)")
+    print(f"{'server':>6} {'clients':>7} | {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+    for interface in ('wsgi', 'asgi'):
+        server = start_server(interface, args.port, args.workers, env)
+        try:
+            for clients in args.concurrency:
+                latencies, errors, elapsed = asyncio.run(load(args.port, path, token, clients, args.requests_per_client))
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000
+                p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+                print(f"{interface:>6} {clients:>7} | {len(latencies) / elapsed:>8.0f} {p50:>8.1f} {p95:>8.1f} {errors:>6}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Settlement plans for many groups: the sequential per-group loop (one ledger query and
+one plan per group, as a script calling calculate_settlement_plan() would) against
+expenses.batch (chunked ledger queries, large groups planned in worker processes).
+
+    python -m benchmarks.batch_settlement --groups 10000 --workers 1 4
+
+Every group gets random zero-sum balances written straight into the GroupMemberBalance
+ledger; --large-every groups get --large-members balances instead of 3 to 12.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.utils import setup_django, test_database
+
+
+def seed(group_count, large_every, large_members):
+    from django.contrib.auth.models import User
+    from expenses.models import Group, GroupMemberBalance
+    from expenses.settlement import from_cents
+
+    rng = random.Random(42)
+    owner = User.objects.create_user(username='bench-owner', password='password123')
+    users = User.objects.bulk_create([User(username=f'bench-member-{i}') for i in range(max(large_members, 12))])
+    groups = Group.objects.bulk_create([Group(name=f'Bench group {i}', owner=owner) for i in range(group_count)])
+
+    rows = []
+    for index, group in enumerate(groups):
+        size = large_members if large_every and index % large_every == 0 else rng.randint(3, 12)
+        cents = [rng.randint(-50000, 50000) for _ in range(size - 1)]
+        cents.append(-sum(cents))
+        rows.extend(
+            GroupMemberBalance(group=group, user=user, balance=from_cents(amount))
+            for user, amount in zip(rng.sample(users, size), cents)
+        )
+    GroupMemberBalance.objects.bulk_create(rows, batch_size=5000)
+    return [group.pk for group in groups]
+
+
+def sequential(group_ids, mode):
+    from expenses.views import calculate_settlement_plan
+
+    for group_id in group_ids:
+        calculate_settlement_plan(group_id, mode)
+    return len(group_ids)
+
+
+def batch(group_ids, mode, chunk_size, workers):
+    from expenses.batch import iter_batch_plans
+
+    return sum(1 for _ in iter_batch_plans(group_ids, mode, chunk_size, workers))
+
+
+def count_queries(func):
+    """
+    benchmarks.utils.count_queries() without its 9000 query cap.
+    """
+    from django.db import connection
+
+    queries = 0
+
+    def counter(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        return func(), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--groups', type=int, default=10000)
+    parser.add_argument('--large-every', type=int, default=500, help="Every Nth group is large (0: none).")
+    parser.add_argument('--large-members', type=int, default=3000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--modes', nargs='+', default=['greedy', 'optimal'])
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        group_ids = seed(args.groups, args.large_every, args.large_members)
+        print(f"{args.groups} groups, every {args.large_every}th with {args.large_members} balances, 3-12 otherwise")
+        for mode in args.modes:
+            runs = [('sequential loop', lambda: sequential(group_ids, mode))]
+            runs += [(f'batch, {workers} worker(s)', lambda workers=workers: batch(group_ids, mode, args.chunk_size, workers)) for workers in args.workers]
+            for label, run in runs:
+                start = time.perf_counter()
+                groups, queries = count_queries(run)
+                elapsed = time.perf_counter() - start
+                print(f"{mode:>8} {label:>20}: {queries:>6} queries {elapsed:>8.2f} s {groups / elapsed:>9.0f} groups/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Render time of a large expense list response with DRF's JSONRenderer versus
+FastJSONRenderer, plus parse time of a matching bulk-import body with JSONParser
+versus FastJSONParser. Serialization (ExpenseSerializer) is timed once for scale;
+it is the same for both renderers.
+
+    python -m benchmarks.json_rendering --expenses 5000 --members 8
+"""
+import argparse
+import json
+import statistics
+import time
+from decimal import Decimal
+from io import BytesIO
+
+from benchmarks.utils import setup_django, test_database
+
+
+def seed(member_count, expense_count):
+    from django.contrib.auth.models import User
+    from expenses.allocation import SHARES
+    from expenses.models import Expense, ExpenseSplit, Group
+    from expenses.splits import build_splits, get_membership_snapshot
+
+    owner = User.objects.create_user(username='bench-owner', password='password123')
+    members = [owner] + User.objects.bulk_create([User(username=f'bench-Zoë-{i}') for i in range(member_count - 1)])
+    group = Group.objects.create(name='Bench group', owner=owner)
+    group.members.add(*members)
+    snapshot = get_membership_snapshot(group.id, members)
+
+    # One in ten expenses is split by shares and keeps split rows, the rest are equal splits.
+    expenses = Expense.objects.bulk_create([
+        Expense(group=group, description=f'Expense {i} — dinner', amount=Decimal('12.34') + i % 97,
+                paid_by=members[i % member_count], split_mode=SHARES if i % 10 == 0 else 'equal',
+                snapshot=None if i % 10 == 0 else snapshot)
+        for i in range(expense_count)
+    ])
+    weights = [Decimal(index + 1) for index in range(member_count)]
+    splits = []
+    for expense in expenses[::10]:
+        splits.extend(build_splits(expense, SHARES, members, weights))
+    ExpenseSplit.objects.bulk_create(splits, batch_size=5000)
+    return group
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--members', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from expenses.renderers import FastJSONParser, FastJSONRenderer
+    from expenses.serializers import ExpenseSerializer
+    from expenses.splits import prefetch_splits
+    from expenses.views import expense_queryset
+
+    with test_database():
+        group = seed(args.members, args.expenses)
+        expenses = list(expense_queryset().filter(group=group).order_by('-created_at', '-id'))
+        prefetch_splits(expenses)
+
+        start = time.perf_counter()
+        data = ExpenseSerializer(expenses, many=True).data
+        serialize_time = time.perf_counter() - start
+        print(f"{len(data)} expenses, ExpenseSerializer: {serialize_time * 1000:.1f} ms")
+
+        rendered = {}
+        print(f"{'':>20} {'min ms':>8} {'p50 ms':>8} {'MB':>6}")
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            content, best, median = best_of(args.repeat, renderer.render, data)
+            rendered[type(renderer).__name__] = content
+            print(f"{type(renderer).__name__:>20} {best * 1000:>8.2f} {median * 1000:>8.2f} {len(content) / 1e6:>6.2f}")
+        print(f"identical output: {rendered['JSONRenderer'] == rendered['FastJSONRenderer']}")
+
+        body = json.dumps({'expenses': [
+            {'description': row['description'], 'amount': row['amount'], 'paid_by': row['paid_by']['id'], 'created_at': row['created_at']}
+            for row in data
+        ]}).encode()
+        for json_parser in (JSONParser(), FastJSONParser()):
+            _, best, median = best_of(args.repeat, lambda: json_parser.parse(BytesIO(body)))
+            print(f"{type(json_parser).__name__:>20} {best * 1000:>8.2f} {median * 1000:>8.2f} {len(body) / 1e6:>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
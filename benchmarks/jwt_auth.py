@@ -0,0 +1,99 @@
+"""
+Per-request latency of a cheap authenticated endpoint (a settle-up 304 served from
+the plan cache) with simplejwt's JWTAuthentication versus CachedJWTAuthentication.
+Requests go through the full Django/DRF stack with a real Bearer token; --threads
+runs that many clients concurrently.
+
+    python -m benchmarks.jwt_auth --requests 2000 --threads 1 8
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.utils import count_queries, setup_django, test_database
+
+
+def seed():
+    from django.contrib.auth.models import User
+    from expenses.models import Group
+
+    user = User.objects.create_user(username='bench-jwt', password='password123')
+    group = Group.objects.create(name='Bench JWT', owner=user)
+    group.members.add(user)
+    return user, group
+
+
+def run_clients(url, token, etag, requests, threads):
+    """
+    Sends `requests` GETs split across `threads` clients; returns per-request latencies.
+    """
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        local = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            local.append(time.perf_counter() - start)
+            assert response.status_code == 304, response.status_code
+        with lock:
+            latencies.extend(local)
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(requests // threads,)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIClient
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+    from expenses.authentication import CachedJWTAuthentication, get_user_cache
+
+    with test_database():
+        user, group = seed()
+        token = str(AccessToken.for_user(user))
+        url = f'/api/groups/{group.id}/settle/'
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        etag = client.get(url)['ETag']
+
+        original = APIView.authentication_classes
+        print(f"{'authentication':>24} {'threads':>7} | {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+        try:
+            for authentication in (JWTAuthentication, CachedJWTAuthentication):
+                APIView.authentication_classes = [authentication]
+                get_user_cache().clear()
+                client.get(url, HTTP_IF_NONE_MATCH=etag)  # warm up
+                _, queries = count_queries(client.get, url, HTTP_IF_NONE_MATCH=etag)
+                for threads in args.threads:
+                    start = time.perf_counter()
+                    latencies = sorted(run_clients(url, token, etag, args.requests, threads))
+                    elapsed = time.perf_counter() - start
+                    p50 = statistics.median(latencies) * 1000
+                    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+                    print(f"{authentication.__name__:>24} {threads:>7} | {queries:>7} {p50:>8.3f} {p95:>8.3f} {len(latencies) / elapsed:>8.0f}")
+        finally:
+            APIView.authentication_classes = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares the heap-based integer-cents settlement engine (expenses.settlement)
+with the previous sort-once Decimal greedy loop on synthetic groups.
+
+    python -m benchmarks.settlement_engine --sizes 10 100 1000 10000 100000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.utils import ROOT_DIR  # noqa: F401 (puts the project on sys.path when run as a script)
+from expenses.settlement import from_cents, settle_balances
+
+
+def legacy_settle(balances):
+    """
+    The greedy loop that calculate_optimized_settlements used before the engine,
+    operating on {user_id: Decimal balance}.
+    """
+    creditors = {}
+    debtors = {}
+
+    for user_id, balance in balances.items():
+        if balance > Decimal('0.00'):
+            creditors[user_id] = balance
+        elif balance < Decimal('0.00'):
+            debtors[user_id] = -balance
+
+    settlements = []
+
+    sorted_debtors = sorted(debtors.items(), key=lambda item: item[1], reverse=True)
+    sorted_creditors = sorted(creditors.items(), key=lambda item: item[1], reverse=True)
+
+    debtor_idx = 0
+    creditor_idx = 0
+
+    while debtor_idx < len(sorted_debtors) and creditor_idx < len(sorted_creditors):
+        debtor_id, debtor_amount = sorted_debtors[debtor_idx]
+        creditor_id, creditor_amount = sorted_creditors[creditor_idx]
+
+        amount_to_transfer = min(debtors[debtor_id], creditors[creditor_id])
+
+        if amount_to_transfer > Decimal('0.001'):
+            settlements.append((debtor_id, creditor_id, amount_to_transfer.quantize(Decimal('0.01'))))
+
+            debtors[debtor_id] -= amount_to_transfer
+            creditors[creditor_id] -= amount_to_transfer
+
+        if debtors[debtor_id] < Decimal('0.001'):
+            debtor_idx += 1
+
+        if creditors[creditor_id] < Decimal('0.001'):
+            creditor_idx += 1
+
+    return settlements
+
+
+def synthetic_balances(members, rng):
+    """
+    Zero-sum balances in cents; a share of members get round amounts so
+    exact debtor/creditor matches occur like they do with equal splits.
+    """
+    balances = {}
+    for user_id in range(1, members):
+        if rng.random() < 0.3:
+            cents = rng.choice((-1, 1)) * rng.choice((1000, 2500, 5000))
+        else:
+            cents = rng.randint(-50000, 50000)
+        balances[user_id] = cents
+    balances[members] = -sum(balances.values())
+    return balances
+
+
+def best_time(func, arg, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'members':>8} | {'legacy ms':>10} {'transfers':>9} | {'engine ms':>10} {'transfers':>9}")
+    for members in args.sizes:
+        cents_balances = synthetic_balances(members, rng)
+        decimal_balances = {user_id: from_cents(cents) for user_id, cents in cents_balances.items()}
+
+        legacy_result, legacy_time = best_time(legacy_settle, decimal_balances, args.repeat)
+        engine_result, engine_time = best_time(settle_balances, cents_balances, args.repeat)
+
+        remaining = dict(cents_balances)
+        for from_user_id, to_user_id, cents in engine_result:
+            remaining[from_user_id] += cents
+            remaining[to_user_id] -= cents
+        assert not any(remaining.values()), "engine left non-zero balances"
+
+        print(f"{members:>8} | {legacy_time * 1000:>10.2f} {len(legacy_result):>9} | {engine_time * 1000:>10.2f} {len(engine_result):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Times split allocation over a synthetic batch of expenses (the size of a large bulk
+import) and checks that every split adds up exactly to its expense amount.
+
+Compares the previous Decimal equal split (amount / members, quantized per member)
+with the integer-cents allocation, called once per expense and as one batch.
+
+    python -m benchmarks.split_allocation --expenses 100000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.utils import ROOT_DIR  # noqa: F401 (puts the project on sys.path when run as a script)
+from expenses.allocation import EQUAL, PERCENTAGE, SHARES, allocate_split, allocate_splits_batch
+
+
+def legacy_equal_split(total, member_count):
+    amount = Decimal(total) / 100
+    split_amount = (amount / Decimal(member_count)).quantize(Decimal('0.01'))
+    return [int(split_amount * 100)] * member_count
+
+
+def synthetic_requests(count, rng):
+    """
+    (total_cents, mode, values, member_count) tuples: mostly equal splits in groups of
+    2-8 members, with some shares and percentage splits.
+    """
+    requests = []
+    for _ in range(count):
+        total = rng.choice((rng.randint(100, 50000), rng.choice((1000, 2500, 10000))))
+        members = rng.randint(2, 8)
+        roll = rng.random()
+        if roll < 0.8:
+            requests.append((total, EQUAL, None, members))
+        elif roll < 0.9:
+            requests.append((total, SHARES, [Decimal(rng.randint(1, 4)) for _ in range(members)], members))
+        else:
+            percentages = [Decimal(rng.randint(1, 30)) for _ in range(members - 1)]
+            percentages.append(Decimal(100) - sum(percentages))
+            if percentages[-1] < 0:
+                percentages = [Decimal(100) / members] * members
+                percentages[-1] = Decimal(100) - sum(percentages[:-1])
+            requests.append((total, PERCENTAGE, percentages, members))
+    return requests
+
+
+def timed_run(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    requests = synthetic_requests(args.expenses, random.Random(args.seed))
+    equal_requests = [request for request in requests if request[1] == EQUAL]
+
+    legacy, legacy_time = timed_run(lambda: [legacy_equal_split(total, count) for total, _mode, _values, count in equal_requests])
+    drift = sum(abs(sum(cents) - request[0]) for request, cents in zip(equal_requests, legacy))
+    print(f"legacy equal split:   {legacy_time * 1000:>9.1f} ms  {len(equal_requests)} expenses, {drift} cents lost or added")
+
+    single, single_time = timed_run(lambda: [allocate_split(*request) for request in requests])
+    batch, batch_time = timed_run(lambda: allocate_splits_batch(requests))
+    assert single == batch
+    assert all(sum(cents) == request[0] for request, cents in zip(requests, batch)), "allocation does not add up"
+    print(f"allocate per expense: {single_time * 1000:>9.1f} ms  {len(requests)} expenses, exact")
+    print(f"allocate as a batch:  {batch_time * 1000:>9.1f} ms  {len(requests)} expenses, exact")
+
+
+if __name__ == '__main__':
+    main()
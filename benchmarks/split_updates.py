@@ -0,0 +1,105 @@
+"""
+Write volume of editing expenses in a large group: the previous delete-and-reinsert
+split recomputation versus the diff-based sync_expense_splits.
+
+    python -m benchmarks.split_updates --members 500 --expenses 20
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.utils import setup_django, test_database
+
+SCENARIOS = (
+    ('amount changed', lambda amount, members: (amount * 2, members)),
+    ('amount changed, same shares', lambda amount, members: (amount + Decimal('0.01'), members)),
+    ('one member added', lambda amount, members: (amount, members + ['new'])),
+)
+
+
+def delete_and_reinsert(expense, members):
+    from expenses.models import ExpenseSplit
+    from expenses.splits import build_equal_splits
+
+    deleted, _ = expense.splits.all().delete()
+    splits = ExpenseSplit.objects.bulk_create(build_equal_splits(expense, members))
+    return {'created': len(splits), 'updated': 0, 'deleted': deleted}
+
+
+def diff_sync(expense, members):
+    from expenses.splits import build_equal_splits, sync_expense_splits
+
+    _splits, changes = sync_expense_splits(expense, build_equal_splits(expense, members), list(expense.splits.all()))
+    return changes
+
+
+def seed(member_count, expense_count):
+    from django.contrib.auth.models import User
+    from expenses.models import Expense, ExpenseSplit, Group
+    from expenses.splits import build_equal_splits
+
+    owner = User.objects.create_user(username='bench-owner', password='password123')
+    members = [owner] + User.objects.bulk_create([User(username=f'bench-{i}') for i in range(member_count - 1)])
+    newcomer = User.objects.create_user(username='bench-newcomer')
+    group = Group.objects.create(name='Bench group', owner=owner)
+    group.members.add(*members)
+
+    expenses = Expense.objects.bulk_create([
+        Expense(group=group, description=f'Expense {i}', amount=Decimal('1000.00'), paid_by=owner)
+        for i in range(expense_count)
+    ])
+    splits = []
+    for expense in expenses:
+        splits.extend(build_equal_splits(expense, members))
+    ExpenseSplit.objects.bulk_create(splits, batch_size=5000)
+    return members, newcomer, expenses
+
+
+def run(strategy, expenses, members, newcomer, change):
+    from django.db import transaction
+    from expenses.models import ExpenseSplit
+
+    totals = {'created': 0, 'updated': 0, 'deleted': 0}
+    max_split_id = ExpenseSplit.objects.order_by('-id').values_list('id', flat=True).first()
+    start = time.perf_counter()
+    for expense in expenses:
+        new_amount, new_members = change(expense.amount, list(members))
+        new_members = [newcomer if member == 'new' else member for member in new_members]
+        with transaction.atomic():
+            expense.amount = new_amount
+            expense.save(update_fields=['amount'])
+            for key, value in strategy(expense, new_members).items():
+                totals[key] += value
+    elapsed = time.perf_counter() - start
+    new_ids = ExpenseSplit.objects.filter(id__gt=max_split_id).count()
+    return totals, new_ids, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--expenses', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import transaction
+
+    with test_database():
+        members, newcomer, expenses = seed(args.members, args.expenses)
+        print(f"{args.expenses} expenses edited in a {args.members}-member group")
+        print(f"{'scenario':>28} | {'strategy':>18} | {'inserted':>8} {'updated':>8} {'deleted':>8} {'rows written':>12} {'new ids':>8} {'ms':>8}")
+        for label, change in SCENARIOS:
+            for name, strategy in (('delete + reinsert', delete_and_reinsert), ('diff', diff_sync)):
+                # Run every strategy from the same starting state.
+                with transaction.atomic():
+                    totals, new_ids, elapsed = run(strategy, expenses, members, newcomer, change)
+                    transaction.set_rollback(True)
+                for expense in expenses:
+                    expense.refresh_from_db()
+
+                written = totals['created'] + totals['updated'] + totals['deleted']
+                print(f"{label:>28} | {name:>18} | {totals['created']:>8} {totals['updated']:>8} {totals['deleted']:>8} {written:>12} {new_ids:>8} {elapsed * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
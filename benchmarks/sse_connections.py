@@ -0,0 +1,107 @@
+"""
+Idle server-sent event streams held by one uvicorn worker: opens --connections streams
+on /api/groups/<id>/events/, reports the worker's memory and thread count with them
+open, then adds an expense and measures how long every stream takes to receive the
+expense.created event.
+
+    python -m benchmarks.sse_connections --connections 100 1000 5000
+
+Uses the scratch database and server setup of benchmarks.async_concurrency (one ASGI
+worker, EVENTS_ENABLED on, in-memory events backend).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.async_concurrency import seed, start_server
+from benchmarks.utils import setup_django
+
+
+def worker_pid(master_pid):
+    children = Path(f'/proc/{master_pid}/task/{master_pid}/children').read_text().split()
+    return int(children[0])
+
+
+def process_status(pid):
+    fields = dict(line.split(':', 1) for line in Path(f'/proc/{pid}/status').read_text().splitlines())
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['Threads'])
+
+
+async def open_stream(port, path, token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 20)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b'event: ready')
+    return reader, writer
+
+
+async def wait_for_event(reader, event):
+    await reader.readuntil(f'event: {event}'.encode())
+    return time.perf_counter()
+
+
+def add_expense(port, path, token):
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}{path}', method='POST',
+        data=json.dumps({'description': 'Live', 'amount': '12.00'}).encode(),
+        headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'},
+    )
+    urllib.request.urlopen(request).read()
+
+
+async def run(port, group_id, token, connections, master_pid):
+    events_path = f'/api/groups/{group_id}/events/'
+    streams = []
+    start = time.perf_counter()
+    for offset in range(0, connections, 200):
+        streams += await asyncio.gather(*(open_stream(port, events_path, token) for _ in range(min(200, connections - offset))))
+    connect_time = time.perf_counter() - start
+    await asyncio.sleep(1)
+    rss_mb, threads = process_status(worker_pid(master_pid))
+
+    waiters = [asyncio.ensure_future(wait_for_event(reader, 'expense.created')) for reader, _ in streams]
+    published = time.perf_counter()
+    await asyncio.to_thread(add_expense, port, f'/api/groups/{group_id}/expenses/', token)
+    received = [(at - published) * 1000 for at in await asyncio.gather(*waiters)]
+
+    for _, writer in streams:
+        writer.close()
+    received.sort()
+    return connect_time, rss_mb, threads, statistics.median(received), received[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--database-url', default='sqlite:////tmp/bench-sse.sqlite3')
+    args = parser.parse_args()
+
+    if args.database_url.startswith('sqlite:///') and os.path.exists(args.database_url[len('sqlite:///'):]):
+        os.remove(args.database_url[len('sqlite:///'):])
+    env = dict(os.environ, DATABASE_URL=args.database_url, DEBUG='False', ALLOWED_HOSTS='127.0.0.1 localhost', EVENTS_ENABLED='true')
+    env.setdefault('SECRET_KEY', 'benchmark-only-secret-key')
+    os.environ.update(env)
+    setup_django()
+    group_id, token = seed(members=10, expenses=100)
+
+    print(f"{'streams':>7} | {'connect s':>9} {'RSS MB':>7} {'threads':>7} | {'event p50 ms':>12} {'event max ms':>12}")
+    for connections in args.connections:
+        server = start_server('asgi', args.port, 1, env)
+        try:
+            idle_rss, idle_threads = process_status(worker_pid(server.pid))
+            connect_time, rss_mb, threads, p50, slowest = asyncio.run(run(args.port, group_id, token, connections, server.pid))
+            print(f"{connections:>7} | {connect_time:>9.1f} {rss_mb:>7.0f} {threads:>7} | {p50:>12.1f} {slowest:>12.1f}"
+                  f"   (idle worker: {idle_rss:.0f} MB, {idle_threads} threads)")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares GET /api/auth/user/balances/ with the per-group path clients used before
+(GET /api/groups/ followed by GET /api/groups/<pk>/settle/ for every group).
+
+    python -m benchmarks.user_balances --groups 200
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.utils import count_queries, setup_django, test_database
+
+
+def seed(group_count, members_per_group, expenses_per_group):
+    from django.contrib.auth.models import User
+    from expenses.balances import rebuild_group_balances
+    from expenses.models import Expense, ExpenseSplit, Group
+
+    rng = random.Random(42)
+    user = User.objects.create_user(username='bench-user', password='password123')
+    others = User.objects.bulk_create([User(username=f'bench-member-{i}') for i in range(members_per_group * 5)])
+
+    groups = Group.objects.bulk_create([Group(name=f'Bench group {i}', owner=user) for i in range(group_count)])
+    memberships = []
+    group_members = {}
+    for group in groups:
+        members = [user] + rng.sample(others, members_per_group - 1)
+        group_members[group.id] = members
+        memberships.extend(Group.members.through(group_id=group.id, user_id=member.id) for member in members)
+    Group.members.through.objects.bulk_create(memberships)
+
+    expenses = []
+    for group in groups:
+        for i in range(expenses_per_group):
+            expenses.append(Expense(group=group, description=f'Expense {i}', amount=Decimal('30.00'),
+                                    paid_by=rng.choice(group_members[group.id])))
+    expenses = Expense.objects.bulk_create(expenses)
+
+    splits = []
+    for expense in expenses:
+        members = group_members[expense.group_id]
+        share = (expense.amount / len(members)).quantize(Decimal('0.01'))
+        splits.extend(ExpenseSplit(expense=expense, owed_by=member, amount=share) for member in members)
+    ExpenseSplit.objects.bulk_create(splits, batch_size=5000)
+    rebuild_group_balances()
+    return user
+
+
+def per_group_path(client):
+    response = client.get('/api/groups/')
+    for group in response.data:
+        client.get(f"/api/groups/{group['id']}/settle/")
+    return len(response.data) + 1
+
+
+def balances_path(client):
+    client.get('/api/auth/user/balances/')
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--groups', type=int, default=200)
+    parser.add_argument('--members', type=int, default=5)
+    parser.add_argument('--expenses', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIClient
+
+    with test_database():
+        user = seed(args.groups, args.members, args.expenses)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        print(f"user in {args.groups} groups, {args.members} members and {args.expenses} expenses per group")
+        for label, path in (('per-group settle-up', per_group_path), ('user balances', balances_path)):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                requests, queries = count_queries(path, client)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{label:>22}: {requests:>4} request(s) {queries:>6} queries {best * 1000:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
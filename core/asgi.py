@@ -13,4 +13,35 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import Resolver404, resolve  # noqa: E402 (needs the app set up)
+
+
+class LongLivedRequestsHandler:
+    """
+    Django runs the sync code of each ASGI request (signal receivers, the async ORM) in
+    a thread of the request's own, kept until the response is sent. For views marked
+    `long_lived` (server-sent event streams), that would be a thread per connected
+    client; their requests skip that context, so their (short) sync calls share the
+    process's single sync thread instead.
+    """
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and self.is_long_lived(scope):
+            await self.application.handle(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
+
+    def is_long_lived(self, scope):
+        path = scope['path'][len(scope.get('root_path', '')):]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return False
+        return getattr(getattr(match.func, 'view_class', None), 'long_lived', False)
+
+
+application = LongLivedRequestsHandler(django_application)
@@ -0,0 +1,256 @@
+"""
+Per-request profiling, enabled with REQUEST_PROFILING=true.
+
+RequestProfilingMiddleware times every request and splits it into:
+
+- db: time spent executing SQL (and the number of queries)
+- view: time spent in the view, including its queries and serializers
+- serialize: time spent in serializer .data and in rendering the response
+- total: the whole request, other middleware included
+
+The numbers go back to the client in a Server-Timing header (visible in the browser's
+network tab), are aggregated per URL name into duration histograms served at
+/api/stats/requests/ (admin only), and requests slower than SLOW_REQUEST_THRESHOLD_MS
+are logged with their SQL.
+
+Queries are attributed to the request through a context variable, so this also works
+for async views, whose queries run in a worker thread.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the request duration histogram buckets; the last one is open-ended.
+HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+TIMINGS = ('db', 'view', 'serialize', 'total')
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = []
+        self.timings = dict.fromkeys(TIMINGS, 0.0)
+        self.view_started_at = None
+        self.serializer_depth = 0
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    def add(self, name, seconds):
+        self.timings[name] += seconds * 1000
+
+    def server_timing(self):
+        return ', '.join(
+            f'{name};dur={self.timings[name]:.1f}' + (f';desc="{self.query_count} queries"' if name == 'db' else '')
+            for name in TIMINGS
+        )
+
+
+def profile_sql(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        profile.add('db', duration)
+        profile.queries.append((sql, duration))
+
+
+def install_sql_profiler(connection, **kwargs):
+    if profile_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_sql)
+
+
+def profile_serializer_data(data_property):
+    """
+    Wraps BaseSerializer.data so that top-level serializer output counts as
+    serialization time. Nested serializers run inside it and aren't counted twice.
+    """
+    def data(serializer):
+        profile = _current_profile.get()
+        if profile is None:
+            return data_property.fget(serializer)
+        start = time.perf_counter()
+        profile.serializer_depth += 1
+        try:
+            return data_property.fget(serializer)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.add('serialize', time.perf_counter() - start)
+    data.profiled = True
+    return property(data)
+
+
+_install_lock = threading.Lock()
+
+
+def install_profilers():
+    with _install_lock:
+        if not getattr(serializers.BaseSerializer.data.fget, 'profiled', False):
+            serializers.BaseSerializer.data = profile_serializer_data(serializers.BaseSerializer.data)
+            connection_created.connect(install_sql_profiler, dispatch_uid='core.profiling')
+
+
+def install_on_open_connections():
+    """
+    Connections are per thread and those opened before the middleware was loaded never
+    sent connection_created, so the current thread's connections are checked per request.
+    """
+    for connection in connections.all(initialized_only=True):
+        install_sql_profiler(connection)
+
+
+class RequestStats:
+    """
+    Per-process, per-URL-name aggregates: request count, summed timings and queries,
+    and a histogram of total durations.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, url_name, profile):
+        with self._lock:
+            route = self._routes.get(url_name)
+            if route is None:
+                route = self._routes[url_name] = {
+                    'count': 0, 'queries': 0, 'max_ms': 0.0,
+                    'sum_ms': dict.fromkeys(TIMINGS, 0.0), 'buckets': [0] * len(HISTOGRAM_BUCKETS),
+                }
+            total = profile.timings['total']
+            route['count'] += 1
+            route['queries'] += profile.query_count
+            route['max_ms'] = max(route['max_ms'], total)
+            for name in TIMINGS:
+                route['sum_ms'][name] += profile.timings[name]
+            route['buckets'][next(i for i, bound in enumerate(HISTOGRAM_BUCKETS) if total <= bound)] += 1
+
+    def snapshot(self):
+        """
+        {url_name: {'count', 'avg_queries', 'avg_ms': {...}, 'max_ms', 'histogram_ms': {'le_5': n, ..., 'le_inf': n}}}
+        """
+        with self._lock:
+            return {
+                url_name: {
+                    'count': route['count'],
+                    'avg_queries': round(route['queries'] / route['count'], 2),
+                    'avg_ms': {name: round(value / route['count'], 2) for name, value in route['sum_ms'].items()},
+                    'max_ms': round(route['max_ms'], 2),
+                    'histogram_ms': {f'le_{bound:g}': count for bound, count in zip(HISTOGRAM_BUCKETS, route['buckets'])},
+                }
+                for url_name, route in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+request_stats = RequestStats()
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_profilers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs in the thread the view (or, for async views, the async ORM) queries from.
+        install_on_open_connections()
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view_started_at = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """
+        DRF responses are rendered after the view returns: the view ends here and the
+        rendering is serialization.
+        """
+        profile = _current_profile.get()
+        if profile is not None and profile.view_started_at is not None:
+            view_ended_at = time.perf_counter()
+            profile.add('view', view_ended_at - profile.view_started_at)
+            profile.view_started_at = None
+            response.add_post_render_callback(lambda rendered: profile.add('serialize', time.perf_counter() - view_ended_at))
+        return response
+
+    def finish(self, request, response, profile):
+        if profile.view_started_at is not None:
+            # Not a template response: everything since process_view was the view.
+            profile.add('view', time.perf_counter() - profile.view_started_at)
+        profile.add('total', time.perf_counter() - profile.started_at)
+        response['Server-Timing'] = profile.server_timing()
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.url_name if match is not None else None) or '<unresolved>'
+        request_stats.record(url_name, profile)
+
+        if profile.timings['total'] >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            self.log_slow_request(request, response, url_name, profile)
+        return response
+
+    def log_slow_request(self, request, response, url_name, profile):
+        lines = [f"{duration * 1000:8.1f} ms  {sql}" for sql, duration in profile.queries]
+        logger.warning(
+            "Slow request %s %s (%s) -> %s in %.1f ms; %s\n%s",
+            request.method, request.path, url_name, response.status_code, profile.timings['total'],
+            profile.server_timing(), '\n'.join(lines),
+        )
+
+
+class RequestStatsView(APIView):
+    """
+    Admin-only view exposing this process's per-URL request timings (see RequestProfilingMiddleware).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.REQUEST_PROFILING,
+            'slow_request_threshold_ms': settings.SLOW_REQUEST_THRESHOLD_MS,
+            'routes': request_stats.snapshot(),
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,223 @@
+"""
+In-process publish/subscribe hub for server-sent events.
+
+Publishers (request threads, usually on transaction commit) call publish(channel,
+message); async consumers (SSE responses) read from a Subscription. A subscription is
+an asyncio queue, not a thread, so a process can hold thousands of idle ones.
+
+The backend is picked with EVENTS_BACKEND:
+
+- core.pubsub.InMemoryBackend (default): messages only reach subscribers of the same
+  process, enough for a single-process deployment.
+- core.pubsub.CacheBackend: messages go through the Django cache named by
+  EVENTS_CACHE_ALIAS, so every process sharing that cache receives them. One thread
+  per process polls the cache every EVENTS_POLL_INTERVAL seconds for the channels it
+  has subscribers for. The cache must be shared and have an atomic incr(): Redis or
+  Memcached in production, or DatabaseCache as a local stand-in (CACHE_BACKEND=
+  django.core.cache.backends.db.DatabaseCache, CACHE_LOCATION=cache_table, then
+  `manage.py createcachetable`).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Messages of one channel for one consumer, in order. When the consumer falls more
+    than EVENTS_QUEUE_SIZE messages behind, the backlog is dropped and `overflowed`
+    is set, so it can tell its client to resynchronize.
+    """
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        """
+        Thread-safe: hands the message over to the subscriber's event loop.
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        The next message, or None after `timeout` seconds without one.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+    async def __aenter__(self):
+        await self.backend.register(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class InMemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        """
+        Subscribes the running event loop to `channel`:
+        `async with hub.subscribe(channel) as subscription: ...`. Messages are received
+        from entering the block on.
+        """
+        return Subscription(self, channel)
+
+    async def register(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(map(len, self._subscriptions.values()))
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+class CacheBackend(InMemoryBackend):
+    """
+    Every message gets the next sequence number of its channel (cache.incr) and is
+    stored under it for EVENTS_CACHE_TIMEOUT seconds. Local subscribers receive
+    messages through the poller too, so they see the same order as other processes.
+    """
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[settings.EVENTS_CACHE_ALIAS]
+        # Last sequence number delivered, per channel with local subscribers.
+        self._delivered = {}
+        self._poller = None
+
+    @staticmethod
+    def sequence_key(channel):
+        return f'events:{channel}:seq'
+
+    @staticmethod
+    def message_key(channel, sequence):
+        return f'events:{channel}:{sequence}'
+
+    def publish(self, channel, message):
+        self.cache.add(self.sequence_key(channel), 0, None)
+        sequence = self.cache.incr(self.sequence_key(channel))
+        self.cache.set(self.message_key(channel, sequence), message, settings.EVENTS_CACHE_TIMEOUT)
+
+    async def register(self, subscription):
+        channel = subscription.channel
+        # Off the event loop: the cache may be synchronous only (DatabaseCache) or block.
+        sequence = await self.cache.aget(self.sequence_key(channel), 0)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+            self._delivered.setdefault(channel, sequence)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self.poll_forever, name='events-poller', daemon=True)
+                self._poller.start()
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        with self._lock:
+            if subscription.channel not in self._subscriptions:
+                self._delivered.pop(subscription.channel, None)
+
+    def poll_forever(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling the events cache failed")
+            time.sleep(settings.EVENTS_POLL_INTERVAL)
+
+    def poll(self):
+        """
+        Delivers the messages published since the last poll: one get_many for the
+        sequence numbers of every subscribed channel, one for the new messages.
+        """
+        with self._lock:
+            delivered = dict(self._delivered)
+        if not delivered:
+            return
+        sequences = self.cache.get_many([self.sequence_key(channel) for channel in delivered])
+        pending = {}
+        for channel, last in delivered.items():
+            sequence = sequences.get(self.sequence_key(channel), 0)
+            if sequence < last:
+                # The counter was evicted and started over.
+                last = 0
+            if sequence > last:
+                pending[channel] = range(last + 1, sequence + 1)
+        if not pending:
+            return
+
+        messages = self.cache.get_many([self.message_key(channel, n) for channel, numbers in pending.items() for n in numbers])
+        for channel, numbers in pending.items():
+            with self._lock:
+                if channel not in self._delivered:
+                    continue
+                self._delivered[channel] = numbers[-1]
+            for n in numbers:
+                message = messages.get(self.message_key(channel, n))
+                # Expired or evicted messages are skipped.
+                if message is not None:
+                    self.deliver(channel, message)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """
+    The process-wide instance of settings.EVENTS_BACKEND.
+    """
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = import_string(settings.EVENTS_BACKEND)()
+        return _hub
+
+
+def publish(channel, message):
+    get_hub().publish(channel, message)
@@ -0,0 +1,145 @@
+"""
+Read replica support, enabled by setting DATABASE_REPLICA_URL.
+
+Views that opt in with ReplicaReadMixin (settle-up, group list, expense list) serve GET
+requests from the 'replica' database. Everything else, including every write, uses
+'default'. Replicas lag behind the primary. So that users see their own changes,
+PinPrimaryAfterWriteMiddleware pins a user to the primary for REPLICA_PIN_SECONDS after
+any non-GET request they make. The pin is stored in the default cache, so it only
+reaches every worker process when that cache is shared (e.g. Redis or Memcached). With a
+process-local cache, replica reads stay off unless REPLICA_READS_ENABLED is set.
+
+Locally, two SQLite files can stand in for the primary and the replica (a single
+process, so the local-memory cache will do):
+
+    DATABASE_URL=sqlite:///primary.sqlite3 DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 REPLICA_READS_ENABLED=true
+
+Run `migrate` and `migrate --database=replica`. Then copy primary.sqlite3 over
+replica.sqlite3 whenever the replica should catch up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import permissions
+
+REPLICA_ALIAS = 'replica'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_configured():
+    return settings.REPLICA_READS_ENABLED and REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Routes the reads made inside the block (including async ORM calls, which run in
+    another thread) to the replica when `enabled`.
+    """
+    token = _read_from_replica.set(enabled and replica_configured())
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if _read_from_replica.get() else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data.
+        return True
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id)) is not None
+
+
+async def ais_pinned(user_id):
+    return await cache.aget(pin_key(user_id)) is not None
+
+
+def wrote(request, response):
+    """
+    Whether the request was an authenticated write that went through (and so should pin
+    the user). DRF copies the user it authenticates onto the Django request.
+    """
+    user = getattr(request, 'user', None)
+    return (
+        request.method not in permissions.SAFE_METHODS
+        and user is not None and user.is_authenticated
+        and response.status_code < 400
+    )
+
+
+def should_read_from_replica(request):
+    return (
+        request.method == 'GET' and replica_configured()
+        and request.user.is_authenticated and not is_pinned(request.user.pk)
+    )
+
+
+async def ashould_read_from_replica(request):
+    return (
+        request.method == 'GET' and replica_configured()
+        and request.user.is_authenticated and not await ais_pinned(request.user.pk)
+    )
+
+
+class PinPrimaryAfterWriteMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if wrote(request, response):
+            pin_to_primary(request.user.pk)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if wrote(request, response):
+            await cache.aset(pin_key(request.user.pk), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    For DRF views: GET requests of users who haven't written recently read from the
+    replica. The switch happens right after authentication, so the permission checks
+    and the view read the same database (a cached settle-up plan is never built from
+    replica rows under a version read from the primary).
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(enabled=False):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        self.perform_authentication(request)
+        if should_read_from_replica(request):
+            _read_from_replica.set(True)
+        super().initial(request, *args, **kwargs)
@@ -93,6 +93,61 @@ DATABASES = {
     )
     }
 
+# Optional read replica for GET settle-up, group list and expense list (core.replicas)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.environ['DATABASE_REPLICA_URL'], conn_max_age=600)
+    DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Seconds a user keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local-memory by default (per process, bounded by CACHE_MAX_ENTRIES with LRU eviction).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'smart-group-expenses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '1000')),
+        },
+    }
+}
+
+SETTLEMENT_CACHE_ALIAS = 'default'
+SETTLEMENT_CACHE_TIMEOUT = int(os.environ.get('SETTLEMENT_CACHE_TIMEOUT', '3600'))
+# Per-user cached group list (GET /api/groups/). Writes invalidate it by bumping a per-user
+# version stored in the cache itself, so every worker must share that cache (Redis,
+# Memcached, database): with a per-process LocMemCache only the worker that served the write
+# would see it. Off by default for process-local backends; only turn it on there with a
+# single worker process. The timeout bounds how long a lagging read replica can keep other
+# members' lists behind
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+GROUP_LIST_CACHE_ENABLED = os.environ.get(
+    'GROUP_LIST_CACHE_ENABLED', str(CACHES[SETTLEMENT_CACHE_ALIAS]['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS)
+).lower() in ('true', '1', 't')
+GROUP_LIST_CACHE_TIMEOUT = int(os.environ.get('GROUP_LIST_CACHE_TIMEOUT', '600'))
+# The read replica's pin to the primary after a write (core.replicas) lives in the default
+# cache too: with a process-local one, the next request of the writer can land on another
+# worker and read stale data from the replica. Replica reads are therefore off for those
+# backends unless turned on explicitly (single worker process)
+REPLICA_READS_ENABLED = os.environ.get(
+    'REPLICA_READS_ENABLED', str(CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS)
+).lower() in ('true', '1', 't')
+
+# Budget of the exact minimum-transfer solver used by /settle/?mode=optimal
+SETTLEMENT_OPTIMAL_MAX_BALANCES = int(os.environ.get('SETTLEMENT_OPTIMAL_MAX_BALANCES', '18'))
+SETTLEMENT_OPTIMAL_TIME_BUDGET = float(os.environ.get('SETTLEMENT_OPTIMAL_TIME_BUDGET', '0.5'))
+
+# Batch settlement (/api/settle/batch/, manage.py settle_batch): groups whose balances are
+# loaded per query, and worker processes for the plans of large groups (1 = no pool)
+SETTLE_BATCH_CHUNK_SIZE = int(os.environ.get('SETTLE_BATCH_CHUNK_SIZE', '500'))
+SETTLE_BATCH_WORKERS = int(os.environ.get('SETTLE_BATCH_WORKERS', str(os.cpu_count() or 1)))
+
 
 
 # Password validation
@@ -142,13 +197,65 @@ CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:
 
 REST_FRAMEWORK = {
 'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'expenses.authentication.CachedJWTAuthentication',
     ),
 'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+'DEFAULT_RENDERER_CLASSES': (
+        'expenses.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+'DEFAULT_PARSER_CLASSES': (
+        'expenses.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     }
 
+# Expense list pagination (?page_size= is capped at EXPENSE_MAX_PAGE_SIZE)
+EXPENSE_PAGE_SIZE = int(os.environ.get('EXPENSE_PAGE_SIZE', '50'))
+EXPENSE_MAX_PAGE_SIZE = int(os.environ.get('EXPENSE_MAX_PAGE_SIZE', '200'))
+
+# Bulk expense import (/groups/<id>/expenses/bulk/)
+BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', '20000'))
+BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', '1000'))
+
+# Rows fetched per database round trip by the streaming expense export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# Days of delta sync change log kept by `manage.py prune_group_changes`; older cursors get 410
+GROUP_CHANGE_RETENTION_DAYS = int(os.environ.get('GROUP_CHANGE_RETENTION_DAYS', '30'))
+
+# Per-process cache of authenticated users (expenses.authentication.CachedJWTAuthentication)
+AUTH_USER_CACHE_MAX_SIZE = int(os.environ.get('AUTH_USER_CACHE_MAX_SIZE', '10000'))
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', '60'))
+
+# 'wsgi' (sync gunicorn workers) or 'asgi' (uvicorn workers), see gunicorn.conf.py
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi').lower()
+# Serve GET settle-up, group list and expense list with async views; on by default under ASGI
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', str(SERVER_INTERFACE == 'asgi')).lower() in ('true', '1', 't')
+
+# Live group events at /api/groups/<id>/events/ (server-sent events); on by default under ASGI
+EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', str(SERVER_INTERFACE == 'asgi')).lower() in ('true', '1', 't')
+# core.pubsub.InMemoryBackend (single process) or core.pubsub.CacheBackend (processes sharing EVENTS_CACHE_ALIAS)
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'core.pubsub.InMemoryBackend')
+EVENTS_CACHE_ALIAS = 'default'
+EVENTS_CACHE_TIMEOUT = int(os.environ.get('EVENTS_CACHE_TIMEOUT', '300'))
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1'))
+# Messages a slow client can fall behind before it is told to resync
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', '100'))
+EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('EVENTS_KEEPALIVE_SECONDS', '15'))
+
+# Per-request timings in a Server-Timing header and at /api/stats/requests/ (core.profiling)
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'False').lower() in ('true', '1', 't')
+# Profiled requests slower than this are logged with their SQL
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', '500'))
+if REQUEST_PROFILING:
+    MIDDLEWARE = ['core.profiling.RequestProfilingMiddleware'] + MIDDLEWARE
+if 'replica' in DATABASES:
+    MIDDLEWARE = MIDDLEWARE + ['core.replicas.PinPrimaryAfterWriteMiddleware']
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .profiling import RequestStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/stats/requests/', RequestStatsView.as_view(), name='request-stats'),
     path('api/', include('expenses.urls')),
 ]
 
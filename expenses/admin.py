@@ -1,9 +1,10 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Group, Expense, ExpenseSplit
+from .models import Group, Expense, ExpenseSplit, GroupMemberBalance, MembershipSnapshot
 
 admin.site.register(Group)
 admin.site.register(Expense)
 admin.site.register(ExpenseSplit)
-
+admin.site.register(GroupMemberBalance)
+admin.site.register(MembershipSnapshot)
@@ -0,0 +1,127 @@
+"""
+Split allocation in integer cents.
+
+Every mode produces per-member amounts that add up exactly to the expense amount:
+weighted modes use the largest-remainder method, so leftover cents go to the members
+with the largest fractional parts (ties go to the earlier entry).
+Like expenses.settlement, this module has no Django dependencies.
+"""
+from decimal import Decimal
+
+EQUAL = 'equal'
+SHARES = 'shares'
+PERCENTAGE = 'percentage'
+EXACT = 'exact'
+
+SPLIT_MODES = (EQUAL, SHARES, PERCENTAGE, EXACT)
+
+
+class SplitAllocationError(ValueError):
+    pass
+
+
+def allocate_cents(total, weights):
+    """
+    Splits `total` cents proportionally to the non-negative integer `weights`.
+    """
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise SplitAllocationError("Weights must add up to more than zero.")
+
+    sign = -1 if total < 0 else 1
+    total = abs(total)
+
+    parts = []
+    remainders = []
+    for index, weight in enumerate(weights):
+        part, remainder = divmod(total * weight, weight_sum)
+        parts.append(part)
+        remainders.append((-remainder, index))
+
+    leftover = total - sum(parts)
+    for _, index in sorted(remainders)[:leftover]:
+        parts[index] += 1
+
+    return [sign * part for part in parts]
+
+
+def to_integer_weights(values):
+    """
+    Turns Decimal weights such as shares (1.5, 2) or percentages (33.33) into integers
+    with the same ratios.
+    """
+    values = [Decimal(value) for value in values]
+    if any(value < 0 for value in values):
+        raise SplitAllocationError("Weights cannot be negative.")
+    exponent = min((value.as_tuple().exponent for value in values), default=0)
+    scale = Decimal(10) ** max(-exponent, 0)
+    return [int(value * scale) for value in values]
+
+
+def allocate_split(total, mode, values=None, member_count=None):
+    """
+    Per-member cents for one expense of `total` cents.
+
+    - equal: `member_count` members (or one per value) owe the same, +/- one cent
+    - shares: values are relative shares, e.g. [2, 1, 1]
+    - percentage: values are percentages and must add up to 100
+    - exact: values are the amounts owed and must add up to the expense amount
+    """
+    if mode == EQUAL:
+        count = member_count if member_count is not None else len(values or ())
+        if count <= 0:
+            return []
+        # Same result as allocate_cents with equal weights, without the sort.
+        sign = -1 if total < 0 else 1
+        part, leftover = divmod(abs(total), count)
+        return [sign * (part + 1)] * leftover + [sign * part] * (count - leftover)
+
+    if not values:
+        raise SplitAllocationError("At least one member is required.")
+
+    if mode == SHARES:
+        return allocate_cents(total, to_integer_weights(values))
+
+    if mode == PERCENTAGE:
+        if sum(Decimal(value) for value in values) != Decimal('100'):
+            raise SplitAllocationError("Percentages must add up to 100.")
+        return allocate_cents(total, to_integer_weights(values))
+
+    if mode == EXACT:
+        cents = []
+        for value in values:
+            amount = Decimal(value) * 100
+            if amount < 0:
+                raise SplitAllocationError("Exact amounts cannot be negative.")
+            if amount != amount.to_integral_value():
+                raise SplitAllocationError("Exact amounts cannot have more than two decimals.")
+            cents.append(int(amount))
+        if sum(cents) != total:
+            raise SplitAllocationError("Exact amounts must add up to the expense amount.")
+        return cents
+
+    raise SplitAllocationError(f"Unknown split mode '{mode}'.")
+
+
+def allocate_splits_batch(requests):
+    """
+    Allocates a whole batch of expenses at once. `requests` is an iterable of
+    (total_cents, mode, values, member_count) tuples; the result holds one list of cents
+    per request, in order. Identical requests (typically equal splits of the same
+    amount in the same group) are only computed once.
+    Raises SplitAllocationError with `index` set to the position of the failing request.
+    """
+    results = []
+    memo = {}
+    for index, (total, mode, values, member_count) in enumerate(requests):
+        key = (total, mode, tuple(values) if values is not None else None, member_count)
+        allocation = memo.get(key)
+        if allocation is None:
+            try:
+                allocation = allocate_split(total, mode, values, member_count)
+            except SplitAllocationError as error:
+                error.index = index
+                raise
+            memo[key] = allocation
+        results.append(allocation)
+    return results
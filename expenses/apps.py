@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        # Registers the signal handlers that keep the authentication user cache fresh
+        # and that protect users owing compact equal splits from deletion.
+        from . import authentication, splits  # noqa: F401
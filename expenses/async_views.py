@@ -0,0 +1,290 @@
+"""
+Async variants of the busiest read endpoints, for ASGI deployments.
+
+DRF views are synchronous, so these are plain async Django views that reuse what the
+DRF views use: the JWT authentication, the serializers, the exception handler and the
+JSON renderer, so clients get the same payloads, headers and errors. The database is
+read through Django's async ORM, so a slow query doesn't hold a worker thread.
+urls.py sends GET requests here when settings.ASYNC_READ_VIEWS is on; every other
+method still goes to the DRF view.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from core.pubsub import get_hub
+from core.replicas import ashould_read_from_replica, replica_reads
+
+from .authentication import CachedJWTAuthentication
+from .cache import (
+    aget_cached_group_list,
+    aget_cached_settlement,
+    aget_group_list_key,
+    aset_cached_group_list,
+    aset_cached_settlement,
+    record_cache_event,
+    settlement_etag,
+)
+from .changes import encode_cursor
+from .events import BALANCE_EVENTS, group_channel
+from .models import Group
+from .pagination import ExpenseCursorPagination
+from .permissions import aget_request_group
+from .renderers import FastJSONRenderer
+from .serializers import ExpenseSerializer, GroupSerializer, GroupSummarySerializer
+from .settlement import to_cents
+from .splits import aprefetch_splits
+from .views import (
+    ExpenseListCreateView,
+    SettleUpView,
+    expense_queryset,
+    get_group_list_view,
+    get_settlement_mode,
+    group_balance_rows,
+    group_queryset,
+    group_summary_queryset,
+    plan_settlements,
+    serialize_settlements,
+    settlement_user_ids,
+)
+
+
+def route_by_method(async_view, sync_view):
+    """
+    One URL served by two views: GET goes to the async view, every other method to
+    the DRF view (run in a thread).
+    """
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    return view
+
+
+class AsyncReadView(View):
+    """
+    Base for async GET views. Subclasses implement `async def get()` returning a DRF
+    Response; authentication (always required) and error handling work like in APIView.
+    Like the DRF views they replace, they read from the replica when there is one
+    (see core.replicas.ReplicaReadMixin).
+    """
+    http_method_names = ['get']
+    authentication_class = CachedJWTAuthentication
+    not_member_message = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            if request.method.lower() not in self.http_method_names:
+                raise exceptions.MethodNotAllowed(request.method)
+            await self.authenticate(request)
+            with replica_reads(await ashould_read_from_replica(request)):
+                response = await self.get(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(request, exc)
+        return self.render(request, response)
+
+    async def authenticate(self, request):
+        result = await self.authentication_class().aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = result
+
+    async def get_group(self, request, group_pk):
+        group = await aget_request_group(request, group_pk)
+        if not group.is_member:
+            raise exceptions.PermissionDenied(self.not_member_message)
+        return group
+
+    def get_serializer_context(self, request):
+        return {'request': request, 'format': None, 'view': self}
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication_class().authenticate_header(request)
+        response = api_settings.EXCEPTION_HANDLER(exc, {'view': self, 'args': self.args, 'kwargs': self.kwargs, 'request': request})
+        if response is None:
+            raise exc
+        return response
+
+    def render(self, request, response):
+        """
+        Renders the DRF Response here, so Django doesn't have to do it in a thread.
+        Other responses (streams) are returned as they are.
+        """
+        if not isinstance(response, Response):
+            return response
+        renderer = FastJSONRenderer()
+        content = b''
+        if response.data is not None:
+            content = renderer.render(response.data, renderer.media_type, {'request': request, 'response': response, 'view': self})
+        rendered = HttpResponse(content, status=response.status_code, content_type=renderer.media_type)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered['Vary'] = 'Accept'
+        return rendered
+
+
+class AsyncSettleUpView(AsyncReadView):
+    not_member_message = SettleUpView.not_member_message
+
+    async def get(self, request, group_pk=None):
+        mode = get_settlement_mode(request)
+        group = await self.get_group(request, group_pk)
+
+        etag = settlement_etag(group, mode)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            record_cache_event('settlement_not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cached = await aget_cached_settlement(group, mode)
+        if cached is None:
+            cached = await self.build_plan(group, mode)
+            await aset_cached_settlement(group, mode, cached)
+        plan, mode_used = cached
+
+        return Response(plan, status=status.HTTP_200_OK, headers={'ETag': etag, 'X-Settlement-Mode': mode_used})
+
+    async def build_plan(self, group, mode):
+        balances = {user_id: to_cents(balance) async for user_id, balance in group_balance_rows(group.pk)}
+        if mode == 'optimal':
+            # The exact solver can run for SETTLEMENT_OPTIMAL_TIME_BUDGET, keep it off the event loop.
+            raw_settlements, mode_used = await sync_to_async(plan_settlements, thread_sensitive=False)(balances, mode)
+        else:
+            raw_settlements, mode_used = plan_settlements(balances, mode)
+        users_map = {user_obj.id: user_obj async for user_obj in User.objects.filter(id__in=settlement_user_ids(raw_settlements))}
+        return serialize_settlements(raw_settlements, users_map), mode_used
+
+
+class AsyncGroupListView(AsyncReadView):
+    async def get(self, request):
+        if get_group_list_view(request) == 'summary':
+            queryset = group_summary_queryset(request.user).order_by('-created_at')
+            return Response(GroupSummarySerializer([group async for group in queryset], many=True).data)
+        fields = GroupSerializer.rendered_fields(request)
+        if not settings.GROUP_LIST_CACHE_ENABLED:
+            return Response(await self.render_groups(request, fields))
+        key = await aget_group_list_key(request.user.pk, fields)
+        groups = await aget_cached_group_list(key)
+        if groups is None:
+            groups = await self.render_groups(request, fields)
+            await aset_cached_group_list(key, groups)
+        return Response(groups)
+
+    async def render_groups(self, request, fields):
+        queryset = group_queryset(request.user, fields).order_by('-created_at')
+        return GroupSerializer([group async for group in queryset], many=True, context=self.get_serializer_context(request)).data
+
+
+class AsyncExpenseListView(AsyncReadView):
+    not_member_message = ExpenseListCreateView.not_member_message['GET']
+
+    async def get(self, request, group_pk=None):
+        group = await self.get_group(request, group_pk)
+        fields = ExpenseSerializer.rendered_fields(request)
+        queryset = expense_queryset(fields).filter(group_id=group.pk)
+
+        paginator = ExpenseCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        if 'splits' in fields:
+            await aprefetch_splits(page)
+        serializer = ExpenseSerializer(page, many=True, context=self.get_serializer_context(request))
+        return paginator.get_paginated_response(serializer.data)
+
+
+_settlement_events = {}
+
+
+async def settlement_event(group_id):
+    """
+    Data of a settlement.updated event: the group's current (greedy) plan and its ETag,
+    through the settlement cache. Subscribers of a group all ask for it after the same
+    event, so concurrent calls in this process share one computation.
+    """
+    loop = asyncio.get_running_loop()
+    task = _settlement_events.get(group_id)
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = _settlement_events[group_id] = loop.create_task(build_settlement_event(group_id))
+
+        def forget(done):
+            if _settlement_events.get(group_id) is done:
+                del _settlement_events[group_id]
+        task.add_done_callback(forget)
+    # A subscriber disconnecting mustn't cancel the computation the others wait for.
+    return await asyncio.shield(task)
+
+
+async def build_settlement_event(group_id):
+    group = await Group.objects.only('id', 'version').aget(pk=group_id)
+    cached = await aget_cached_settlement(group, 'greedy')
+    if cached is None:
+        cached = await AsyncSettleUpView().build_plan(group, 'greedy')
+        await aset_cached_settlement(group, 'greedy', cached)
+    plan, _mode_used = cached
+    return {'group': group_id, 'etag': settlement_etag(group, 'greedy'), 'settlements': plan}
+
+
+def sse_message(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + FastJSONRenderer().render(data) + b'\n\n'
+
+
+class AsyncGroupEventsView(AsyncReadView):
+    """
+    Server-sent events of a group, for its members (see expenses.events for the
+    messages). The stream starts with a `ready` event carrying a delta sync cursor:
+    fetching /changes/?since=<cursor> catches up on anything that happened before the
+    subscription. Balance-changing events are followed by a settlement.updated event
+    with the new plan. A `resync` event means events were dropped because the client
+    read too slowly. Comment lines are sent every EVENTS_KEEPALIVE_SECONDS to keep
+    proxies from closing idle streams.
+    Each open stream is a subscription queue on the event loop; served through
+    core.asgi.application, it doesn't hold a thread either (see `long_lived`).
+    """
+    not_member_message = _("You are not a member of this group and cannot follow its events.")
+    long_lived = True
+
+    async def get(self, request, group_pk=None):
+        group = await self.get_group(request, group_pk)
+        response = StreamingHttpResponse(self.stream(group, request.user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tells nginx not to buffer the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, group, user_id):
+        async with get_hub().subscribe(group_channel(group.pk)) as subscription:
+            yield sse_message('ready', {'group': group.pk, 'cursor': encode_cursor(group.pk, group.version)})
+            while True:
+                message = await subscription.get(timeout=settings.EVENTS_KEEPALIVE_SECONDS)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield sse_message('resync', {'group': group.pk})
+                    continue
+                if message is None:
+                    yield b': keepalive\n\n'
+                    continue
+
+                yield sse_message(message['event'], message['data'])
+                if message['event'] == 'group.deleted' or user_id in message['data'].get('removed', ()):
+                    return
+                if message['event'] in BALANCE_EVENTS:
+                    try:
+                        yield sse_message('settlement.updated', await settlement_event(group.pk))
+                    except Group.DoesNotExist:
+                        # Deleted meanwhile, its group.deleted event is on the way.
+                        continue
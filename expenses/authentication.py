@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import record_cache_event
+
+
+class UserCache:
+    """
+    Thread-safe LRU cache of user rows with a time to live, local to the process.
+    Rows are stored as field values and every get() builds a fresh User instance,
+    so requests never share (or mutate) the same object.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fields = [field.attname for field in get_user_model()._meta.concrete_fields]
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return get_user_model().from_db('default', self._fields, values)
+
+    def set(self, user_id, user):
+        user_id = str(user_id)
+        values = tuple(getattr(user, field) for field in self._fields)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = UserCache(settings.AUTH_USER_CACHE_MAX_SIZE, settings.AUTH_USER_CACHE_TIMEOUT)
+    return _user_cache
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drops the cached user so the next request reloads it. Saving or deleting a user does
+    this automatically; call it after changes that skip signals, e.g. QuerySet.update().
+    Other processes pick the change up within AUTH_USER_CACHE_TIMEOUT.
+    """
+    get_user_cache().invalidate(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the user id of a validated token and serves the user
+    from a per-process cache, so authenticated requests don't need a User query.
+    Only active users are cached; deactivating or changing a user invalidates its entry.
+    """
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            user = self.load_user(validated_token)
+        return user
+
+    def load_user(self, validated_token):
+        user = super().get_user(validated_token)
+        get_user_cache().set(validated_token[api_settings.USER_ID_CLAIM], user)
+        return user
+
+    def get_cached_user(self, validated_token):
+        """
+        The token's user from the cache, or None on a miss. Never queries the database.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_user_cache().get(user_id)
+        if user is None:
+            record_cache_event('auth_user_misses')
+            return None
+
+        record_cache_event('auth_user_hits')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views: only a user cache miss goes to the database.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            user = await sync_to_async(self.load_user)(validated_token)
+        return user, validated_token
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(getattr(instance, api_settings.USER_ID_FIELD))
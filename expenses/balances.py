@@ -0,0 +1,132 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+
+from .allocation import EQUAL, allocate_split
+from .cache import bump_group_version
+from .models import Expense, ExpenseSplit, GroupMemberBalance, MembershipSnapshot
+from .settlement import from_cents, to_cents
+
+
+class BalanceChanges:
+    """
+    Collects per-member balance deltas for one or more expenses and writes them
+    to the GroupMemberBalance ledger in a single pass.
+    Call save() inside the same transaction that touches the expenses/splits!
+    """
+    def __init__(self):
+        self.deltas = defaultdict(lambda: Decimal('0.00'))
+
+    def add(self, group_id, user_id, amount):
+        self.deltas[(group_id, user_id)] += amount
+
+    def add_expense(self, expense, splits):
+        self.add(expense.group_id, expense.paid_by_id, expense.amount)
+        for split in splits:
+            self.add(expense.group_id, split.owed_by_id, -split.amount)
+
+    def remove_expense(self, expense, splits):
+        self.add(expense.group_id, expense.paid_by_id, -expense.amount)
+        for split in splits:
+            self.add(expense.group_id, split.owed_by_id, split.amount)
+
+    def save(self):
+        changes = {key: delta for key, delta in self.deltas.items() if delta != 0}
+        if not changes:
+            return
+
+        GroupMemberBalance.objects.bulk_create(
+            [GroupMemberBalance(group_id=group_id, user_id=user_id) for group_id, user_id in changes],
+            ignore_conflicts=True
+        )
+
+        rows_filter = Q()
+        whens = []
+        for (group_id, user_id), delta in changes.items():
+            rows_filter |= Q(group_id=group_id, user_id=user_id)
+            whens.append(When(group_id=group_id, user_id=user_id, then=Value(delta)))
+
+        GroupMemberBalance.objects.filter(rows_filter).update(
+            balance=F('balance') + Case(*whens, default=Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2))
+        )
+        self.deltas.clear()
+
+
+def compute_group_balances(group_ids=None):
+    """
+    Recomputes balances from the expense tables with four aggregate queries.
+    Compact equal splits are counted per (snapshot, amount), so they cost one row
+    per distinct amount instead of one per member and expense.
+    Returns {(group_id, user_id): balance} for every non-zero balance.
+    """
+    expenses = Expense.objects.all()
+    splits = ExpenseSplit.objects.all()
+    if group_ids is not None:
+        expenses = expenses.filter(group_id__in=group_ids)
+        splits = splits.filter(expense__group_id__in=group_ids)
+
+    balances = defaultdict(lambda: Decimal('0.00'))
+    for row in expenses.values('group_id', 'paid_by_id').annotate(total=Sum('amount')):
+        balances[(row['group_id'], row['paid_by_id'])] += row['total']
+    for row in splits.values('expense__group_id', 'owed_by_id').annotate(total=Sum('amount')):
+        balances[(row['expense__group_id'], row['owed_by_id'])] -= row['total']
+
+    compact = list(
+        expenses.filter(snapshot__isnull=False).order_by()
+        .values('group_id', 'snapshot_id', 'amount').annotate(count=Count('id'))
+    )
+    member_ids = dict(MembershipSnapshot.objects.filter(pk__in={row['snapshot_id'] for row in compact}).values_list('pk', 'member_ids'))
+    for row in compact:
+        ids = member_ids[row['snapshot_id']]
+        cents = allocate_split(to_cents(row['amount']), EQUAL, member_count=len(ids))
+        for user_id, share in zip(ids, cents):
+            balances[(row['group_id'], user_id)] -= from_cents(share) * row['count']
+
+    return {key: balance for key, balance in balances.items() if balance != 0}
+
+
+def find_balance_drift(group_ids=None):
+    """
+    Compares the ledger against freshly computed balances.
+    Returns a list of (group_id, user_id, stored, expected) for every mismatch.
+    """
+    expected = compute_group_balances(group_ids)
+    stored_rows = GroupMemberBalance.objects.exclude(balance=0)
+    if group_ids is not None:
+        stored_rows = stored_rows.filter(group_id__in=group_ids)
+    stored = {(row.group_id, row.user_id): row.balance for row in stored_rows}
+
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        stored_balance = stored.get(key, Decimal('0.00'))
+        expected_balance = expected.get(key, Decimal('0.00'))
+        if stored_balance != expected_balance:
+            drift.append((key[0], key[1], stored_balance, expected_balance))
+    return drift
+
+
+def rebuild_group_balances(group_ids=None):
+    """
+    Replaces the ledger rows of the given groups (or all groups) with balances
+    recomputed from the expense tables. Returns the number of rows written.
+    Groups whose balances changed get a new version, so their cached settlement
+    plans and ETags are dropped.
+    """
+    ledger = GroupMemberBalance.objects.all()
+    if group_ids is not None:
+        ledger = ledger.filter(group_id__in=group_ids)
+
+    with transaction.atomic():
+        expected = compute_group_balances(group_ids)
+        stored = {(group_id, user_id): balance for group_id, user_id, balance in ledger.exclude(balance=0).values_list('group_id', 'user_id', 'balance')}
+        changed_groups = {group_id for group_id, user_id in set(expected) | set(stored) if expected.get((group_id, user_id)) != stored.get((group_id, user_id))}
+        for group_id in sorted(changed_groups):
+            bump_group_version(group_id)
+        ledger.delete()
+        GroupMemberBalance.objects.bulk_create([
+            GroupMemberBalance(group_id=group_id, user_id=user_id, balance=balance)
+            for (group_id, user_id), balance in expected.items()
+        ])
+    return len(expected)
@@ -0,0 +1,92 @@
+"""
+Settlement plans for many groups at once (POST /api/settle/batch/, `manage.py settle_batch`).
+
+Balances are read from the GroupMemberBalance ledger chunk_size groups per query. Small
+groups are planned inline, which is faster than shipping them to another process; groups
+with at least POOL_MIN_BALANCES[mode] non-zero balances go to a pool of worker
+processes. Plans are yielded as soon as they are ready, so the output is not in group
+order.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from multiprocessing import get_context
+
+from django.conf import settings
+
+from .models import Group
+from .settlement import settle_balances_for_mode, to_cents
+
+# Non-zero balances from which a group's plan is worth computing in a worker process.
+# The greedy plan is near-linear and only pays off for very large groups; the exact
+# solver is exponential and can use its whole time budget from a handful of balances.
+POOL_MIN_BALANCES = {'greedy': 2000, 'optimal': 8}
+
+
+def iter_group_id_chunks(group_ids, chunk_size):
+    """
+    The given group ids (every group when None) in sorted chunks of chunk_size.
+    """
+    if group_ids is not None:
+        group_ids = sorted(set(group_ids))
+        for start in range(0, len(group_ids), chunk_size):
+            yield group_ids[start:start + chunk_size]
+        return
+
+    last_id = 0
+    while True:
+        chunk = list(Group.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1]
+
+
+def iter_group_balances(group_ids, chunk_size):
+    """
+    {group_id: {user_id: cents}} per chunk of groups, one query each. Groups that don't
+    exist are left out, groups without non-zero balances map to {}.
+    """
+    for chunk in iter_group_id_chunks(group_ids, chunk_size):
+        balances = {}
+        rows = Group.objects.filter(pk__in=chunk).order_by().values_list('pk', 'balances__user_id', 'balances__balance')
+        for group_id, user_id, balance in rows:
+            group_balances = balances.setdefault(group_id, {})
+            if balance:
+                group_balances[user_id] = to_cents(balance)
+        yield balances
+
+
+def iter_batch_plans(group_ids=None, mode='greedy', chunk_size=None, workers=None):
+    """
+    Yields (group_id, transfers, outcome) for every group, see settle_balances_for_mode().
+    With workers <= 1 everything is computed in this process.
+    """
+    chunk_size = chunk_size or settings.SETTLE_BATCH_CHUNK_SIZE
+    workers = settings.SETTLE_BATCH_WORKERS if workers is None else workers
+    budget = {
+        'max_balances': settings.SETTLEMENT_OPTIMAL_MAX_BALANCES,
+        'time_budget': settings.SETTLEMENT_OPTIMAL_TIME_BUDGET,
+    }
+    pool = None
+    pending = {}
+    try:
+        for chunk in iter_group_balances(group_ids, chunk_size):
+            for group_id, balances in chunk.items():
+                if workers > 1 and len(balances) >= POOL_MIN_BALANCES[mode]:
+                    if pool is None:
+                        # spawn: forking would copy the parent's threads and database connections.
+                        pool = ProcessPoolExecutor(workers, mp_context=get_context('spawn'))
+                    pending[pool.submit(settle_balances_for_mode, balances, mode, **budget)] = group_id
+                else:
+                    yield (group_id, *settle_balances_for_mode(balances, mode, **budget))
+
+            if pending:
+                done, _ = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield (pending.pop(future), *future.result())
+
+        for future in as_completed(list(pending)):
+            yield (pending.pop(future), *future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import Group
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def get_cache():
+    return caches[settings.SETTLEMENT_CACHE_ALIAS]
+
+
+def record_cache_event(name, count=1):
+    with _stats_lock:
+        _stats[name] += count
+
+
+def get_cache_stats():
+    """
+    Per-process cache counters, e.g. {'settlement_hits': 10, 'settlement_misses': 2, ...},
+    plus a '<name>_hit_ratio' for every cache with hits or misses.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    for name in {key[:-len('_hits')] for key in stats if key.endswith('_hits')} | {key[:-len('_misses')] for key in stats if key.endswith('_misses')}:
+        hits, misses = stats.get(f'{name}_hits', 0), stats.get(f'{name}_misses', 0)
+        stats[f'{name}_hit_ratio'] = round(hits / (hits + misses), 4)
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def bump_group_version(group_id):
+    """
+    Invalidates every cached settlement plan of the group. Call it in the same
+    transaction that changes the group's expenses or members.
+    """
+    Group.objects.filter(pk=group_id).update(version=F('version') + 1)
+
+
+def settlement_etag(group, mode):
+    return f'"settle-{group.pk}-{group.version}-{mode}"'
+
+
+def settlement_cache_key(group_id, version, mode):
+    return f'settlement-plan:{group_id}:{version}:{mode}'
+
+
+def get_cached_settlement(group, mode):
+    plan = get_cache().get(settlement_cache_key(group.pk, group.version, mode))
+    record_cache_event('settlement_hits' if plan is not None else 'settlement_misses')
+    return plan
+
+
+def set_cached_settlement(group, mode, plan):
+    get_cache().set(settlement_cache_key(group.pk, group.version, mode), plan, settings.SETTLEMENT_CACHE_TIMEOUT)
+
+
+async def aget_cached_settlement(group, mode):
+    plan = await get_cache().aget(settlement_cache_key(group.pk, group.version, mode))
+    record_cache_event('settlement_hits' if plan is not None else 'settlement_misses')
+    return plan
+
+
+async def aset_cached_settlement(group, mode, plan):
+    await get_cache().aset(settlement_cache_key(group.pk, group.version, mode), plan, settings.SETTLEMENT_CACHE_TIMEOUT)
+
+
+# Per-user cache of the serialized group list. Entries are keyed by a per-user version
+# that invalidate_group_lists() bumps after the writing transaction commits, so a
+# request that read the database before the change can only store its result under
+# the old, unreachable version. The version lives in the cache, so this is only used
+# when every process shares it (settings.GROUP_LIST_CACHE_ENABLED).
+
+def group_list_version_key(user_id):
+    return f'group-list-version:{user_id}'
+
+
+def group_list_cache_key(user_id, version, fields):
+    return f"group-list:{user_id}:{version}:{','.join(sorted(fields))}"
+
+
+def new_group_list_version():
+    # Starts from the clock, so a version key that was evicted never comes back with a
+    # value it had before.
+    return time.time_ns()
+
+
+def get_group_list_key(user_id, fields):
+    """
+    Cache key of the user's group list rendered with `fields`; read it before querying
+    the groups.
+    """
+    cache = get_cache()
+    version_key = group_list_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, new_group_list_version(), None)
+        version = cache.get(version_key)
+    return group_list_cache_key(user_id, version, fields)
+
+
+async def aget_group_list_key(user_id, fields):
+    cache = get_cache()
+    version_key = group_list_version_key(user_id)
+    version = await cache.aget(version_key)
+    if version is None:
+        await cache.aadd(version_key, new_group_list_version(), None)
+        version = await cache.aget(version_key)
+    return group_list_cache_key(user_id, version, fields)
+
+
+def get_cached_group_list(key):
+    groups = get_cache().get(key)
+    record_cache_event('group_list_hits' if groups is not None else 'group_list_misses')
+    return groups
+
+
+async def aget_cached_group_list(key):
+    groups = await get_cache().aget(key)
+    record_cache_event('group_list_hits' if groups is not None else 'group_list_misses')
+    return groups
+
+
+def set_cached_group_list(key, groups):
+    get_cache().set(key, list(groups), settings.GROUP_LIST_CACHE_TIMEOUT)
+
+
+async def aset_cached_group_list(key, groups):
+    await get_cache().aset(key, list(groups), settings.GROUP_LIST_CACHE_TIMEOUT)
+
+
+def invalidate_group_lists(user_ids):
+    """
+    Drops the cached group lists of these users once the current transaction commits
+    (right away outside of one).
+    """
+    if not settings.GROUP_LIST_CACHE_ENABLED:
+        return
+    user_ids = set(user_ids)
+
+    def bump_versions():
+        cache = get_cache()
+        for user_id in user_ids:
+            try:
+                cache.incr(group_list_version_key(user_id))
+            except ValueError:
+                # No version yet: nothing cached for this user can be reached.
+                pass
+        record_cache_event('group_list_invalidations')
+        record_cache_event('group_list_invalidated_users', len(user_ids))
+
+    transaction.on_commit(bump_versions)
+
+
+def invalidate_group_member_lists(group_id, extra_user_ids=()):
+    """
+    invalidate_group_lists() for every member of the group (as of now, so call it before
+    removing members or deleting the group) and `extra_user_ids`.
+    """
+    member_ids = Group.members.through.objects.filter(group_id=group_id).values_list('user_id', flat=True)
+    invalidate_group_lists([*member_ids, *extra_user_ids])
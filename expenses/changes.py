@@ -0,0 +1,128 @@
+"""
+Change log for delta sync (GET /api/groups/<id>/changes/?since=<cursor>).
+
+Every write that touches a group's expenses or members bumps Group.version and logs
+the expenses / users it touched under the new version (record_group_changes). The
+version update locks the group row until the transaction commits, so versions become
+visible in order: once a client has seen version N, no change with a version <= N can
+show up later. A cursor is therefore just the group version the client is up to date
+with.
+
+The log is pruned by `manage.py prune_group_changes` (prune_group_changes below): a
+cursor older than the group's changes_pruned_version gets 410 Gone, and the client
+reloads the group and takes a new cursor.
+"""
+import base64
+
+from django.db import transaction
+from django.db.models import Max, Q, Subquery
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .cache import bump_group_version
+from .events import publish_group_event
+from .models import Group, GroupChange
+
+invalid_cursor_message = _('Invalid cursor')
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('This cursor is too old, reload the group and take a new cursor.')
+    default_code = 'cursor_expired'
+
+
+def record_group_changes(group_id, created_expenses=(), updated_expenses=(), deleted_expenses=(), members=(), removed_members=()):
+    """
+    Bumps the group version and logs the changed expense ids and member user ids under
+    it, then publishes the matching live events (expenses.events) on commit. Call it
+    inside the transaction making the changes, instead of bump_group_version().
+    """
+    bump_group_version(group_id)
+    # Read inside the INSERT, saving a round trip; the row lock taken by the bump keeps it stable.
+    version = Subquery(Group.objects.filter(pk=group_id).values('version'))
+    GroupChange.objects.bulk_create([
+        GroupChange(group_id=group_id, version=version, kind=kind, object_id=object_id, deleted=deleted)
+        for kind, deleted, object_ids in (
+            (GroupChange.EXPENSE, False, created_expenses),
+            (GroupChange.EXPENSE, False, updated_expenses),
+            (GroupChange.EXPENSE, True, deleted_expenses),
+            (GroupChange.MEMBER, False, members),
+            (GroupChange.MEMBER, True, removed_members),
+        )
+        for object_id in object_ids
+    ])
+
+    for event, ids in (
+        ('expense.created', created_expenses),
+        ('expense.updated', updated_expenses),
+        ('expense.deleted', deleted_expenses),
+    ):
+        if ids:
+            publish_group_event(group_id, event, ids=list(ids))
+    if members or removed_members:
+        publish_group_event(group_id, 'member.changed', added=list(members), removed=list(removed_members))
+
+
+def encode_cursor(group_id, version):
+    return base64.urlsafe_b64encode(f'{group_id}|{version}'.encode()).decode()
+
+
+def decode_cursor(group, encoded):
+    """
+    The version a cursor of this group stands for. Raises NotFound for anything else,
+    and CursorExpired when the changes since that version were pruned.
+    """
+    try:
+        cursor_group_id, version = map(int, base64.urlsafe_b64decode(encoded.encode()).decode().split('|'))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound(invalid_cursor_message)
+    if cursor_group_id != group.pk or version < 0:
+        raise NotFound(invalid_cursor_message)
+    if version < group.changes_pruned_version:
+        raise CursorExpired()
+    return version
+
+
+def changed_objects(group_id, since, until):
+    """
+    Changes made after version `since` up to `until`, latest state per object:
+    {kind: {object_id: deleted}}.
+    """
+    changes = {GroupChange.EXPENSE: {}, GroupChange.MEMBER: {}}
+    rows = (
+        GroupChange.objects.filter(group_id=group_id, version__gt=since, version__lte=until)
+        .order_by('version', 'id')
+        .values_list('kind', 'object_id', 'deleted')
+    )
+    for kind, object_id, deleted in rows:
+        changes[kind][object_id] = deleted
+    return changes
+
+
+def prune_group_changes(before, chunk_size=500):
+    """
+    Deletes the change log entries created before `before`, along with any later entry
+    of the same or an older version, so every group keeps a complete log above its new
+    changes_pruned_version. Works chunk_size groups per transaction.
+    Returns the number of entries deleted.
+    """
+    boundaries = list(
+        GroupChange.objects.filter(created_at__lt=before).order_by('group_id')
+        .values('group_id').annotate(version=Max('version')).values_list('group_id', 'version')
+    )
+    deleted = 0
+    for start in range(0, len(boundaries), chunk_size):
+        chunk = boundaries[start:start + chunk_size]
+        with transaction.atomic():
+            groups = Group.objects.in_bulk([group_id for group_id, _version in chunk])
+            for group_id, version in chunk:
+                if group_id in groups:
+                    groups[group_id].changes_pruned_version = max(groups[group_id].changes_pruned_version, version)
+            Group.objects.bulk_update(groups.values(), ['changes_pruned_version'])
+            entries = Q()
+            for group_id, version in chunk:
+                entries |= Q(group_id=group_id, version__lte=version)
+            deleted += GroupChange.objects.filter(entries).delete()[0]
+    return deleted
@@ -0,0 +1,71 @@
+"""
+Conversion between stored and compact equal splits.
+
+Used by the compact_splits command. Migration 0006 keeps its own frozen copy of
+this logic, so changes here don't alter what it did.
+"""
+import hashlib
+from collections import defaultdict
+
+from .allocation import EQUAL, allocate_split
+from .settlement import from_cents, to_cents
+
+
+def snapshot_key(member_ids):
+    return hashlib.sha1(','.join(str(user_id) for user_id in sorted(member_ids)).encode()).hexdigest()
+
+
+def compact_equal_splits(Expense, ExpenseSplit, MembershipSnapshot, group_ids=None, chunk_size=1000, dry_run=False):
+    """
+    Replaces the split rows of equal-split expenses with a membership snapshot.
+    Expenses whose stored amounts differ from an exact equal split (e.g. splits rounded
+    before amounts were allocated in cents) keep their rows, so no balance changes.
+    Returns counters: expenses_compacted, expenses_kept, split_rows_deleted, snapshots_created.
+    """
+    stats = defaultdict(int)
+    snapshots = {}
+    expenses = Expense.objects.filter(split_mode=EQUAL, snapshot__isnull=True)
+    if group_ids is not None:
+        expenses = expenses.filter(group_id__in=group_ids)
+
+    last_pk = 0
+    while True:
+        chunk = list(expenses.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'group_id', 'amount')[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        rows = defaultdict(dict)
+        for expense_id, user_id, amount in ExpenseSplit.objects.filter(expense_id__in=[pk for pk, _, _ in chunk]).values_list('expense_id', 'owed_by_id', 'amount'):
+            rows[expense_id][user_id] = amount
+
+        compacted = defaultdict(list)
+        for expense_id, group_id, amount in chunk:
+            owed = rows.get(expense_id)
+            if not owed:
+                stats['expenses_kept'] += 1
+                continue
+            member_ids = sorted(owed)
+            cents = allocate_split(to_cents(amount), EQUAL, member_count=len(member_ids))
+            if any(owed[user_id] != from_cents(share) for user_id, share in zip(member_ids, cents)):
+                stats['expenses_kept'] += 1
+                continue
+
+            key = (group_id, snapshot_key(member_ids))
+            if key not in snapshots:
+                snapshot = None if dry_run else MembershipSnapshot.objects.filter(group_id=group_id, key=key[1]).first()
+                if snapshot is None:
+                    stats['snapshots_created'] += 1
+                    if not dry_run:
+                        snapshot = MembershipSnapshot.objects.create(group_id=group_id, key=key[1], member_ids=member_ids)
+                snapshots[key] = snapshot.pk if snapshot is not None else None
+            compacted[snapshots[key]].append(expense_id)
+            stats['expenses_compacted'] += 1
+            stats['split_rows_deleted'] += len(owed)
+
+        if not dry_run:
+            for snapshot_id, expense_ids in compacted.items():
+                Expense.objects.filter(pk__in=expense_ids).update(snapshot_id=snapshot_id)
+                ExpenseSplit.objects.filter(expense_id__in=expense_ids).delete()
+
+    return dict(stats)
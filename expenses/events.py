@@ -0,0 +1,30 @@
+"""
+Live group events, published through core.pubsub once the change commits and streamed
+to members by expenses.async_views.AsyncGroupEventsView.
+
+Messages are {'event': <name>, 'data': {'group': <id>, ...}}:
+
+- expense.created / expense.updated / expense.deleted: {'ids': [...]}
+- member.changed: {'added': [...], 'removed': [...]} (user ids)
+- group.deleted: {}
+"""
+from functools import partial
+
+from django.db import transaction
+
+from core.pubsub import publish
+
+BALANCE_EVENTS = frozenset({'expense.created', 'expense.updated', 'expense.deleted', 'member.changed'})
+
+
+def group_channel(group_id):
+    return f'group:{group_id}'
+
+
+def publish_group_event(group_id, event, **data):
+    """
+    Publishes the event when the current transaction commits. A failing backend is
+    logged and doesn't fail the request that made the change.
+    """
+    message = {'event': event, 'data': {'group': group_id, **data}}
+    transaction.on_commit(partial(publish, group_channel(group_id), message), robust=True)
@@ -0,0 +1,145 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .allocation import EQUAL, allocate_split
+from .models import Expense, MembershipSnapshot
+from .settlement import from_cents, to_cents
+
+EXPORT_COLUMNS = (
+    'expense_id', 'created_at', 'description', 'amount', 'paid_by',
+    'split_id', 'owed_by', 'split_amount',
+)
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back, so csv.writer can be used
+    to produce a stream instead of a file.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(group_id, chunk_size):
+    """
+    One tuple per split (or per expense without splits), ordered by expense, read with
+    a single joined query in chunks so memory stays flat whatever the group size.
+    Compact equal splits are expanded from the group's membership snapshots, which are
+    loaded up front; their split id is None.
+    """
+    rows = (
+        Expense.objects.filter(group_id=group_id)
+        .order_by('created_at', 'id', 'splits__id')
+        .values_list(
+            'id', 'created_at', 'description', 'amount', 'paid_by__username',
+            'splits__id', 'splits__owed_by__username', 'splits__amount', 'snapshot_id',
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+    snapshots = dict(MembershipSnapshot.objects.filter(group_id=group_id).values_list('pk', 'member_ids'))
+    usernames = dict(
+        User.objects.filter(pk__in={user_id for member_ids in snapshots.values() for user_id in member_ids})
+        .values_list('pk', 'username')
+    )
+    for *row, snapshot_id in rows:
+        if snapshot_id is None:
+            yield tuple(row)
+            continue
+        expense_id, created_at, description, amount, paid_by = row[:5]
+        member_ids = snapshots[snapshot_id]
+        cents = allocate_split(to_cents(amount), EQUAL, member_count=len(member_ids))
+        for user_id, share in zip(member_ids, cents):
+            yield expense_id, created_at, description, amount, paid_by, None, usernames.get(user_id), from_cents(share)
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for expense_id, created_at, description, amount, paid_by, split_id, owed_by, split_amount in rows:
+        yield writer.writerow((
+            expense_id, created_at.isoformat(), description, amount, paid_by,
+            split_id if split_id is not None else '',
+            owed_by or '',
+            split_amount if split_amount is not None else '',
+        ))
+
+
+def iter_ndjson(rows):
+    """
+    One JSON object per expense, with its splits nested. Rows arrive grouped by
+    expense, so only the expense being assembled is kept in memory.
+    """
+    current = None
+    for expense_id, created_at, description, amount, paid_by, split_id, owed_by, split_amount in rows:
+        if current is None or current['id'] != expense_id:
+            if current is not None:
+                yield json.dumps(current) + '\n'
+            current = {
+                'id': expense_id,
+                'created_at': created_at.isoformat(),
+                'description': description,
+                'amount': str(amount),
+                'paid_by': paid_by,
+                'splits': [],
+            }
+        if owed_by is not None:
+            current['splits'].append({'id': split_id, 'owed_by': owed_by, 'amount': str(split_amount)})
+    if current is not None:
+        yield json.dumps(current) + '\n'
+
+
+def buffered(lines, buffer_size=64 * 1024):
+    """
+    Joins small lines into chunks of about buffer_size characters before they are sent.
+    """
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', iter_csv),
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+}
+
+
+def streaming_response(request, chunks, content_type):
+    """
+    StreamingHttpResponse sending `chunks` as they are produced. Under ASGI, Django
+    would read a sync iterator whole into a list before sending it, so there the chunks
+    go through aiter_sync() instead.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = aiter_sync(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+async def aiter_sync(iterable):
+    """
+    Async iterator over a sync one, advanced one item at a time in the request's sync
+    thread (database cursors opened by the iterator stay on their connection).
+    """
+    iterator = iter(iterable)
+    next_item = sync_to_async(next)
+    done = object()
+    try:
+        while (item := await next_item(iterator, done)) is not done:
+            yield item
+    finally:
+        # Runs the generator's cleanup (e.g. closing a cursor) in that thread too.
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
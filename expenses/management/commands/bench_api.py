@@ -0,0 +1,192 @@
+import json
+import math
+import statistics
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from expenses import urls
+from expenses.changes import encode_cursor
+from expenses.models import Group
+
+from .seed_benchmark import BENCHMARK_PASSWORD
+
+# One benchmarked request. `data` is called with the iteration number; `client` is
+# 'user' (the group owner), 'admin' or 'anonymous'. Non-GET requests are rolled back.
+Route = namedtuple('Route', 'name method kwargs data query client')
+
+# Routes that can't be timed request by request (see benchmarks.sse_connections for the event stream).
+UNBENCHMARKED = {'group-events'}
+
+
+def build_routes(group, expense, outsider, prefix, refresh_token):
+    group_kwargs = {'group_pk': group.pk}
+    owner_login = {'username': group.owner.username, 'password': BENCHMARK_PASSWORD}
+    return [
+        Route('auth_register', 'post', {}, lambda i: {
+            'username': f'{prefix}-register-{i}', 'email': f'{prefix}-register-{i}@example.com',
+            'password': 'Bench-Register-123', 'password2': 'Bench-Register-123',
+        }, '', 'anonymous'),
+        Route('token_obtain_pair', 'post', {}, lambda i: owner_login, '', 'anonymous'),
+        Route('token_refresh', 'post', {}, lambda i: {'refresh': refresh_token}, '', 'anonymous'),
+        Route('auth_user_detail', 'get', {}, None, '', 'user'),
+        Route('auth_user_balances', 'get', {}, None, '', 'user'),
+        Route('group-list-create', 'get', {}, None, '', 'user'),
+        Route('group-list-create', 'get', {}, None, '?view=summary', 'user'),
+        Route('group-list-create', 'post', {}, lambda i: {'name': f'Bench group {i}'}, '', 'user'),
+        Route('group-detail', 'get', {'pk': group.pk}, None, '', 'user'),
+        Route('group-detail', 'patch', {'pk': group.pk}, lambda i: {'name': f'Renamed {i}'}, '', 'user'),
+        Route('group-expense-list-create', 'get', group_kwargs, None, '', 'user'),
+        Route('group-expense-list-create', 'post', group_kwargs, lambda i: {'description': f'Bench {i}', 'amount': '42.50'}, '', 'user'),
+        Route('group-expense-bulk-create', 'post', group_kwargs, lambda i: [
+            {'description': f'Bulk {i}-{row}', 'amount': f'{row + 1}.25'} for row in range(100)
+        ], '', 'user'),
+        Route('group-expense-export', 'get', group_kwargs, None, '?format=csv', 'user'),
+        Route('group-expense-export', 'get', group_kwargs, None, '?format=ndjson', 'user'),
+        Route('group-settle-up', 'get', group_kwargs, None, '', 'user'),
+        Route('group-settle-up', 'get', group_kwargs, None, '?mode=optimal', 'user'),
+        Route('expense-detail', 'get', {'group_pk': group.pk, 'expense_pk': expense.pk}, None, '', 'user'),
+        Route('expense-detail', 'patch', {'group_pk': group.pk, 'expense_pk': expense.pk}, lambda i: {'description': f'Edited {i}'}, '', 'user'),
+        Route('group-members-manage', 'post', group_kwargs, lambda i: {'username': outsider.username}, '', 'user'),
+        Route('group-changes', 'get', group_kwargs, None, '', 'user'),
+        Route('group-changes', 'get', group_kwargs, None, f'?since={encode_cursor(group.pk, group.version)}', 'user'),
+        Route('settle-batch', 'post', {}, lambda i: {'group_ids': [group.pk]}, '', 'admin'),
+        Route('cache-stats', 'get', {}, None, '', 'admin'),
+    ]
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    return sorted_values[max(math.ceil(len(sorted_values) * percent / 100) - 1, 0)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends every route of expenses/urls.py through Django's test client against the "
+        "current database (fill it with seed_benchmark first) and reports latency "
+        "percentiles and query counts per route as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per route sent first.")
+        parser.add_argument('--group', type=int, help="Group to benchmark (default: the seeded group with the most expenses).")
+        parser.add_argument('--route', action='append', dest='routes', help="Only run this URL name (can be repeated).")
+        parser.add_argument('--prefix', default='bench', help="Prefix used with seed_benchmark.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        group = self.get_group(options['group'], prefix)
+        # Only the payer can edit an expense, and requests are sent as the group owner.
+        expense = group.expenses.filter(paid_by=group.owner).order_by('-created_at', '-id').first()
+        if expense is None:
+            raise CommandError(f"Group {group.pk} has no expenses paid by its owner.")
+        admin = User.objects.filter(is_staff=True, username__startswith=f'{prefix}-').first()
+        outsider = User.objects.filter(username__startswith=f'{prefix}-', is_staff=False).exclude(group_memberships=group).first()
+        if admin is None or outsider is None:
+            raise CommandError("Expected a staff user and a user outside the group, run seed_benchmark first.")
+
+        routes = build_routes(group, expense, outsider, prefix, str(RefreshToken.for_user(group.owner)))
+        route_names = {route.name for route in routes}
+        missing = [pattern.name for pattern in urls.urlpatterns if pattern.name not in route_names | UNBENCHMARKED]
+        if missing:
+            raise CommandError(f"No benchmark defined for route(s): {', '.join(missing)}.")
+        if options['routes']:
+            routes = [route for route in routes if route.name in options['routes']]
+
+        clients = {'anonymous': APIClient(), 'user': APIClient(), 'admin': APIClient()}
+        clients['user'].credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(group.owner).access_token}')
+        clients['admin'].credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for route in routes:
+                results.append(self.run_route(route, clients[route.client], options['warmup'], options['requests']))
+                self.stderr.write(f"{route.method.upper():>6} {route.name}{route.query}: p50 {results[-1]['p50_ms']} ms")
+
+        report = {
+            'database': connection.vendor,
+            'requests_per_route': options['requests'],
+            'group': {'id': group.pk, 'members': group.members.count(), 'expenses': group.expenses.count()},
+            'routes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def get_group(self, group_id, prefix):
+        groups = Group.objects.all()
+        if group_id is None:
+            groups = groups.filter(owner__username__startswith=f'{prefix}-').annotate(expense_count=Count('expenses')).order_by('-expense_count', 'pk')
+        else:
+            groups = groups.filter(pk=group_id)
+        group = groups.select_related('owner').first()
+        if group is None:
+            raise CommandError("No group to benchmark, run seed_benchmark first.")
+        return group
+
+    def run_route(self, route, client, warmup, requests):
+        path = reverse(route.name, kwargs=route.kwargs) + route.query
+        counter = QueryCounter()
+        latencies, queries, statuses = [], [], set()
+        cache.clear()
+        for i in range(warmup + requests):
+            counter.count = 0
+            with transaction.atomic():
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    response = self.send(client, route, path, i)
+                    elapsed = time.perf_counter() - start
+                if route.method != 'get':
+                    transaction.set_rollback(True)
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(counter.count)
+                statuses.add(response.status_code)
+
+        latencies.sort()
+        return {
+            'name': route.name,
+            'method': route.method.upper(),
+            'path': path,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries': {'min': min(queries), 'max': max(queries), 'mean': round(statistics.fmean(queries), 2)},
+        }
+
+    def send(self, client, route, path, i):
+        data = route.data(i) if route.data is not None else None
+        request = getattr(client, route.method)
+        response = request(path) if data is None else request(path, data, format='json')
+        if response.streaming:
+            # Streamed bodies are produced while being read, include that in the timing.
+            b''.join(response.streaming_content)
+        return response
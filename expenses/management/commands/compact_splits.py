@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from expenses.compaction import compact_equal_splits
+from expenses.models import Expense, ExpenseSplit, MembershipSnapshot
+
+
+def table_size(table):
+    """
+    Bytes used by a table and its indexes, or None when the database can't tell.
+    """
+    if connection.vendor == 'postgresql':
+        query = "SELECT pg_total_relation_size(%s)"
+    elif connection.vendor == 'sqlite':
+        query = "SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query, [table])
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Replaces the split rows of equal-split expenses with shared membership snapshots and reports the storage saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='group_ids',
+                            help="Only process this group id (can be repeated).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be compacted without writing anything.")
+
+    def handle(self, *args, **options):
+        group_ids = options['group_ids']
+        splits = ExpenseSplit.objects.all()
+        if group_ids is not None:
+            splits = splits.filter(expense__group_id__in=group_ids)
+
+        rows_before = splits.count()
+        size = table_size(ExpenseSplit._meta.db_table)
+        total_rows = ExpenseSplit.objects.count()
+
+        with transaction.atomic():
+            stats = compact_equal_splits(Expense, ExpenseSplit, MembershipSnapshot, group_ids, dry_run=options['dry_run'])
+
+        deleted = stats.get('split_rows_deleted', 0)
+        prefix = "Would compact" if options['dry_run'] else "Compacted"
+        self.stdout.write(
+            f"{prefix} {stats.get('expenses_compacted', 0)} equal-split expense(s) into "
+            f"{stats.get('snapshots_created', 0)} new membership snapshot(s); "
+            f"{stats.get('expenses_kept', 0)} keep their split rows."
+        )
+        percent = deleted * 100 / rows_before if rows_before else 0
+        self.stdout.write(f"Split rows: {rows_before} -> {rows_before - deleted} ({percent:.1f}% fewer).")
+        if size and total_rows:
+            # Freed pages are reused by new rows; VACUUM returns them to the OS.
+            saved = size * deleted / total_rows
+            self.stdout.write(f"Estimated storage saved: {saved / 1024:.1f} KiB of {size / 1024:.1f} KiB (table and indexes).")
+        self.stdout.write(self.style.SUCCESS("Done."))
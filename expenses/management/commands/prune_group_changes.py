@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expenses.changes import prune_group_changes
+
+
+class Command(BaseCommand):
+    help = "Deletes delta sync change log entries older than GROUP_CHANGE_RETENTION_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Keep this many days of changes (default: GROUP_CHANGE_RETENTION_DAYS).")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Groups pruned per transaction.")
+
+    def handle(self, *args, **options):
+        days = settings.GROUP_CHANGE_RETENTION_DAYS if options['days'] is None else options['days']
+        deleted = prune_group_changes(timezone.now() - timedelta(days=days), options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} change log entry(ies) older than {days} day(s)."))
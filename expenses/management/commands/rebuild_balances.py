@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.balances import find_balance_drift, rebuild_group_balances
+
+
+class Command(BaseCommand):
+    help = "Rebuilds (or with --verify only checks) the GroupMemberBalance ledger from the expense tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='group_ids',
+                            help="Only process this group id (can be repeated).")
+        parser.add_argument('--verify', action='store_true',
+                            help="Report drift between the ledger and the expense tables without writing anything.")
+
+    def handle(self, *args, **options):
+        group_ids = options['group_ids']
+
+        if options['verify']:
+            drift = find_balance_drift(group_ids)
+            for group_id, user_id, stored, expected in drift:
+                self.stdout.write(f"group={group_id} user={user_id} stored={stored} expected={expected}")
+            if drift:
+                raise CommandError(f"Found {len(drift)} drifted balance(s).")
+            self.stdout.write(self.style.SUCCESS("Balance ledger is in sync."))
+            return
+
+        rows = rebuild_group_balances(group_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt balance ledger ({rows} non-zero balance(s))."))
@@ -0,0 +1,148 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from expenses.allocation import SHARES
+from expenses.balances import rebuild_group_balances
+from expenses.compaction import snapshot_key
+from expenses.models import Expense, ExpenseSplit, Group, MembershipSnapshot
+from expenses.splits import build_splits
+
+# Every seeded user (and the admin) can log in with this password.
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def parse_range(value):
+    """
+    'MIN:MAX' (or a single number) as an inclusive (min, max) tuple.
+    """
+    low, _, high = value.partition(':')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError(f"Expected MIN:MAX, got {value!r}.")
+    if low < 1 or high < low:
+        raise CommandError(f"Invalid range {value!r}.")
+    return low, high
+
+
+def skewed_count(rng, low, high, skew):
+    """
+    A count in [low, high]. skew=0 is uniform, higher values make large counts rarer
+    (a long tail: most groups are small, a few are large).
+    """
+    return low + int((high - low + 1) * rng.random() ** (1 + skew)) if high > low else low
+
+
+def payer_weights(member_count, skew):
+    """
+    Zipf-like: the k-th member pays with weight 1 / k**skew, so skew=0 means everyone
+    pays equally often and higher values concentrate payments on a few members.
+    """
+    return [1 / (rank ** skew) for rank in range(1, member_count + 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic users, groups and expenses for benchmarking "
+        "(see bench_api). Everything is written with bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Number of users.")
+        parser.add_argument('--groups', type=int, default=200, help="Number of groups.")
+        parser.add_argument('--members', type=parse_range, default=(3, 12),
+                            help="Members per group, MIN:MAX (default 3:12).")
+        parser.add_argument('--expenses', type=parse_range, default=(10, 500),
+                            help="Expenses per group, MIN:MAX (default 10:500).")
+        parser.add_argument('--expense-skew', type=float, default=1.0,
+                            help="0 spreads expense counts uniformly, higher values give a long tail of big groups.")
+        parser.add_argument('--payer-skew', type=float, default=1.0,
+                            help="0 makes every member pay equally often, higher values concentrate payments.")
+        parser.add_argument('--shares-ratio', type=float, default=0.1,
+                            help="Fraction of expenses split by shares (stored as split rows); the rest are equal splits.")
+        parser.add_argument('--prefix', default='bench', help="Prefix of the generated usernames.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for reproducible data.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true',
+                            help="Delete data generated earlier with the same prefix first.")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        rng = random.Random(options['seed'])
+        min_members, max_members = options['members']
+        if max_members > options['users']:
+            raise CommandError("--members cannot exceed --users.")
+
+        existing = User.objects.filter(username__startswith=f'{prefix}-')
+        if existing.exists():
+            if not options['flush']:
+                raise CommandError(f"Users prefixed '{prefix}-' already exist, pass --flush to replace them.")
+            with transaction.atomic():
+                Group.objects.filter(owner__in=existing).delete()
+                existing.delete()
+
+        with transaction.atomic():
+            counts = self.seed(rng, options)
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded {users} users, {groups} groups, {memberships} memberships, {expenses} expenses "
+            "and {splits} split rows. Log in as {prefix}-admin or any {prefix}-user-N with password "
+            "'{password}'.".format(prefix=prefix, password=BENCHMARK_PASSWORD, **counts)
+        ))
+
+    def seed(self, rng, options):
+        prefix, batch_size = options['prefix'], options['batch_size']
+        password = make_password(BENCHMARK_PASSWORD)
+
+        User.objects.create_superuser(username=f'{prefix}-admin', email='', password=BENCHMARK_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-user-{i}', password=password) for i in range(options['users'])],
+            batch_size=batch_size,
+        )
+
+        group_members = [rng.sample(users, rng.randint(*options['members'])) for _ in range(options['groups'])]
+        groups = Group.objects.bulk_create(
+            [Group(name=f'{prefix} group {i}', owner=members[0]) for i, members in enumerate(group_members)],
+            batch_size=batch_size,
+        )
+        Membership = Group.members.through
+        Membership.objects.bulk_create(
+            [Membership(group=group, user=user) for group, members in zip(groups, group_members) for user in members],
+            batch_size=batch_size,
+        )
+
+        snapshots = MembershipSnapshot.objects.bulk_create([
+            MembershipSnapshot(group=group, key=snapshot_key([user.pk for user in members]), member_ids=sorted(user.pk for user in members))
+            for group, members in zip(groups, group_members)
+        ], batch_size=batch_size)
+
+        expenses = []
+        for group, members, snapshot in zip(groups, group_members, snapshots):
+            weights = payer_weights(len(members), options['payer_skew'])
+            for i in range(skewed_count(rng, *options['expenses'], options['expense_skew'])):
+                shares = rng.random() < options['shares_ratio']
+                amount = Decimal(str(round(min(max(rng.lognormvariate(3.3, 0.9), 0.01), 99999), 2)))
+                expenses.append(Expense(
+                    group=group, description=f'Expense {i}', amount=amount,
+                    paid_by=rng.choices(members, weights)[0],
+                    split_mode=SHARES if shares else 'equal', snapshot=None if shares else snapshot,
+                ))
+        expenses = Expense.objects.bulk_create(expenses, batch_size=batch_size)
+
+        members_by_group = {group.pk: members for group, members in zip(groups, group_members)}
+        splits = []
+        for expense in expenses:
+            if expense.split_mode == SHARES:
+                members = members_by_group[expense.group_id]
+                splits.extend(build_splits(expense, SHARES, members, [Decimal(rng.randint(1, 3)) for _ in members]))
+        ExpenseSplit.objects.bulk_create(splits, batch_size=batch_size)
+
+        rebuild_group_balances([group.pk for group in groups])
+        return {
+            'users': len(users) + 1, 'groups': len(groups), 'memberships': sum(map(len, group_members)),
+            'expenses': len(expenses), 'splits': len(splits),
+        }
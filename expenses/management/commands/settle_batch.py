@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from expenses.views import SETTLEMENT_MODES, iter_batch_settlement_lines
+
+
+class Command(BaseCommand):
+    help = "Writes the settlement plan of every group (or the given ones) as NDJSON, one group per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='group_ids',
+                            help="Only process this group id (can be repeated).")
+        parser.add_argument('--mode', choices=SETTLEMENT_MODES, default='greedy')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Groups whose balances are loaded per query (default: SETTLE_BATCH_CHUNK_SIZE).")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes for large groups, 1 to disable the pool (default: SETTLE_BATCH_WORKERS).")
+        parser.add_argument('--output', default='-', help="File to write to (default: stdout).")
+
+    def handle(self, *args, **options):
+        output = self.stdout if options['output'] == '-' else open(options['output'], 'w')
+        start = time.perf_counter()
+        groups = 0
+        try:
+            for line in iter_batch_settlement_lines(options['group_ids'], options['mode'], options['chunk_size'], options['workers']):
+                output.write(line)
+                groups += 1
+        finally:
+            if output is not self.stdout:
+                output.close()
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"Settled {groups} group(s) in {elapsed:.2f}s ({groups / max(elapsed, 1e-9):.0f} groups/s).")
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_balances(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseSplit = apps.get_model('expenses', 'ExpenseSplit')
+    GroupMemberBalance = apps.get_model('expenses', 'GroupMemberBalance')
+
+    balances = {}
+    for row in Expense.objects.values('group_id', 'paid_by_id').annotate(total=Sum('amount')):
+        key = (row['group_id'], row['paid_by_id'])
+        balances[key] = balances.get(key, Decimal('0.00')) + row['total']
+    for row in ExpenseSplit.objects.values('expense__group_id', 'owed_by_id').annotate(total=Sum('amount')):
+        key = (row['expense__group_id'], row['owed_by_id'])
+        balances[key] = balances.get(key, Decimal('0.00')) - row['total']
+
+    GroupMemberBalance.objects.bulk_create([
+        GroupMemberBalance(group_id=group_id, user_id=user_id, balance=balance)
+        for (group_id, user_id), balance in balances.items() if balance != 0
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupMemberBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='expenses.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'user'), name='unique_group_member_balance')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
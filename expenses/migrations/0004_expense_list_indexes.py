@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_group_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['group', '-created_at', 'id'], name='expense_group_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensesplit',
+            index=models.Index(fields=['expense', 'owed_by'], name='split_expense_owed_by_idx'),
+        ),
+    ]
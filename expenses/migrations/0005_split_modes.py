@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_expense_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='split_mode',
+            field=models.CharField(choices=[('equal', 'Equal'), ('shares', 'Shares'), ('percentage', 'Percentage'), ('exact', 'Exact amounts')], default='equal', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='expensesplit',
+            name='weight',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+    ]
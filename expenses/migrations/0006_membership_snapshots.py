@@ -0,0 +1,131 @@
+# Generated by Django 5.2 on 2026-10-17 01:02
+
+import hashlib
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The helpers below are frozen copies of what expenses.compaction, expenses.allocation
+# and expenses.settlement did when this migration was written, so later changes to
+# those modules don't change what it does. `manage.py compact_splits` reports on and
+# repeats the compaction.
+
+CHUNK_SIZE = 1000
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+
+def equal_cents(total, count):
+    # Leftover cents go to the first members.
+    sign = -1 if total < 0 else 1
+    part, leftover = divmod(abs(total), count)
+    return [sign * (part + 1)] * leftover + [sign * part] * (count - leftover)
+
+
+def snapshot_key(member_ids):
+    return hashlib.sha1(','.join(str(user_id) for user_id in sorted(member_ids)).encode()).hexdigest()
+
+
+def compact_splits(apps, schema_editor):
+    """
+    Replaces the split rows of equal-split expenses with a membership snapshot, unless
+    their stored amounts differ from an exact equal split (they keep their rows).
+    """
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseSplit = apps.get_model('expenses', 'ExpenseSplit')
+    MembershipSnapshot = apps.get_model('expenses', 'MembershipSnapshot')
+
+    snapshots = {}
+    last_pk = 0
+    while True:
+        chunk = list(
+            Expense.objects.filter(split_mode='equal', snapshot__isnull=True, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', 'group_id', 'amount')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        rows = defaultdict(dict)
+        for expense_id, user_id, amount in ExpenseSplit.objects.filter(expense_id__in=[pk for pk, _, _ in chunk]).values_list('expense_id', 'owed_by_id', 'amount'):
+            rows[expense_id][user_id] = amount
+
+        compacted = defaultdict(list)
+        for expense_id, group_id, amount in chunk:
+            owed = rows.get(expense_id)
+            if not owed:
+                continue
+            member_ids = sorted(owed)
+            cents = equal_cents(to_cents(amount), len(member_ids))
+            if any(owed[user_id] != from_cents(share) for user_id, share in zip(member_ids, cents)):
+                continue
+            key = (group_id, snapshot_key(member_ids))
+            if key not in snapshots:
+                snapshots[key] = MembershipSnapshot.objects.get_or_create(group_id=group_id, key=key[1], defaults={'member_ids': member_ids})[0].pk
+            compacted[snapshots[key]].append(expense_id)
+
+        for snapshot_id, expense_ids in compacted.items():
+            Expense.objects.filter(pk__in=expense_ids).update(snapshot_id=snapshot_id)
+            ExpenseSplit.objects.filter(expense_id__in=expense_ids).delete()
+
+
+def expand_splits(apps, schema_editor):
+    """
+    Writes split rows back for compact expenses and detaches them from their snapshot.
+    """
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseSplit = apps.get_model('expenses', 'ExpenseSplit')
+    MembershipSnapshot = apps.get_model('expenses', 'MembershipSnapshot')
+
+    member_ids = dict(MembershipSnapshot.objects.values_list('pk', 'member_ids'))
+    while True:
+        chunk = list(Expense.objects.filter(snapshot__isnull=False).values_list('pk', 'amount', 'snapshot_id')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        splits = []
+        for expense_id, amount, snapshot_id in chunk:
+            ids = member_ids[snapshot_id]
+            splits.extend(
+                ExpenseSplit(expense_id=expense_id, owed_by_id=user_id, amount=from_cents(share))
+                for user_id, share in zip(ids, equal_cents(to_cents(amount), len(ids)))
+            )
+        ExpenseSplit.objects.bulk_create(splits)
+        Expense.objects.filter(pk__in=[pk for pk, _, _ in chunk]).update(snapshot=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_split_modes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('member_ids', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='membership_snapshots', to='expenses.group')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='expenses', to='expenses.membershipsnapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='membershipsnapshot',
+            constraint=models.UniqueConstraint(fields=('group', 'key'), name='unique_group_membership_snapshot'),
+        ),
+        migrations.RunPython(compact_splits, expand_splits),
+    ]
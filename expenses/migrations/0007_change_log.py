@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    # Existing expenses were last changed at best when they were created.
+    apps.get_model('expenses', 'Expense').objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_membership_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='GroupChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('member', 'Member')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='expenses.group')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'version'], name='group_change_version_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_change_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groupchange',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AddField(
+            model_name='groupchange',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='changes_pruned_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.contrib.auth.models import User
 
 from decimal import Decimal
 
+from .allocation import EQUAL, allocate_split
+from .settlement import from_cents, to_cents
 
 
 class Group(models.Model):
@@ -12,16 +14,87 @@ class Group(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="owned_groups")
     members = models.ManyToManyField(User, related_name="group_memberships", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever expenses or members change, used to version cached settlement plans.
+    version = models.PositiveIntegerField(default=1)
+    # Highest version whose change log entries were pruned (manage.py prune_group_changes);
+    # delta sync cursors older than it can't be served any more.
+    changes_pruned_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
     
+class MembershipSnapshot(models.Model):
+    """
+    A set of group members that equal-split expenses are divided among.
+    Expenses pointing to a snapshot store no ExpenseSplit rows: their splits are derived
+    from the snapshot when read. Expenses split among the same members share one snapshot.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="membership_snapshots")
+    # Hash of member_ids, see expenses.compaction.snapshot_key.
+    key = models.CharField(max_length=40)
+    # Sorted user ids; leftover cents go to the first ones.
+    member_ids = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'key'], name='unique_group_membership_snapshot')
+        ]
+
+    def derive_splits(self, expense, users=None):
+        """
+        Unsaved ExpenseSplits of an equal split of `expense` among the snapshot members.
+        `users` ({id: User}) fills in owed_by.
+        """
+        cents = allocate_split(to_cents(expense.amount), EQUAL, member_count=len(self.member_ids))
+        splits = []
+        for user_id, amount in zip(self.member_ids, cents):
+            split = ExpenseSplit(expense=expense, owed_by_id=user_id, amount=from_cents(amount))
+            if users is not None and user_id in users:
+                split.owed_by = users[user_id]
+            splits.append(split)
+        return splits
+
+    def __str__(self):
+        return f"{len(self.member_ids)} members of group '{self.group.name}'"
+
 class Expense(models.Model):
+    SPLIT_MODE_CHOICES = [
+        ('equal', 'Equal'),
+        ('shares', 'Shares'),
+        ('percentage', 'Percentage'),
+        ('exact', 'Exact amounts'),
+    ]
+
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="expenses")
     description = models.CharField(max_length=255, null=False, blank=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=False)
     paid_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="paid_expenses")
+    split_mode = models.CharField(max_length=10, choices=SPLIT_MODE_CHOICES, default='equal')
+    # Set for compact equal splits, which have no ExpenseSplit rows.
+    snapshot = models.ForeignKey(MembershipSnapshot, on_delete=models.RESTRICT, null=True, blank=True, related_name="expenses")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated expense list (newest first) of a group.
+            models.Index(fields=['group', '-created_at', 'id'], name='expense_group_created_idx'),
+        ]
+
+    def get_splits(self):
+        """
+        The splits of the expense: its ExpenseSplit rows, or for compact equal splits,
+        unsaved ones derived from the membership snapshot. Loaded once per instance
+        (expenses.splits.prefetch_splits loads them for many expenses at once).
+        """
+        if not hasattr(self, '_split_cache'):
+            if self.snapshot_id is None:
+                self._split_cache = list(self.splits.select_related('owed_by').order_by('id'))
+            else:
+                users = User.objects.in_bulk(self.snapshot.member_ids)
+                self._split_cache = self.snapshot.derive_splits(self, users)
+        return self._split_cache
 
     def __str__(self):
         return f"'{self.description}' in group '{self.group.name}' - {self.amount} RON paid by {self.paid_by.username}"
@@ -30,7 +103,62 @@ class ExpenseSplit(models.Model):
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name="splits")
     owed_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="owed_splits")
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=False)
+    # Share or percentage the amount was allocated from (shares/percentage split modes only).
+    weight = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
     # settled = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expense', 'owed_by'], name='split_expense_owed_by_idx'),
+        ]
+
     def __str__(self):
         return f"{self.owed_by.username} owes {self.amount} RON for '{self.expense.description}'"
+
+class GroupMemberBalance(models.Model):
+    """
+    Materialized net balance of a user inside a group (paid - owed).
+    Kept in sync by expenses.balances.BalanceChanges; rebuild it with `manage.py rebuild_balances`.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="balances")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="group_balances")
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'user'], name='unique_group_member_balance')
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} has {self.balance} RON in group '{self.group.name}'"
+
+class GroupChange(models.Model):
+    """
+    Change log behind the delta sync endpoint: one row per expense or membership that
+    changed, tagged with the group version the change was made in (see
+    expenses.changes.record_group_changes). Deleted expenses and removed members stay
+    here as tombstones until `manage.py prune_group_changes` drops old entries.
+    """
+    EXPENSE = 'expense'
+    MEMBER = 'member'
+    KIND_CHOICES = [
+        (EXPENSE, 'Expense'),
+        (MEMBER, 'Member'),
+    ]
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="changes")
+    version = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # The expense id, or the user id for membership changes.
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'version'], name='group_change_version_idx'),
+        ]
+
+    def __str__(self):
+        action = 'deleted' if self.deleted else 'changed'
+        return f"{self.kind} {self.object_id} {action} in version {self.version} of group '{self.group.name}'"
@@ -0,0 +1,126 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ExpenseCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created_at DESC, id ASC), newest expenses first.
+    The cursor carries the (created_at, id) of the row at the page edge, so every page
+    is a single index range scan on (group, -created_at, id) no matter how deep it is.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_page_size(self, request):
+        page_size = settings.EXPENSE_PAGE_SIZE
+        requested = request.query_params.get(self.page_size_query_param)
+        if requested:
+            try:
+                page_size = int(requested)
+            except ValueError:
+                pass
+        return max(1, min(page_size, settings.EXPENSE_MAX_PAGE_SIZE))
+
+    def encode_cursor(self, direction, expense):
+        raw = f"{direction}|{expense.created_at.isoformat()}|{expense.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, created_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError
+            return direction, datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() for async views, reading the page with the async ORM.
+        """
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([row async for row in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The (lazy) queryset of the requested page, with one extra row to tell whether
+        there is another page in the same direction.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            self.direction = 'n'
+            return queryset.order_by('-created_at', 'id')[:self.page_size + 1]
+
+        self.direction, created_at, pk = self.cursor
+        if self.direction == 'n':
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=pk))
+            return queryset.order_by('-created_at', 'id')[:self.page_size + 1]
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset.order_by('created_at', '-id')[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.direction == 'p':
+            rows.reverse()
+
+        if self.direction == 'n':
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        else:
+            self.has_next = True
+            self.has_previous = has_more
+
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor('n', self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor('p', self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
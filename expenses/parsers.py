@@ -0,0 +1,18 @@
+import codecs
+import csv
+
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a CSV body with a header row into an iterator of dicts.
+    Rows are decoded lazily from the request stream, so large uploads are never
+    loaded into memory at once.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        return csv.DictReader(codecs.iterdecode(stream, encoding))
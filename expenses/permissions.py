@@ -0,0 +1,68 @@
+from django.db.models import Exists, OuterRef
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
+from rest_framework import permissions
+
+from .models import Group
+
+
+def get_request_group(request, group_pk):
+    """
+    Loads the group once per request, annotated with `is_member` for the current user,
+    so the group and the membership check cost a single query. Later calls (other
+    permission checks, get_queryset, serializers) reuse the same instance.
+    Raises Http404 if the group does not exist.
+    """
+    resolved = getattr(request, '_resolved_groups', None)
+    if resolved is None:
+        resolved = request._resolved_groups = {}
+
+    group_pk = int(group_pk)
+    if group_pk not in resolved:
+        group = group_with_membership(request.user, group_pk).first()
+        if group is None:
+            raise Http404(_("No Group matches the given query."))
+        resolved[group_pk] = group
+    return resolved[group_pk]
+
+
+async def aget_request_group(request, group_pk):
+    """
+    get_request_group() for async views.
+    """
+    resolved = getattr(request, '_resolved_groups', None)
+    if resolved is None:
+        resolved = request._resolved_groups = {}
+
+    group_pk = int(group_pk)
+    if group_pk not in resolved:
+        group = await group_with_membership(request.user, group_pk).afirst()
+        if group is None:
+            raise Http404(_("No Group matches the given query."))
+        resolved[group_pk] = group
+    return resolved[group_pk]
+
+
+def group_with_membership(user, group_pk):
+    memberships = Group.members.through.objects.filter(group_id=OuterRef('pk'), user_id=user.id)
+    return Group.objects.annotate(is_member=Exists(memberships)).filter(pk=group_pk)
+
+
+class IsGroupMember(permissions.BasePermission):
+    """
+    Allows access only to members of the group in the `group_pk` URL kwarg.
+    Views can set `not_member_message` (a string, or a dict keyed by HTTP method)
+    to customize the error.
+    """
+    default_message = _("You are not a member of this group.")
+
+    def has_permission(self, request, view):
+        group = get_request_group(request, view.kwargs['group_pk'])
+        if group.is_member:
+            return True
+
+        message = getattr(view, 'not_member_message', self.default_message)
+        if isinstance(message, dict):
+            message = message.get(request.method, self.default_message)
+        self.message = message
+        return False
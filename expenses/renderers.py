@@ -0,0 +1,77 @@
+"""
+JSON renderer and parser backed by orjson, falling back to DRF's stdlib versions
+when orjson isn't installed.
+
+The output is byte-for-byte what rest_framework.renderers.JSONRenderer produces:
+orjson encodes dicts, lists, strings and numbers in one pass and only the types it
+formats differently (datetimes, Decimals, lazy strings, ...) are handed back to DRF's
+JSONEncoder. Anything orjson can't do (indented output, non-default UNICODE_JSON /
+COMPACT_JSON / STRICT_JSON settings, integers wider than 64 bits) goes through the
+stdlib path. What's left differs only for floats, which no serializer here renders:
+exponents are written as 1e-7 rather than 1e-07, and NaN / infinity become null
+where the stdlib renderer raises.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# JSONRenderer escapes these so the output is also valid JavaScript.
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for JSONRenderer, see the module docstring.
+    """
+    def __init__(self):
+        super().__init__()
+        self.fallback_encoder = self.encoder_class()
+
+    def default(self, obj):
+        return self.fallback_encoder.default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80' in ret:
+            for separator, escaped in LINE_SEPARATORS:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser using orjson.loads. Like the strict stdlib parser it rejects NaN and
+    Infinity; non-strict parsing goes through the stdlib.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
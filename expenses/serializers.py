@@ -1,10 +1,51 @@
-from rest_framework import serializers
+from rest_framework import serializers, permissions
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.utils.translation import gettext_lazy as _
 from .models import Group, Expense, ExpenseSplit
 from decimal import Decimal
-from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.exceptions import NotFound, ValidationError, PermissionDenied
+from django.db import transaction
+from .balances import BalanceChanges
+from .cache import invalidate_group_lists
+from .changes import record_group_changes
+from .splits import build_splits, lock_expense, save_expense
+from .allocation import SPLIT_MODES, EQUAL, EXACT, SplitAllocationError
+
+def parse_list_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+class SparseFieldsetMixin:
+    """
+    Lets GET requests pick what gets rendered:
+    ?fields=id,description limits the top-level fields and ?expand=splits chooses which
+    of Meta.expandable_fields (nested relations) are rendered. Without either parameter
+    the full representation is returned.
+    Views use rendered_fields() to avoid fetching relations that won't be rendered.
+    """
+    @classmethod
+    def rendered_fields(cls, request):
+        all_fields = set(cls.Meta.fields)
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return all_fields
+
+        requested = parse_list_param(request, 'fields')
+        expand = parse_list_param(request, 'expand')
+
+        selected = all_fields if requested is None else all_fields & requested
+        if expand is not None:
+            expandable = set(cls.Meta.expandable_fields)
+            selected = (selected - expandable) | (expandable & expand)
+        return selected
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.rendered_fields(self.context.get('request'))
+        for field_name in set(self.fields) - selected:
+            self.fields.pop(field_name)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,21 +54,37 @@ class UserSerializer(serializers.ModelSerializer):
 
         read_only_fields = ('id', 'username', 'email')
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     members = UserSerializer(many=True, read_only=True)
 
     class Meta:
         model = Group
         fields = ('id', 'name', 'owner', 'members', 'created_at')
+        expandable_fields = ('members',)
 
     def create(self, validated_data):
         user = self.context['request'].user
         group = Group.objects.create(owner=user, **validated_data)
         group.members.add(user)
+        invalidate_group_lists([user.pk])
 
         return group
 
+class GroupSummarySerializer(serializers.ModelSerializer):
+    """
+    ?view=summary of the group list: counts and totals instead of nested users. The
+    numbers are annotations, see expenses.views.group_summary_queryset.
+    """
+    member_count = serializers.IntegerField(read_only=True)
+    expense_count = serializers.IntegerField(read_only=True)
+    total_spent = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('id', 'name', 'created_at', 'member_count', 'expense_count', 'total_spent', 'balance')
+
 class ExpenseSplitSerializer(serializers.ModelSerializer):
     owed_by = UserSerializer(read_only=True)
 
@@ -36,16 +93,72 @@ class ExpenseSplitSerializer(serializers.ModelSerializer):
 
         fields = ('id', 'owed_by', 'amount')
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class SplitEntrySerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=12, decimal_places=4, required=False)
+
+class SplitSpecSerializer(serializers.Serializer):
+    """
+    How an expense is divided: {"mode": "shares", "entries": [{"user_id": 1, "value": "2"}, ...]}.
+    For "equal" the entries are optional (default: every member) and values are ignored;
+    the other modes need a value per entry (a share, a percentage or an exact amount).
+    """
+    mode = serializers.ChoiceField(choices=SPLIT_MODES, default=EQUAL)
+    entries = SplitEntrySerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        entries = attrs.get('entries') or []
+        user_ids = [entry['user_id'] for entry in entries]
+        if len(user_ids) != len(set(user_ids)):
+            raise serializers.ValidationError(_("Each member can appear only once in a split."))
+        if attrs['mode'] != EQUAL:
+            if not entries:
+                raise serializers.ValidationError(_("Entries are required for this split mode."))
+            if any(entry.get('value') is None for entry in entries):
+                raise serializers.ValidationError(_("Every entry needs a value for this split mode."))
+        return attrs
+
+class ExpenseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     paid_by = UserSerializer(read_only=True)
-    splits = ExpenseSplitSerializer(many=True, read_only=True)
+    paid_by_username = serializers.CharField(source='paid_by.username', read_only=True)
+    splits = ExpenseSplitSerializer(many=True, read_only=True, source='get_splits')
+    split = SplitSpecSerializer(write_only=True, required=False)
     
 
     class Meta:
         model = Expense
 
-        fields = ('id', 'group', 'description', 'amount', 'paid_by', 'splits', 'created_at')
-        read_only_fields = ('id', 'paid_by', 'splits', 'created_at', 'group')
+        fields = ('id', 'group', 'description', 'amount', 'paid_by', 'paid_by_username', 'split_mode', 'split', 'splits', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'paid_by', 'split_mode', 'splits', 'created_at', 'updated_at', 'group')
+        expandable_fields = ('splits',)
+
+    def resolve_split(self, split_spec, members):
+        """
+        Returns (mode, owing members, values) for a validated split spec, checking that
+        everyone in it belongs to the group. No spec means an equal split among all members.
+        """
+        if split_spec is None:
+            return EQUAL, sorted(members, key=lambda member: member.pk), None
+
+        mode = split_spec['mode']
+        entries = split_spec.get('entries')
+        if not entries:
+            return mode, sorted(members, key=lambda member: member.pk), None
+
+        members_by_id = {member.pk: member for member in members}
+        unknown = [entry['user_id'] for entry in entries if entry['user_id'] not in members_by_id]
+        if unknown:
+            raise ValidationError({'split': [_("Users %(ids)s are not members of this group.") % {'ids': unknown}]})
+
+        owing = [members_by_id[entry['user_id']] for entry in entries]
+        values = None if mode == EQUAL else [entry['value'] for entry in entries]
+        return mode, owing, values
+
+    def build_splits(self, expense, mode, owing, values):
+        try:
+            return build_splits(expense, mode, owing, values)
+        except SplitAllocationError as error:
+            raise ValidationError({'split': [str(error)]})
     
     def create(self, validated_data):
         current_user = self.context['request'].user
@@ -55,63 +168,120 @@ class ExpenseSerializer(serializers.ModelSerializer):
     
         group_instance = self.context['group_instance']
 
-        if not group_instance.members.filter(id=current_user.id).exists():
+        # Groups resolved by expenses.permissions.get_request_group carry the membership check.
+        is_member = getattr(group_instance, 'is_member', None)
+        if is_member is None:
+            is_member = group_instance.members.filter(id=current_user.id).exists()
+        if not is_member:
             raise PermissionDenied(_("You are not a member of this group and cannot add expenses to it"))
+
+        members = list(group_instance.members.all())
+        mode, owing, values = self.resolve_split(validated_data.get('split'), members)
+        expense = Expense(paid_by=current_user,
+                          group=group_instance,
+                          description=validated_data['description'],
+                          amount=Decimal(validated_data['amount']),
+                          split_mode=mode
+                          )
+        splits = self.build_splits(expense, mode, owing, values)
         
-        expense = Expense.objects.create(paid_by=current_user,
-                                         group=group_instance,
-                                         description=validated_data['description'],
-                                         amount=Decimal(validated_data['amount'])
-                                         )
-        members = group_instance.members.all()
-        number_of_members = members.count()
-
-        if number_of_members > 0:
-            split_amount_raw = expense.amount / Decimal(number_of_members)
-            split_amount = split_amount_raw.quantize(Decimal('0.01'))
-            splits_to_create = []
-            for member in members:
-                splits_to_create.append(
-                    ExpenseSplit(expense=expense, owed_by=member, amount=split_amount))
-                
-            ExpenseSplit.objects.bulk_create(splits_to_create)
+        with transaction.atomic():
+            splits = save_expense(expense, splits)
+
+            balance_changes = BalanceChanges()
+            balance_changes.add_expense(expense, splits)
+            balance_changes.save()
+            record_group_changes(group_instance.pk, created_expenses=[expense.pk])
 
         return expense
 
     def update(self, instance, validated_data):
-        old_amount = instance.amount
-        instance.description = validated_data.get('description', instance.description)
-        new_amount_str = validated_data.get('amount', str(instance.amount))
-        instance.amount = Decimal(new_amount_str)
-        instance.save(update_fields=['description', 'amount'])
-
-        if old_amount != instance.amount:
-            instance.splits.all().delete()
-            group_of_expense = instance.group
-            members = group_of_expense.members.all()
-            number_of_members = members.count()
-
-            if number_of_members > 0:
-                split_amount_raw = instance.amount / Decimal(number_of_members)
-                split_amount = split_amount_raw.quantize(Decimal('0.01'))
-
-                splits_to_create = []
-                for member in members:
-                    splits_to_create.append(ExpenseSplit(expense=instance, owed_by=member, amount=split_amount))
-                ExpenseSplit.objects.bulk_create(splits_to_create)
+        split_spec = validated_data.get('split')
+
+        with transaction.atomic():
+            current = lock_expense(instance.pk)
+            if current is None:
+                raise NotFound(_("Expense not found."))
+            instance.split_mode = current.split_mode
+            instance.snapshot_id = current.snapshot_id
+            new_amount = Decimal(validated_data.get('amount', current.amount))
+            recompute = split_spec is not None or new_amount != current.amount
+
+            balance_changes = BalanceChanges()
+            if recompute:
+                old_splits = current.get_splits()
+                balance_changes.remove_expense(current, old_splits)
+
+            instance.description = validated_data.get('description', instance.description)
+            instance.amount = new_amount
+
+            if recompute:
+                if split_spec is None and instance.split_mode == EXACT:
+                    raise ValidationError({'split': [_("Send the new exact amounts when changing the amount of this expense.")]})
+                if split_spec is None and instance.split_mode != EQUAL:
+                    # Keep the stored shares/percentages and re-allocate the new amount.
+                    mode = instance.split_mode
+                    owing = [split.owed_by for split in old_splits]
+                    values = [split.weight for split in old_splits]
+                else:
+                    members = list(instance.group.members.all())
+                    mode, owing, values = self.resolve_split(split_spec, members)
+                desired_splits = self.build_splits(instance, mode, owing, values)
+                instance.split_mode = mode
+
+            if not recompute:
+                instance.save(update_fields=['description', 'amount', 'updated_at'])
+            else:
+                stored_splits = old_splits if instance.snapshot_id is None else []
+                new_splits = save_expense(instance, desired_splits, stored_splits, update_fields=['description', 'amount', 'split_mode', 'updated_at'])
+
+                balance_changes.add_expense(instance, new_splits)
+                balance_changes.save()
+            # Also for description-only edits, which delta sync clients need to see.
+            record_group_changes(instance.group_id, updated_expenses=[instance.pk])
 
         return instance
 
+class BulkExpenseRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk import. paid_by is the username of a group member and defaults
+    to the importing user.
+    """
+    description = serializers.CharField(max_length=255)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    paid_by = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_paid_by(self, value):
+        if not value:
+            return None
+        members_by_username = self.context['members_by_username']
+        if value not in members_by_username:
+            raise serializers.ValidationError(_("User is not a member of this group."))
+        return members_by_username[value]
+
 class OptimizedSettlementSerializer(serializers.Serializer):
     from_user_username = serializers.CharField(source='from_user.username')
     to_user_username = serializers.CharField(source='to_user.username')
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
 
+class UserGroupBalanceSerializer(serializers.Serializer):
+    group_id = serializers.IntegerField()
+    group_name = serializers.CharField()
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class UserBalancesSerializer(serializers.Serializer):
+    groups = UserGroupBalanceSerializer(many=True)
+    total_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
 class SettlementTransactionSerializer(serializers.Serializer):
     from_user = UserSerializer(source='from_user_obj')
     to_user = UserSerializer(source='to_user_obj')
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
 
+class SettleBatchSerializer(serializers.Serializer):
+    group_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    mode = serializers.ChoiceField(choices=('greedy', 'optimal'), default='greedy')
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
@@ -0,0 +1,158 @@
+"""
+Settlement engine working on integer cents.
+
+It has no Django dependencies so it can be benchmarked and reused on its own.
+"""
+import heapq
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def settle_balances(balances):
+    """
+    Takes {user_id: balance_in_cents} (positive = is owed money, negative = owes money)
+    and returns a list of (from_user_id, to_user_id, cents) transfers.
+
+    Debtors and creditors that owe/are owed exactly the same amount are paired first,
+    then the largest remaining debtor always pays the largest remaining creditor
+    (both kept in max-heaps, so partial transfers are re-prioritized).
+    When the balances sum to zero every balance ends at exactly zero, using at most
+    (non-zero balances - 1) transfers. If they don't (e.g. cents lost by rounding),
+    the difference stays with the last creditor or debtor.
+    """
+    debtors = sorted(((-cents, user_id) for user_id, cents in balances.items() if cents < 0), key=lambda item: (-item[0], item[1]))
+    creditors = sorted(((cents, user_id) for user_id, cents in balances.items() if cents > 0), key=lambda item: (-item[0], item[1]))
+
+    transfers = []
+
+    creditors_by_amount = {}
+    for cents, user_id in creditors:
+        creditors_by_amount.setdefault(cents, []).append(user_id)
+    for amount_list in creditors_by_amount.values():
+        amount_list.reverse()
+
+    debtor_heap = []
+    for cents, debtor_id in debtors:
+        matching_creditors = creditors_by_amount.get(cents)
+        if matching_creditors:
+            transfers.append((debtor_id, matching_creditors.pop(), cents))
+        else:
+            debtor_heap.append((-cents, debtor_id))
+
+    creditor_heap = [(-cents, user_id) for cents, user_ids in creditors_by_amount.items() for user_id in user_ids]
+    heapq.heapify(debtor_heap)
+    heapq.heapify(creditor_heap)
+
+    while debtor_heap and creditor_heap:
+        debt, debtor_id = heapq.heappop(debtor_heap)
+        credit, creditor_id = heapq.heappop(creditor_heap)
+        debt, credit = -debt, -credit
+
+        amount = min(debt, credit)
+        transfers.append((debtor_id, creditor_id, amount))
+
+        if debt > amount:
+            heapq.heappush(debtor_heap, (amount - debt, debtor_id))
+        if credit > amount:
+            heapq.heappush(creditor_heap, (amount - credit, creditor_id))
+
+    return transfers
+
+
+class SettlementBudgetExceeded(Exception):
+    pass
+
+
+def settle_balances_optimal(balances, max_balances=16, time_budget=0.2):
+    """
+    Minimum-transfer plan: a group of n non-zero balances that can be split into k
+    independent zero-sum subsets needs exactly n - k transfers, so this finds the
+    partition with the most zero-sum subsets (bitmask DP over all subsets, memoized
+    in a flat list) and settles each subset on its own.
+
+    Raises SettlementBudgetExceeded when there are more than max_balances non-zero
+    balances, or when the search takes longer than time_budget seconds.
+    """
+    users = sorted(user_id for user_id, cents in balances.items() if cents)
+    if len(users) > max_balances:
+        raise SettlementBudgetExceeded(f"{len(users)} balances exceed the limit of {max_balances}.")
+    if not users:
+        return []
+
+    deadline = time.perf_counter() + time_budget
+    amounts = [balances[user_id] for user_id in users]
+    full_mask = (1 << len(users)) - 1
+
+    subset_sums = [0] * (full_mask + 1)
+    best_groups = [0] * (full_mask + 1)
+    for mask in range(1, full_mask + 1):
+        if not mask & 1023 and time.perf_counter() > deadline:
+            raise SettlementBudgetExceeded(f"Exceeded the time budget of {time_budget}s.")
+
+        lowest_bit = mask & -mask
+        subset_sums[mask] = subset_sums[mask ^ lowest_bit] + amounts[lowest_bit.bit_length() - 1]
+
+        best = 0
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            if best_groups[mask ^ bit] > best:
+                best = best_groups[mask ^ bit]
+        best_groups[mask] = best + (1 if subset_sums[mask] == 0 else 0)
+
+    # Walk back from the full set, removing one user at a time along an optimal path.
+    # Reversed, that gives an ordering whose zero-sum prefixes are the subset boundaries.
+    order = []
+    mask = full_mask
+    while mask:
+        target = best_groups[mask] - (1 if subset_sums[mask] == 0 else 0)
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            if best_groups[mask ^ bit] == target:
+                order.append(bit.bit_length() - 1)
+                mask ^= bit
+                break
+    order.reverse()
+
+    transfers = []
+    subset = {}
+    running_total = 0
+    for index in order:
+        subset[users[index]] = amounts[index]
+        running_total += amounts[index]
+        if running_total == 0:
+            transfers.extend(settle_balances(subset))
+            subset = {}
+    if subset:
+        transfers.extend(settle_balances(subset))
+    return transfers
+
+
+def settle_balances_for_mode(balances, mode='greedy', max_balances=16, time_budget=0.2):
+    """
+    Transfers for `mode` ('greedy' or 'optimal') as (transfers, outcome), where outcome
+    is 'greedy', 'fallback' (the exact solver ran over its budget, the greedy transfers
+    are returned), 'optimal' or 'optimal_win' (the exact plan needs fewer transfers).
+    Picklable and Django-free, so it can run in worker processes.
+    """
+    greedy_transfers = settle_balances(balances)
+    if mode != 'optimal':
+        return greedy_transfers, 'greedy'
+    try:
+        optimal_transfers = settle_balances_optimal(balances, max_balances=max_balances, time_budget=time_budget)
+    except SettlementBudgetExceeded:
+        return greedy_transfers, 'fallback'
+    return optimal_transfers, 'optimal_win' if len(optimal_transfers) < len(greedy_transfers) else 'optimal'
@@ -0,0 +1,231 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Exists, OuterRef, ProtectedError
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .allocation import EQUAL, PERCENTAGE, SHARES, allocate_split, allocate_splits_batch
+from .compaction import snapshot_key
+from .models import Expense, ExpenseSplit, MembershipSnapshot
+from .settlement import from_cents, to_cents
+
+# Above this many distinct new amounts, changed splits are written with one bulk_update
+# instead of one UPDATE ... WHERE id IN (...) per amount.
+MAX_GROUPED_SPLIT_UPDATES = 5
+
+
+def make_splits(expense, mode, members, values, cents):
+    weighted = mode in (SHARES, PERCENTAGE)
+    return [
+        ExpenseSplit(expense=expense, owed_by=member, amount=from_cents(amount), weight=values[index] if weighted else None)
+        for index, (member, amount) in enumerate(zip(members, cents))
+    ]
+
+
+def build_splits(expense, mode, members, values=None):
+    """
+    Unsaved ExpenseSplits for `members` (in order) according to the split mode,
+    see expenses.allocation.allocate_split. The amounts always add up to expense.amount.
+    """
+    cents = allocate_split(to_cents(expense.amount), mode, values, member_count=len(members))
+    return make_splits(expense, mode, members, values, cents)
+
+
+def build_equal_splits(expense, members):
+    """
+    One ExpenseSplit per member, each owing amount / member count; leftover cents go
+    to the members with the lowest ids.
+    """
+    return build_splits(expense, EQUAL, sorted(members, key=lambda member: member.pk))
+
+
+def build_splits_batch(items):
+    """
+    Splits for many expenses at once. `items` is a list of (expense, mode, members, values);
+    returns one list of unsaved splits per item. Allocation runs as one batch, so equal
+    splits of the same amount among the same number of members are computed once.
+    """
+    allocations = allocate_splits_batch(
+        (to_cents(expense.amount), mode, values, len(members)) for expense, mode, members, values in items
+    )
+    return [
+        make_splits(expense, mode, members, values, cents)
+        for (expense, mode, members, values), cents in zip(items, allocations)
+    ]
+
+
+def sync_expense_splits(expense, desired_splits, existing_splits):
+    """
+    Makes the stored splits of an expense match desired_splits (unsaved ExpenseSplit
+    objects) by writing only the differences: changed amounts are bulk-updated in place,
+    missing members are bulk-created and members no longer owing are deleted.
+    Call it inside a transaction.
+
+    Returns (splits, changes) where splits is the resulting list of splits and changes
+    counts the rows {'created': ..., 'updated': ..., 'deleted': ...}.
+    """
+    existing_by_user = {}
+    duplicates = []
+    for split in existing_splits:
+        if split.owed_by_id in existing_by_user:
+            duplicates.append(split)
+        else:
+            existing_by_user[split.owed_by_id] = split
+
+    splits = []
+    to_create = []
+    to_update = []
+    for desired in desired_splits:
+        current = existing_by_user.pop(desired.owed_by_id, None)
+        if current is None:
+            to_create.append(desired)
+            splits.append(desired)
+            continue
+        if current.amount != desired.amount or current.weight != desired.weight:
+            current.amount = desired.amount
+            current.weight = desired.weight
+            to_update.append(current)
+        splits.append(current)
+
+    to_delete = [split.pk for split in duplicates] + [split.pk for split in existing_by_user.values()]
+
+    if to_delete:
+        ExpenseSplit.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        ids_by_value = {}
+        for split in to_update:
+            ids_by_value.setdefault((split.amount, split.weight), []).append(split.pk)
+        if len(ids_by_value) <= MAX_GROUPED_SPLIT_UPDATES:
+            # Equal splits all move to the same amount: one plain UPDATE, no per-row CASE.
+            for (amount, weight), ids in ids_by_value.items():
+                ExpenseSplit.objects.filter(pk__in=ids).update(amount=amount, weight=weight)
+        else:
+            ExpenseSplit.objects.bulk_update(to_update, ['amount', 'weight'], batch_size=500)
+    if to_create:
+        ExpenseSplit.objects.bulk_create(to_create)
+
+    return splits, {'created': len(to_create), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+
+def get_membership_snapshot(group_id, members):
+    """
+    The MembershipSnapshot of `members` (users or ids) in the group, created on first use.
+    """
+    member_ids = sorted(member if isinstance(member, int) else member.pk for member in members)
+    snapshot, _created = MembershipSnapshot.objects.get_or_create(
+        group_id=group_id, key=snapshot_key(member_ids), defaults={'member_ids': member_ids}
+    )
+    return snapshot
+
+
+def lock_expense(expense_id):
+    """
+    The expense re-read with its row locked until the transaction ends (call it inside
+    one), or None if it was deleted meanwhile. Changes compute the balance deltas of
+    the old amount and splits from it, not from an instance loaded before the
+    transaction, so concurrent writes to the same expense can't apply them twice.
+    """
+    return Expense.objects.select_for_update(of=('self',)).select_related('snapshot').filter(pk=expense_id).first()
+
+
+def save_expense(expense, splits, stored_splits=(), update_fields=None):
+    """
+    Saves the expense together with its splits; call it inside a transaction.
+    Equal splits are stored compactly: the expense points to the membership snapshot of
+    the owing members and has no split rows. Other modes get one ExpenseSplit row per
+    member, writing only the differences with stored_splits (the current rows).
+    Returns the resulting splits.
+    """
+    if expense.split_mode == EQUAL:
+        expense.snapshot = get_membership_snapshot(expense.group_id, [split.owed_by_id for split in splits])
+    else:
+        expense.snapshot = None
+    expense.save(update_fields=update_fields and [*update_fields, 'snapshot'])
+
+    if expense.split_mode == EQUAL:
+        if stored_splits:
+            ExpenseSplit.objects.filter(pk__in=[split.pk for split in stored_splits]).delete()
+    else:
+        splits, _changes = sync_expense_splits(expense, splits, stored_splits)
+
+    expense._split_cache = splits
+    return splits
+
+
+def prefetch_splits(expenses):
+    """
+    Loads get_splits() for many expenses with at most two queries: one for the stored
+    split rows and one for the users of compact equal splits.
+    Compact expenses need their snapshot loaded (select_related('snapshot')).
+    """
+    stored, compact = split_pending(expenses)
+    if stored:
+        attach_stored_splits(stored, stored_splits_queryset(stored))
+    if compact:
+        attach_compact_splits(compact, User.objects.in_bulk(snapshot_member_ids(compact)))
+
+
+async def aprefetch_splits(expenses):
+    """
+    prefetch_splits() for async views.
+    """
+    stored, compact = split_pending(expenses)
+    if stored:
+        attach_stored_splits(stored, [split async for split in stored_splits_queryset(stored)])
+    if compact:
+        attach_compact_splits(compact, await User.objects.ain_bulk(snapshot_member_ids(compact)))
+
+
+def split_pending(expenses):
+    expenses = [expense for expense in expenses if not hasattr(expense, '_split_cache')]
+    stored = [expense for expense in expenses if expense.snapshot_id is None]
+    compact = [expense for expense in expenses if expense.snapshot_id is not None]
+    return stored, compact
+
+
+def stored_splits_queryset(expenses):
+    return ExpenseSplit.objects.filter(expense__in=expenses).select_related('owed_by').order_by('id')
+
+
+def snapshot_member_ids(expenses):
+    return {user_id for expense in expenses for user_id in expense.snapshot.member_ids}
+
+
+def attach_stored_splits(expenses, splits):
+    splits_by_expense = defaultdict(list)
+    for split in splits:
+        splits_by_expense[split.expense_id].append(split)
+    for expense in expenses:
+        expense._split_cache = splits_by_expense[expense.pk]
+
+
+def attach_compact_splits(expenses, users):
+    for expense in expenses:
+        expense._split_cache = expense.snapshot.derive_splits(expense, users)
+
+
+def snapshots_owed_by(user_id, using='default'):
+    """
+    The membership snapshots in use by expenses that list the user.
+    """
+    snapshots = MembershipSnapshot.objects.using(using).filter(Exists(Expense.objects.filter(snapshot=OuterRef('pk'))))
+    if connections[using].features.supports_json_field_contains:
+        return list(snapshots.filter(member_ids__contains=[user_id]))
+    return [snapshot for snapshot in snapshots.iterator() if user_id in snapshot.member_ids]
+
+
+@receiver(pre_delete, sender=User)
+def protect_snapshot_members(sender, instance, using, **kwargs):
+    """
+    Compact equal splits list their owing users in a snapshot instead of pointing to
+    them with ExpenseSplit.owed_by (PROTECT). Deleting such a user would drop their
+    ledger balances, so it is refused the same way.
+    """
+    snapshots = snapshots_owed_by(instance.pk, using)
+    if snapshots:
+        raise ProtectedError(
+            f"Cannot delete user {instance.pk}: equal-split expenses still list them as owing.",
+            snapshots,
+        )
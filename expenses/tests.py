@@ -1,10 +1,51 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase
+from io import StringIO
 from django.contrib.auth.models import User
 from decimal import Decimal
 from .models import Group, Expense, ExpenseSplit
 from .views import calculate_optimized_settlements
+from .balances import rebuild_group_balances, find_balance_drift
+from .models import GroupChange, GroupMemberBalance, MembershipSnapshot
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from .cache import get_cache_stats, get_group_list_key, reset_cache_stats, set_cached_group_list
+from .authentication import UserCache, get_user_cache, invalidate_cached_user
+from .splits import build_splits, sync_expense_splits
+from .allocation import EQUAL, SHARES, PERCENTAGE, EXACT, SplitAllocationError, allocate_split, allocate_splits_batch
+from .settlement import settle_balances, settle_balances_optimal, SettlementBudgetExceeded, to_cents
+import random
+import json
+import tracemalloc
+from django.db import connection, transaction
+from django.db.models import ProtectedError
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory
+from .async_views import AsyncExpenseListView, AsyncGroupEventsView, AsyncGroupListView, AsyncSettleUpView, route_by_method
+from core.pubsub import CacheBackend, InMemoryBackend, get_hub
+import asyncio
+from .views import ExpenseDetailView, GroupListCreateView
+from .serializers import ExpenseSerializer, GroupSerializer
+from . import renderers
+from .renderers import FastJSONParser, FastJSONRenderer
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from unittest import mock
+from io import BytesIO
+import datetime
+import uuid
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+from core.profiling import request_stats
+from core import replicas
+from unittest import skipUnless
 
 class SettlementCalculationTests(TestCase):
     def setUp(self):
@@ -31,6 +72,7 @@ class SettlementCalculationTests(TestCase):
         ExpenseSplit.objects.create(expense=expense1, owed_by=self.user_a, amount=Decimal('10.00'))
         ExpenseSplit.objects.create(expense=expense1, owed_by=self.user_b, amount=Decimal('10.00'))
         ExpenseSplit.objects.create(expense=expense1, owed_by=self.user_c, amount=Decimal('10.00'))
+        rebuild_group_balances([self.test_group.id])
 
         settlements = calculate_optimized_settlements(self.test_group.id)
 
@@ -59,6 +101,7 @@ class SettlementCalculationTests(TestCase):
         ExpenseSplit.objects.create(expense=exp2, owed_by=self.user_a, amount=Decimal('20.00'))
         ExpenseSplit.objects.create(expense=exp2, owed_by=self.user_b, amount=Decimal('20.00'))
         ExpenseSplit.objects.create(expense=exp2, owed_by=self.user_c, amount=Decimal('20.00'))
+        rebuild_group_balances([self.test_group.id])
 
         settlements = calculate_optimized_settlements(self.test_group.id)
 
@@ -75,8 +118,56 @@ class SettlementCalculationTests(TestCase):
             self.fail("No settlements generated when one was expected.")
 
 
+class SettlementEngineTests(SimpleTestCase):
+    def apply(self, balances, transfers):
+        remaining = dict(balances)
+        for from_user_id, to_user_id, cents in transfers:
+            self.assertGreater(cents, 0)
+            remaining[from_user_id] += cents
+            remaining[to_user_id] -= cents
+        return remaining
+
+    def test_exact_matches_are_paired_first(self):
+        balances = {1: 500, 2: 300, 3: -300, 4: -500}
+        transfers = settle_balances(balances)
+
+        self.assertEqual(sorted(transfers), [(3, 2, 300), (4, 1, 500)])
+
+    def test_random_zero_sum_balances_are_fully_settled(self):
+        rng = random.Random(7)
+        for members in (2, 5, 50, 500):
+            balances = {user_id: rng.randint(-10000, 10000) for user_id in range(1, members)}
+            balances[members] = -sum(balances.values())
+            non_zero = sum(1 for cents in balances.values() if cents)
+
+            transfers = settle_balances(balances)
+
+            self.assertFalse(any(self.apply(balances, transfers).values()))
+            self.assertLessEqual(len(transfers), max(non_zero - 1, 0))
+
+    def test_optimal_solver_uses_fewer_transfers_than_greedy(self):
+        balances = {1: -200, 2: -500, 3: 700, 4: 300, 5: -900, 6: 600}
+
+        greedy = settle_balances(balances)
+        optimal = settle_balances_optimal(balances)
+
+        self.assertEqual(len(greedy), 5)
+        self.assertEqual(len(optimal), 4)
+        self.assertFalse(any(self.apply(balances, optimal).values()))
+
+    def test_optimal_solver_respects_size_budget(self):
+        balances = {user_id: 100 if user_id % 2 else -100 for user_id in range(1, 11)}
+        with self.assertRaises(SettlementBudgetExceeded):
+            settle_balances_optimal(balances, max_balances=8)
+
+    def test_to_cents(self):
+        self.assertEqual(to_cents(Decimal('12.34')), 1234)
+        self.assertEqual(to_cents(Decimal('-0.01')), -1)
+
+
 class ExpenseAPITests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
         self.user1 = User.objects.create_user(username='apiuser1', password='password123', email='api1@test.com')
@@ -104,6 +195,27 @@ class ExpenseAPITests(TestCase):
 
         self.assertTrue(created_group.members.filter(id=self.user1.id).exists())
 
+    def test_group_list_summary(self):
+        self.group_user1.members.add(self.user2)
+        empty_group = Group.objects.create(name='Empty', owner=self.user2)
+        empty_group.members.add(self.user1, self.user2)
+        url = f'/api/groups/{self.group_user1.id}/expenses/'
+        self.client.post(url, {'description': 'Dinner', 'amount': '30.00'}, format='json')
+        self.client.post(url, {'description': 'Taxi', 'amount': '12.50'}, format='json')
+
+        response = self.client.get('/api/groups/?view=summary')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [{key: group[key] for key in ('name', 'member_count', 'expense_count', 'total_spent', 'balance')} for group in response.data],
+            [
+                {'name': 'Empty', 'member_count': 2, 'expense_count': 0, 'total_spent': '0.00', 'balance': '0.00'},
+                {'name': "User1's Group", 'member_count': 2, 'expense_count': 2, 'total_spent': '42.50', 'balance': '21.25'},
+            ],
+        )
+        self.assertNotIn('members', response.data[0])
+        self.assertEqual(self.client.get('/api/groups/?view=compact').status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_list_user_groups(self):
         Group.objects.create(name="User1's Second Group", owner=self.user1).members.add(self.user1)
 
@@ -172,9 +284,10 @@ class ExpenseAPITests(TestCase):
 
         expense.refresh_from_db()
     
-        self.assertEqual(expense.splits.count(), 2)
-        for split in expense.splits.all():
-            self.assertEqual(split.amount, Decimal('60.00'))
+        # The legacy split row is replaced by a compact equal split among both members.
+        self.assertEqual(expense.splits.count(), 0)
+        self.assertEqual(expense.snapshot.member_ids, sorted([self.user1.id, self.user2.id]))
+        self.assertEqual([split.amount for split in expense.get_splits()], [Decimal('60.00'), Decimal('60.00')])
 
     def test_update_expense_as_non_payer_fails(self):
         expense = Expense.objects.create(group=self.group_user1, description='Test Expense', amount=Decimal('50.00'), paid_by=self.user1)
@@ -293,4 +406,1443 @@ class ExpenseAPITests(TestCase):
 
         self.user1.refresh_from_db()
         self.assertEqual(self.user1.first_name, payload['first_name'])
-        self.assertEqual(self.user1.last_name, payload['last_name'])
\ No newline at end of file
+        self.assertEqual(self.user1.last_name, payload['last_name'])
+
+
+class GroupMemberBalanceLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(username='ledgeruser1', password='password123')
+        self.user2 = User.objects.create_user(username='ledgeruser2', password='password123')
+
+        response_login = self.client.post('/api/auth/login/', {'username': 'ledgeruser1', 'password': 'password123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response_login.data['access']}")
+
+        self.group = Group.objects.create(name='Ledger Group', owner=self.user1)
+        self.group.members.add(self.user1, self.user2)
+        self.expenses_url = f'/api/groups/{self.group.id}/expenses/'
+
+    def balance_of(self, user):
+        row = GroupMemberBalance.objects.filter(group=self.group, user=user).first()
+        return row.balance if row else Decimal('0.00')
+
+    def test_ledger_follows_expense_create_update_delete(self):
+        response = self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.balance_of(self.user1), Decimal('50.00'))
+        self.assertEqual(self.balance_of(self.user2), Decimal('-50.00'))
+
+        expense_url = f"{self.expenses_url}{response.data['id']}/"
+        response = self.client.patch(expense_url, {'amount': '40.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.balance_of(self.user1), Decimal('20.00'))
+        self.assertEqual(self.balance_of(self.user2), Decimal('-20.00'))
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+        response = self.client.delete(expense_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.balance_of(self.user1), Decimal('0.00'))
+        self.assertEqual(self.balance_of(self.user2), Decimal('0.00'))
+
+    def test_stale_expense_writes_keep_ledger_in_sync(self):
+        expense_id = self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json').data['id']
+        expense_url = f"{self.expenses_url}{expense_id}/"
+
+        # An update computed from an instance loaded before a concurrent change of the amount.
+        stale = Expense.objects.get(pk=expense_id)
+        self.client.patch(expense_url, {'amount': '60.00'}, format='json')
+        serializer = ExpenseSerializer(stale, data={'amount': '40.00'}, partial=True, context={'request': mock.Mock(user=self.user1)})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.balance_of(self.user1), Decimal('20.00'))
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+        # A second delete of an instance another request already deleted.
+        stale = Expense.objects.get(pk=expense_id)
+        self.client.delete(expense_url)
+        version = Group.objects.get(pk=self.group.id).version
+        view = ExpenseDetailView(request=mock.Mock(user=self.user1), kwargs={'group_pk': self.group.id, 'expense_pk': expense_id})
+        view.perform_destroy(stale)
+
+        self.assertEqual(self.balance_of(self.user1), Decimal('0.00'))
+        self.assertEqual(self.balance_of(self.user2), Decimal('0.00'))
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+        self.assertEqual(Group.objects.get(pk=self.group.id).version, version)
+
+    def test_settle_up_reads_ledger_with_constant_queries(self):
+        for i in range(20):
+            self.client.post(self.expenses_url, {'description': f'Expense {i}', 'amount': '10.00'}, format='json')
+
+        with self.assertNumQueries(1):
+            settlements = calculate_optimized_settlements(self.group.id)
+
+        self.assertEqual(len(settlements), 1)
+        self.assertEqual(settlements[0]['amount'], Decimal('100.00'))
+
+    def test_rebuild_balances_command_fixes_drift(self):
+        expense = Expense.objects.create(group=self.group, description='Out of band', amount=Decimal('30.00'), paid_by=self.user2)
+        ExpenseSplit.objects.create(expense=expense, owed_by=self.user1, amount=Decimal('30.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', '--verify', stdout=StringIO())
+
+        call_command('rebuild_balances', stdout=StringIO())
+        call_command('rebuild_balances', '--verify', stdout=StringIO())
+        self.assertEqual(self.balance_of(self.user2), Decimal('30.00'))
+
+    def test_rebuild_balances_invalidates_settlement_plans(self):
+        self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json')
+        settle_url = f'/api/groups/{self.group.id}/settle/'
+        response = self.client.get(settle_url)
+        etag = response['ETag']
+        self.assertEqual(response.data[0]['amount'], '50.00')
+
+        expense = Expense.objects.create(group=self.group, description='Out of band', amount=Decimal('30.00'), paid_by=self.user2)
+        ExpenseSplit.objects.create(expense=expense, owed_by=self.user1, amount=Decimal('30.00'))
+        call_command('rebuild_balances', stdout=StringIO())
+
+        response = self.client.get(settle_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['amount'], '20.00')
+
+        # Nothing to fix: the version, and so the ETag, stays.
+        version = Group.objects.get(pk=self.group.id).version
+        call_command('rebuild_balances', stdout=StringIO())
+        self.assertEqual(Group.objects.get(pk=self.group.id).version, version)
+
+    def test_user_balances_across_groups(self):
+        self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json')
+
+        other_group = Group.objects.create(name='Other Group', owner=self.user2)
+        other_group.members.add(self.user1, self.user2)
+        expense = Expense.objects.create(group=other_group, description='Taxi', amount=Decimal('30.00'), paid_by=self.user2)
+        ExpenseSplit.objects.create(expense=expense, owed_by=self.user1, amount=Decimal('15.00'))
+        ExpenseSplit.objects.create(expense=expense, owed_by=self.user2, amount=Decimal('15.00'))
+        rebuild_group_balances([other_group.id])
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/auth/user/balances/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        balances = {group['group_id']: Decimal(group['balance']) for group in response.data['groups']}
+        self.assertEqual(balances, {self.group.id: Decimal('50.00'), other_group.id: Decimal('-15.00')})
+        self.assertEqual(Decimal(response.data['total_balance']), Decimal('35.00'))
+
+    def test_settle_up_etag_and_cache(self):
+        self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json')
+        settle_url = f'/api/groups/{self.group.id}/settle/'
+        reset_cache_stats()
+
+        response = self.client.get(settle_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Only the group lookup: the authenticated user comes from the user cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(settle_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(settle_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+        stats = get_cache_stats()
+        self.assertEqual(stats['settlement_misses'], 1)
+        self.assertEqual(stats['settlement_hits'], 1)
+        self.assertEqual(stats['settlement_not_modified'], 1)
+
+        user3 = User.objects.create_user(username='ledgeruser3', password='password123')
+        self.client.post(f'/api/groups/{self.group.id}/members/', {'username': user3.username}, format='json')
+
+        response = self.client.get(settle_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cache_stats_requires_admin(self):
+        response = self.client.get('/api/stats/cache/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user1.is_staff = True
+        self.user1.save()
+        response = self.client.get('/api/stats/cache/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_settle_up_optimal_mode(self):
+        self.client.post(self.expenses_url, {'description': 'Dinner', 'amount': '100.00'}, format='json')
+        settle_url = f'/api/groups/{self.group.id}/settle/'
+
+        response = self.client.get(settle_url, {'mode': 'optimal'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Settlement-Mode'], 'optimal')
+        self.assertEqual(len(response.data), 1)
+
+        with self.settings(SETTLEMENT_OPTIMAL_MAX_BALANCES=1):
+            cache.clear()
+            response = self.client.get(settle_url, {'mode': 'optimal'})
+        self.assertEqual(response['X-Settlement-Mode'], 'greedy')
+
+        response = self.client.get(settle_url, {'mode': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExpensePaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='pageuser', password='password123')
+        self.client.force_authenticate(self.user)
+
+        self.group = Group.objects.create(name='Paged Group', owner=self.user)
+        self.group.members.add(self.user)
+        self.url = f'/api/groups/{self.group.id}/expenses/'
+
+        expenses = Expense.objects.bulk_create([
+            Expense(group=self.group, description=f'Expense {i}', amount=Decimal('1.00'), paid_by=self.user)
+            for i in range(7)
+        ])
+        # Force ties on created_at so the id tie-breaker is exercised.
+        Expense.objects.filter(pk__in=[expenses[2].pk, expenses[3].pk, expenses[4].pk]).update(created_at=expenses[2].created_at)
+        self.expected_order = list(Expense.objects.filter(group=self.group).order_by('-created_at', 'id').values_list('id', flat=True))
+
+    def test_walk_pages_forward_and_back(self):
+        seen = []
+        pages = []
+        url = f'{self.url}?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            seen.extend(expense['id'] for expense in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, self.expected_order)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual([expense['id'] for expense in response.data['results']], self.expected_order[3:6])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([expense['id'] for expense in response.data['results']], self.expected_order[:3])
+        self.assertIsNone(response.data['previous'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(EXPENSE_MAX_PAGE_SIZE=2):
+            response = self.client.get(self.url, {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list/detail endpoint must run a fixed number of queries, whatever the
+    number of expenses, splits or members involved.
+    """
+    SIZES = (1, 10, 500)
+    BUDGETS = {
+        'expense-list': 3,
+        'expense-detail': 3,
+        'group-list': 2,
+        'group-summary': 1,
+        'group-detail': 2,
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='budgetowner', password='password123')
+        self.client.force_authenticate(self.owner)
+
+    def seed_group(self, size):
+        group = Group.objects.create(name=f'Budget Group {size}', owner=self.owner)
+        members = [self.owner] + User.objects.bulk_create([
+            User(username=f'budget-{size}-{i}') for i in range(size - 1)
+        ])
+        group.members.add(*members)
+
+        expenses = Expense.objects.bulk_create([
+            Expense(group=group, description=f'Expense {i}', amount=Decimal('10.00'), paid_by=members[i % len(members)])
+            for i in range(size)
+        ])
+        splits = []
+        for expense in expenses:
+            splits.extend(ExpenseSplit(expense=expense, owed_by=member, amount=Decimal('1.00')) for member in members[:5])
+        # One expense shared by every member, for the detail endpoint.
+        splits.extend(ExpenseSplit(expense=expenses[0], owed_by=member, amount=Decimal('0.01')) for member in members[5:])
+        ExpenseSplit.objects.bulk_create(splits)
+        return group, expenses[0]
+
+    def assert_budget(self, name, url):
+        with self.assertNumQueries(self.BUDGETS[name]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_query_budgets(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                group, big_expense = self.seed_group(size)
+
+                response = self.assert_budget('expense-list', f'/api/groups/{group.id}/expenses/?page_size=200')
+                self.assertEqual(len(response.data['results']), min(size, 200))
+
+                response = self.assert_budget('expense-detail', f'/api/groups/{group.id}/expenses/{big_expense.id}/')
+                self.assertEqual(len(response.data['splits']), size)
+
+                response = self.assert_budget('group-detail', f'/api/groups/{group.id}/')
+                self.assertEqual(len(response.data['members']), size)
+
+                # The groups were added through the ORM, which doesn't invalidate cached lists.
+                cache.clear()
+                self.assert_budget('group-list', '/api/groups/')
+
+                response = self.assert_budget('group-summary', '/api/groups/?view=summary')
+                self.assertEqual(
+                    (response.data[0]['member_count'], response.data[0]['expense_count'], response.data[0]['total_spent']),
+                    (size, size, f'{size * 10}.00'),
+                )
+
+    def test_expense_write_responses_are_bounded(self):
+        query_counts = {}
+        for size in (10, 100):
+            with self.subTest(size=size):
+                group, _ = self.seed_group(size)
+                url = f'/api/groups/{group.id}/expenses/'
+
+                with CaptureQueriesContext(connection) as create_queries:
+                    response = self.client.post(url, {'description': 'New', 'amount': '30.00'}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+                self.assertEqual(len(response.data['splits']), size)
+
+                with CaptureQueriesContext(connection) as update_queries:
+                    response = self.client.patch(f"{url}{response.data['id']}/", {'amount': '60.00'}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['splits']), size)
+
+                query_counts[size] = (len(create_queries), len(update_queries))
+
+        self.assertEqual(query_counts[10], query_counts[100])
+
+    def test_expense_create_resolves_group_once(self):
+        group, _ = self.seed_group(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/api/groups/{group.id}/expenses/', {'description': 'New', 'amount': '9.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        group_lookups = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "expenses_group"' in query['sql']
+        ]
+        self.assertEqual(len(group_lookups), 1)
+
+    def test_non_member_and_missing_group(self):
+        group, _ = self.seed_group(2)
+        self.client.force_authenticate(User.objects.create_user(username='budgetstranger'))
+
+        response = self.client.get(f'/api/groups/{group.id}/expenses/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], 'You are not a member of this group and cannot view its expenses.')
+
+        response = self.client.get('/api/groups/999999/settle/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='sparseuser', password='password123')
+        self.other = User.objects.create_user(username='sparseother', password='password123')
+        self.client.force_authenticate(self.user)
+
+        self.group = Group.objects.create(name='Sparse Group', owner=self.user)
+        self.group.members.add(self.user, self.other)
+        self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Lunch', 'amount': '20.00'}, format='json')
+
+    def test_expense_list_fields_skip_nested_relations(self):
+        url = f'/api/groups/{self.group.id}/expenses/'
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id,description,amount,paid_by_username'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            [{'id': response.data['results'][0]['id'], 'description': 'Lunch', 'amount': '20.00', 'paid_by_username': 'sparseuser'}]
+        )
+
+        response = self.client.get(url, {'fields': 'id', 'expand': 'splits'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'splits'})
+        self.assertEqual(len(response.data['results'][0]['splits']), 2)
+
+    def test_group_expand_controls_members(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/groups/', {'expand': ''})
+        self.assertNotIn('members', response.data[0])
+        self.assertEqual(response.data[0]['owner']['username'], 'sparseuser')
+
+        response = self.client.get(f'/api/groups/{self.group.id}/', {'expand': 'members'})
+        self.assertEqual(len(response.data['members']), 2)
+
+    def test_without_parameters_full_representation_is_returned(self):
+        response = self.client.get(f'/api/groups/{self.group.id}/')
+        self.assertEqual(set(response.data), {'id', 'name', 'owner', 'members', 'created_at'})
+
+
+class BulkExpenseImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='bulkuser', password='password123')
+        self.other = User.objects.create_user(username='bulkother', password='password123')
+        self.client.force_authenticate(self.user)
+
+        self.group = Group.objects.create(name='Bulk Group', owner=self.user)
+        self.group.members.add(self.user, self.other)
+        self.url = f'/api/groups/{self.group.id}/expenses/bulk/'
+
+    def test_json_import_creates_expenses_splits_and_balances(self):
+        rows = [{'description': f'Row {i}', 'amount': '10.00'} for i in range(250)]
+        rows.append({'description': 'Paid by other', 'amount': '4.00', 'paid_by': 'bulkother'})
+
+        with self.settings(BULK_IMPORT_BATCH_SIZE=100), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'created': 251, 'errors': []})
+        self.assertEqual(Expense.objects.filter(group=self.group).count(), 251)
+        self.assertEqual(ExpenseSplit.objects.filter(expense__group=self.group).count(), 0)
+        self.assertEqual(Expense.objects.filter(group=self.group).values('snapshot').distinct().count(), 1)
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+        self.assertLess(len(queries), 20)
+
+    def test_csv_import(self):
+        body = "description,amount,paid_by\nTaxi,12.50,\nHotel,200.00,bulkother\n"
+        response = self.client.generic('POST', self.url, body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertTrue(Expense.objects.filter(description='Hotel', paid_by=self.other).exists())
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in (5, None, True, {'description': 'Not a list', 'amount': '1.00'}):
+            response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+
+        body = "description,amount\nTaxi,12.50\n".encode() + "Caf\u00e9,3.00\n".encode('latin-1')
+        response = self.client.generic('POST', self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('could not be read', str(response.data['detail']))
+        self.assertEqual(Expense.objects.count(), 0)
+
+    def test_invalid_rows_abort_unless_partial(self):
+        rows = [
+            {'description': 'Good', 'amount': '10.00'},
+            {'description': 'Bad amount', 'amount': 'abc'},
+            {'description': 'Stranger', 'amount': '5.00', 'paid_by': 'nobody'},
+        ]
+
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Expense.objects.count(), 0)
+
+        response = self.client.post(f'{self.url}?partial=true', rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertEqual(Expense.objects.count(), 1)
+
+
+class ExpenseExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='exportuser', password='password123')
+        self.other = User.objects.create_user(username='exportother', password='password123')
+        self.client.force_authenticate(self.user)
+
+        self.group = Group.objects.create(name='Export Group', owner=self.user)
+        self.group.members.add(self.user, self.other)
+        self.url = f'/api/groups/{self.group.id}/expenses/export/'
+
+    def seed(self, count):
+        expenses = Expense.objects.bulk_create([
+            Expense(group=self.group, description=f'Expense {i}', amount=Decimal('10.00'), paid_by=self.user)
+            for i in range(count)
+        ])
+        ExpenseSplit.objects.bulk_create([
+            ExpenseSplit(expense=expense, owed_by=member, amount=Decimal('5.00'))
+            for expense in expenses for member in (self.user, self.other)
+        ], batch_size=5000)
+
+    def consume(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        self.seed(2)
+        Expense.objects.create(group=self.group, description='No splits, "quoted"', amount=Decimal('1.00'), paid_by=self.other)
+
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        lines = self.consume(response).splitlines()
+        self.assertEqual(lines[0], 'expense_id,created_at,description,amount,paid_by,split_id,owed_by,split_amount')
+        self.assertEqual(len(lines), 1 + 4 + 1)
+        self.assertTrue(lines[-1].endswith('"No splits, ""quoted""",1.00,exportother,,,'))
+
+    def test_ndjson_export(self):
+        self.seed(3)
+        response = self.client.get(self.url, {'format': 'ndjson'})
+
+        expenses = [json.loads(line) for line in self.consume(response).splitlines()]
+        self.assertEqual(len(expenses), 3)
+        self.assertEqual([split['owed_by'] for split in expenses[0]['splits']], ['exportuser', 'exportother'])
+        self.assertEqual(expenses[0]['amount'], '10.00')
+
+    def test_unknown_format_and_non_member(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(User.objects.create_user(username='exportstranger'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_asgi_export_is_streamed_asynchronously(self):
+        # A sync iterator would be read whole into a list by Django's ASGI handler.
+        await sync_to_async(self.seed)(3)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get(self.url, {'format': 'ndjson'}, headers=headers)
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+    def test_peak_memory_stays_bounded(self):
+        def peak_export_memory():
+            tracemalloc.start()
+            try:
+                with self.settings(EXPORT_CHUNK_SIZE=200):
+                    response = self.client.get(self.url, {'format': 'ndjson'})
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.seed(500)
+        small_size, small_peak = peak_export_memory()
+        self.seed(9500)
+        large_size, large_peak = peak_export_memory()
+
+        self.assertGreater(large_size, small_size * 15)
+        # 20x more data must not need much more memory than the small export.
+        self.assertLess(large_peak, small_peak * 2)
+        self.assertLess(large_peak, 5 * 1024 * 1024)
+
+
+class SplitRecomputationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='diffuser', password='password123')
+        self.members = [self.user] + User.objects.bulk_create([User(username=f'diff-{i}') for i in range(3)])
+        self.client.force_authenticate(self.user)
+
+        self.group = Group.objects.create(name='Diff Group', owner=self.user)
+        self.group.members.add(*self.members)
+        # Equal splits have no rows to diff, so these expenses use (equal) shares.
+        split = {'mode': SHARES, 'entries': [{'user_id': member.id, 'value': '1'} for member in self.members]}
+        response = self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Rent', 'amount': '400.00', 'split': split}, format='json')
+        self.expense = Expense.objects.get(pk=response.data['id'])
+        self.url = f'/api/groups/{self.group.id}/expenses/{self.expense.id}/'
+
+    def test_amount_change_updates_splits_in_place(self):
+        split_ids = set(self.expense.splits.values_list('id', flat=True))
+
+        response = self.client.patch(self.url, {'amount': '800.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(self.expense.splits.values_list('id', flat=True)), split_ids)
+        self.assertEqual(set(self.expense.splits.values_list('amount', flat=True)), {Decimal('200.00')})
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+    def test_only_differences_are_written(self):
+        newcomer = User.objects.create_user(username='diff-new')
+        self.group.members.add(newcomer)
+        self.group.members.remove(self.members[3])
+        existing = list(self.expense.splits.all())
+        desired = build_splits(self.expense, SHARES, self.members[:3] + [newcomer], [Decimal('1')] * 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            splits, changes = sync_expense_splits(self.expense, desired, existing)
+
+        self.assertEqual(changes, {'created': 1, 'updated': 0, 'deleted': 1})
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(sorted(split.owed_by_id for split in splits), sorted(member.id for member in self.members[:3] + [newcomer]))
+
+
+class SplitAllocationTests(SimpleTestCase):
+    def test_equal_split_adds_up_to_the_cent(self):
+        self.assertEqual(allocate_split(10000, EQUAL, member_count=3), [3334, 3333, 3333])
+        self.assertEqual(allocate_split(-100, EQUAL, member_count=3), [-34, -33, -33])
+
+    def test_shares_and_percentages(self):
+        self.assertEqual(allocate_split(1000, SHARES, [2, 1, 1]), [500, 250, 250])
+        self.assertEqual(allocate_split(1000, SHARES, [Decimal('1.5'), Decimal('1')]), [600, 400])
+        self.assertEqual(sum(allocate_split(1001, PERCENTAGE, [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])), 1001)
+
+    def test_invalid_specs(self):
+        with self.assertRaises(SplitAllocationError):
+            allocate_split(1000, PERCENTAGE, [50, 40])
+        with self.assertRaises(SplitAllocationError):
+            allocate_split(1000, EXACT, [Decimal('5.00'), Decimal('4.00')])
+        with self.assertRaises(SplitAllocationError):
+            allocate_split(1000, EXACT, [Decimal('15.00'), Decimal('-5.00')])
+        with self.assertRaises(SplitAllocationError):
+            allocate_split(1000, SHARES, [0, 0])
+
+    def test_batch_reports_failing_index(self):
+        requests = [(1000, EQUAL, None, 4), (1000, EQUAL, None, 4), (1000, PERCENTAGE, [10], None)]
+        with self.assertRaises(SplitAllocationError) as context:
+            allocate_splits_batch(requests)
+        self.assertEqual(context.exception.index, 2)
+        self.assertEqual(allocate_splits_batch(requests[:2]), [[250] * 4, [250] * 4])
+
+
+class SplitModeAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'mode-{i}', password='password123') for i in range(3)]
+        self.client.force_authenticate(self.users[0])
+        self.group = Group.objects.create(name='Split Modes', owner=self.users[0])
+        self.group.members.add(*self.users)
+        self.url = f'/api/groups/{self.group.id}/expenses/'
+
+    def post_split(self, amount, mode, values):
+        entries = [{'user_id': user.id, 'value': value} for user, value in zip(self.users, values)]
+        return self.client.post(self.url, {'description': 'Dinner', 'amount': amount, 'split': {'mode': mode, 'entries': entries}}, format='json')
+
+    def owed(self, expense_id):
+        return {split.owed_by_id: split.amount for split in Expense.objects.get(pk=expense_id).get_splits()}
+
+    def test_default_is_equal_split(self):
+        response = self.client.post(self.url, {'description': 'Taxi', 'amount': '100.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['split_mode'], EQUAL)
+        self.assertEqual(sorted(self.owed(response.data['id']).values()), [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+
+    def test_shares_percentage_and_exact(self):
+        for mode, values, expected in (
+            (SHARES, ['2', '1', '1'], ['50.00', '25.00', '25.00']),
+            (PERCENTAGE, ['50', '30', '20'], ['50.00', '30.00', '20.00']),
+            (EXACT, ['60.00', '40.00', '0.00'], ['60.00', '40.00', '0.00']),
+        ):
+            response = self.post_split('100.00', mode, values)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            self.assertEqual(response.data['split_mode'], mode)
+            self.assertEqual(self.owed(response.data['id']), {user.id: Decimal(amount) for user, amount in zip(self.users, expected)})
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+    def test_invalid_split_is_rejected(self):
+        outsider = User.objects.create_user(username='mode-outsider')
+
+        bad_percentages = self.post_split('100.00', PERCENTAGE, ['50', '30', '10'])
+        bad_exact = self.post_split('100.00', EXACT, ['50.00', '30.00', '10.00'])
+        negative_exact = self.post_split('100.00', EXACT, ['150.00', '-50.00', '0.00'])
+        not_member = self.client.post(self.url, {'description': 'X', 'amount': '10.00', 'split': {'mode': SHARES, 'entries': [{'user_id': outsider.id, 'value': '1'}]}}, format='json')
+
+        for response in (bad_percentages, bad_exact, negative_exact, not_member):
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('split', response.data)
+        self.assertEqual(negative_exact.data['split'], ["Exact amounts cannot be negative."])
+        self.assertFalse(Expense.objects.filter(group=self.group).exists())
+
+    def test_amount_change_keeps_shares(self):
+        response = self.post_split('100.00', SHARES, ['2', '1', '1'])
+        detail_url = f'{self.url}{response.data["id"]}/'
+
+        response = self.client.patch(detail_url, {'amount': '200.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.owed(response.data['id']), {self.users[0].id: Decimal('100.00'), self.users[1].id: Decimal('50.00'), self.users[2].id: Decimal('50.00')})
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+    def test_amount_change_on_exact_split_needs_new_amounts(self):
+        response = self.post_split('100.00', EXACT, ['60.00', '40.00', '0.00'])
+        detail_url = f'{self.url}{response.data["id"]}/'
+
+        rejected = self.client.patch(detail_url, {'amount': '200.00'}, format='json')
+        accepted = self.client.patch(detail_url, {'amount': '200.00', 'split': {'mode': EXACT, 'entries': [
+            {'user_id': self.users[0].id, 'value': '150.00'}, {'user_id': self.users[1].id, 'value': '50.00'},
+        ]}}, format='json')
+
+        self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(accepted.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.owed(accepted.data['id']), {self.users[0].id: Decimal('150.00'), self.users[1].id: Decimal('50.00')})
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+
+class CompactSplitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'compact-{i}', password='password123') for i in range(3)]
+        self.client.force_authenticate(self.users[0])
+        self.group = Group.objects.create(name='Compact', owner=self.users[0])
+        self.group.members.add(*self.users)
+        self.url = f'/api/groups/{self.group.id}/expenses/'
+
+    def test_equal_splits_store_no_rows(self):
+        first = self.client.post(self.url, {'description': 'Taxi', 'amount': '100.00'}, format='json')
+        second = self.client.post(self.url, {'description': 'Lunch', 'amount': '30.00'}, format='json')
+
+        self.assertEqual(ExpenseSplit.objects.count(), 0)
+        self.assertEqual(MembershipSnapshot.objects.count(), 1)
+        self.assertEqual([split['amount'] for split in first.data['splits']], ['33.34', '33.33', '33.33'])
+        listed = self.client.get(self.url).data['results']
+        self.assertEqual({expense['id']: len(expense['splits']) for expense in listed}, {first.data['id']: 3, second.data['id']: 3})
+        self.assertEqual(listed[0]['splits'][0]['owed_by']['username'], 'compact-0')
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+    def test_switching_modes_moves_between_rows_and_snapshot(self):
+        response = self.client.post(self.url, {'description': 'Hotel', 'amount': '90.00'}, format='json')
+        detail_url = f'{self.url}{response.data["id"]}/'
+        shares = {'mode': SHARES, 'entries': [{'user_id': user.id, 'value': '1'} for user in self.users[:2]]}
+
+        self.client.patch(detail_url, {'split': shares}, format='json')
+        expense = Expense.objects.get(pk=response.data['id'])
+        self.assertIsNone(expense.snapshot_id)
+        self.assertEqual(expense.splits.count(), 2)
+
+        self.client.patch(detail_url, {'split': {'mode': EQUAL}}, format='json')
+        expense.refresh_from_db()
+        self.assertIsNotNone(expense.snapshot_id)
+        self.assertEqual(expense.splits.count(), 0)
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+        response = self.client.delete(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(GroupMemberBalance.objects.filter(group=self.group).exclude(balance=0).exists())
+
+    def test_users_owing_compact_splits_cannot_be_deleted(self):
+        self.client.post(self.url, {'description': 'Taxi', 'amount': '30.00'}, format='json')
+        self.assertEqual(ExpenseSplit.objects.count(), 0)
+
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            self.users[2].delete()
+
+        self.assertTrue(User.objects.filter(pk=self.users[2].pk).exists())
+        self.assertEqual(GroupMemberBalance.objects.get(group=self.group, user=self.users[2]).balance, Decimal('-10.00'))
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+        outsider = User.objects.create_user(username='compact-outsider', password='password123')
+        outsider.delete()
+
+    def test_export_expands_compact_splits(self):
+        self.client.post(self.url, {'description': 'Taxi', 'amount': '10.00'}, format='json')
+
+        response = self.client.get(f'{self.url}export/', {'format': 'ndjson'})
+
+        expense = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([(split['owed_by'], split['amount']) for split in expense['splits']],
+                         [('compact-0', '3.34'), ('compact-1', '3.33'), ('compact-2', '3.33')])
+
+    def test_compact_splits_command(self):
+        exact = Expense.objects.create(group=self.group, description='Exact', amount=Decimal('30.00'), paid_by=self.users[0])
+        rounded = Expense.objects.create(group=self.group, description='Rounded', amount=Decimal('100.00'), paid_by=self.users[0])
+        ExpenseSplit.objects.bulk_create(
+            [ExpenseSplit(expense=exact, owed_by=user, amount=Decimal('10.00')) for user in self.users]
+            + [ExpenseSplit(expense=rounded, owed_by=user, amount=Decimal('33.33')) for user in self.users]
+        )
+        rebuild_group_balances([self.group.id])
+
+        out = StringIO()
+        call_command('compact_splits', stdout=out)
+
+        self.assertIn("Compacted 1 equal-split expense(s)", out.getvalue())
+        self.assertIn("Split rows: 6 -> 3", out.getvalue())
+        exact.refresh_from_db()
+        rounded.refresh_from_db()
+        self.assertIsNotNone(exact.snapshot_id)
+        self.assertIsNone(rounded.snapshot_id)
+        self.assertEqual(find_balance_drift([self.group.id]), [])
+
+
+class UserCacheTests(SimpleTestCase):
+    def test_lru_eviction_and_expiry(self):
+        user_cache = UserCache(max_size=2, ttl=60)
+        for user_id in (1, 2):
+            user_cache.set(user_id, User(id=user_id, username=f'cached-{user_id}'))
+        user_cache.get(1)
+        user_cache.set(3, User(id=3, username='cached-3'))
+
+        self.assertIsNone(user_cache.get(2))
+        self.assertEqual(user_cache.get(1).username, 'cached-1')
+        self.assertIsNot(user_cache.get(1), user_cache.get(1))
+
+        expired = UserCache(max_size=2, ttl=-1)
+        expired.set(1, User(id=1, username='cached-1'))
+        self.assertIsNone(expired.get(1))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='jwtuser', password='password123')
+        response = self.client.post('/api/auth/login/', {'username': 'jwtuser', 'password': 'password123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def user_queries(self, captured):
+        return [query for query in captured if 'FROM "auth_user"' in query['sql']]
+
+    def test_user_is_loaded_once(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get('/api/auth/user/')
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get('/api/auth/user/')
+
+        self.assertEqual(response.data['username'], 'jwtuser')
+        self.assertEqual(len(self.user_queries(first.captured_queries)), 1)
+        self.assertEqual(self.user_queries(second.captured_queries), [])
+
+    def test_profile_update_invalidates_cache(self):
+        self.client.get('/api/auth/user/')
+        self.client.patch('/api/auth/user/', {'first_name': 'Renamed'}, format='json')
+
+        self.assertEqual(self.client.get('/api/auth/user/').data['first_name'], 'Renamed')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/auth/user/')
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_deactivation_needs_explicit_invalidation(self):
+        self.client.get('/api/auth/user/')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_cached_user(self.user.pk)
+
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='asyncuser', password='password123')
+        self.other = User.objects.create_user(username='asyncother', password='password123')
+        self.outsider = User.objects.create_user(username='asyncoutsider', password='password123')
+        self.group = Group.objects.create(name='Async Group', owner=self.user)
+        self.group.members.add(self.user, self.other)
+
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': f'Expense {i}', 'amount': '30.00'}, format='json')
+        self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Shares', 'amount': '10.00', 'split': {
+            'mode': SHARES, 'entries': [{'user_id': self.user.id, 'value': '1'}, {'user_id': self.other.id, 'value': '3'}],
+        }}, format='json')
+        self.client.force_authenticate(None)
+        self.factory = AsyncRequestFactory()
+
+    def token_for(self, user):
+        return f'Bearer {AccessToken.for_user(user)}'
+
+    async def get_both(self, view_class, path, user=None, **kwargs):
+        headers = {'Authorization': self.token_for(user or self.user)} if user is not False else {}
+        async_response = await view_class.as_view()(self.factory.get(path, headers=headers), **kwargs)
+        sync_response = await sync_to_async(self.client.get)(path, headers=headers)
+        return async_response, sync_response
+
+    async def test_responses_match_sync_views(self):
+        group_kwargs = {'group_pk': self.group.id}
+        for view_class, path, kwargs in (
+            (AsyncGroupListView, '/api/groups/', {}),
+            (AsyncGroupListView, '/api/groups/?fields=id,name', {}),
+            (AsyncGroupListView, '/api/groups/?view=summary', {}),
+            (AsyncExpenseListView, f'/api/groups/{self.group.id}/expenses/', group_kwargs),
+            (AsyncExpenseListView, f'/api/groups/{self.group.id}/expenses/?page_size=2&expand=', group_kwargs),
+            (AsyncSettleUpView, f'/api/groups/{self.group.id}/settle/', group_kwargs),
+            (AsyncSettleUpView, f'/api/groups/{self.group.id}/settle/?mode=optimal', group_kwargs),
+        ):
+            async_response, sync_response = await self.get_both(view_class, path, **kwargs)
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK, path)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), path)
+            self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'), path)
+
+    async def test_errors_match_sync_views(self):
+        settle_path = f'/api/groups/{self.group.id}/settle/'
+        for view_class, path, user, group_pk, expected_status in (
+            (AsyncSettleUpView, settle_path, False, self.group.id, status.HTTP_401_UNAUTHORIZED),
+            (AsyncSettleUpView, settle_path, self.outsider, self.group.id, status.HTTP_403_FORBIDDEN),
+            (AsyncExpenseListView, f'/api/groups/{self.group.id}/expenses/', self.outsider, self.group.id, status.HTTP_403_FORBIDDEN),
+            (AsyncSettleUpView, '/api/groups/999999/settle/', self.user, 999999, status.HTTP_404_NOT_FOUND),
+            (AsyncSettleUpView, f'{settle_path}?mode=fastest', self.user, self.group.id, status.HTTP_400_BAD_REQUEST),
+        ):
+            async_response, sync_response = await self.get_both(view_class, path, user=user, group_pk=group_pk)
+            self.assertEqual(async_response.status_code, expected_status, path)
+            self.assertEqual(sync_response.status_code, expected_status, path)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), path)
+            self.assertEqual(async_response.get('WWW-Authenticate'), sync_response.get('WWW-Authenticate'))
+
+    async def test_route_by_method(self):
+        view = route_by_method(AsyncGroupListView.as_view(), GroupListCreateView.as_view())
+        headers = {'Authorization': self.token_for(self.user)}
+
+        created = await view(self.factory.post('/api/groups/', {'name': 'Created'}, content_type='application/json', headers=headers))
+        listed = await view(self.factory.get('/api/groups/', headers=headers))
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([group['name'] for group in json.loads(listed.content)], ['Created', 'Async Group'])
+
+
+class FastJSONTests(TestCase):
+    payloads = [
+        None,
+        [],
+        {'amount': Decimal('12.50'), 'negative': Decimal('-0.01'), 'whole': Decimal('3')},
+        {'created_at': datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc)},
+        {'naive': datetime.datetime(2025, 1, 2, 3, 4, 5), 'date': datetime.date(2025, 1, 2), 'time': datetime.time(7, 30, 15, 250000)},
+        {'text': 'Café \u2028 line \u2029 para "quoted" \\ \n', 'lazy': gettext_lazy('Not found.'), 'id': uuid.UUID(int=1)},
+        {1: 'int key', 'nested': [[1, 2.5, None, True, False], {'deep': [Decimal('0.10'), (1, 2)]}]},
+        {'big': 2 ** 70},
+        {'floats': [0.1, 123456.789, -0.0, 1e15], 'not_a_float': '1e-07'},
+    ]
+
+    def test_matches_stdlib_renderer(self):
+        for payload in self.payloads:
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload), payload)
+            with mock.patch.object(renderers, 'orjson', None):
+                self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload), payload)
+
+    def test_indented_output_matches(self):
+        payload = self.payloads[6]
+        self.assertEqual(
+            FastJSONRenderer().render(payload, 'application/json; indent=4'),
+            JSONRenderer().render(payload, 'application/json; indent=4'),
+        )
+
+    def test_api_responses_match(self):
+        user = User.objects.create_user(username='fastjson', password='password123')
+        other = User.objects.create_user(username='fastjsonother', password='password123')
+        group = Group.objects.create(name='Fast JSON — «group»', owner=user)
+        group.members.add(user, other)
+        client = APIClient()
+        client.force_authenticate(user)
+        for amount in ('10.00', '33.33', '0.01'):
+            client.post(f'/api/groups/{group.id}/expenses/', {'description': f'Expense {amount} ☕', 'amount': amount}, format='json')
+
+        for path in ('/api/groups/', f'/api/groups/{group.id}/expenses/', f'/api/groups/{group.id}/settle/', '/api/auth/user/balances/'):
+            response = client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, path)
+            self.assertEqual(response.content, JSONRenderer().render(response.data), path)
+
+    def test_parser_matches_stdlib_parser(self):
+        body = json.dumps({'description': 'Café', 'amount': '12.50', 'split': {'entries': [{'user_id': 1, 'value': 1.5}]}}).encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        latin = '{"description": "Caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(FastJSONParser().parse(BytesIO(latin), parser_context={'encoding': 'latin-1'}), {'description': 'Café'})
+
+        for invalid in (b'{"amount": ', b'{"amount": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+
+
+@override_settings(MIDDLEWARE=['core.profiling.RequestProfilingMiddleware'] + settings.MIDDLEWARE, REQUEST_PROFILING=True)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_stats.reset()
+        self.user = User.objects.create_user(username='profiled', password='password123')
+        self.admin = User.objects.create_superuser(username='profileadmin', password='password123')
+        self.group = Group.objects.create(name='Profiled Group', owner=self.user)
+        self.group.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric.split(';', 1)[1]) for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get(f'/api/groups/{self.group.id}/settle/')
+        timing = self.server_timing(response)
+
+        self.assertEqual(set(timing), {'db', 'view', 'serialize', 'total'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/groups/{self.group.id}/settle/')
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', self.server_timing(response)['db'])
+
+    def test_async_requests_count_queries_from_worker_threads(self):
+        token = AccessToken.for_user(self.user)
+        response = async_to_sync(AsyncClient().get)(f'/api/groups/{self.group.id}/expenses/', headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('desc="0 queries"', self.server_timing(response)['db'])
+
+    def test_stats_are_aggregated_per_url_name(self):
+        for _ in range(3):
+            self.client.get(f'/api/groups/{self.group.id}/settle/')
+        self.client.get(f'/api/groups/{self.group.id}/expenses/')
+
+        self.assertEqual(self.client.get('/api/stats/requests/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin)
+        routes = self.client.get('/api/stats/requests/').data['routes']
+
+        self.assertEqual(routes['group-settle-up']['count'], 3)
+        self.assertEqual(sum(routes['group-settle-up']['histogram_ms'].values()), 3)
+        self.assertEqual(routes['group-expense-list-create']['count'], 1)
+        self.assertGreater(routes['group-expense-list-create']['avg_queries'], 0)
+
+    def test_slow_requests_log_their_sql(self):
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=0), self.assertLogs('core.profiling', 'WARNING') as logs:
+            self.client.get(f'/api/groups/{self.group.id}/expenses/')
+
+        self.assertIn('(group-expense-list-create)', logs.output[0])
+        self.assertIn('FROM "expenses_expense"', logs.output[0])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_bench_every_route(self):
+        call_command('seed_benchmark', users=30, groups=4, members=(3, 6), expenses=(5, 20), stdout=StringIO())
+
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(find_balance_drift(), [])
+        self.assertTrue(ExpenseSplit.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', users=30, groups=4, stdout=StringIO())
+
+        out = StringIO()
+        call_command('bench_api', requests=2, warmup=0, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['group']['expenses'], Group.objects.get(pk=report['group']['id']).expenses.count())
+        self.assertIn('group-settle-up', {route['name'] for route in report['routes']})
+        for route in report['routes']:
+            self.assertTrue(all(200 <= code < 300 for code in route['status']), route)
+            self.assertLessEqual(route['p50_ms'], route['p99_ms'])
+        # Writes are rolled back.
+        self.assertEqual(Group.objects.count(), 4)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_follow_the_request_scope(self):
+        router = replicas.ReplicaRouter()
+        with mock.patch.object(replicas, 'replica_configured', return_value=True):
+            self.assertIsNone(router.db_for_read(Expense))
+            with replicas.replica_reads():
+                self.assertEqual(router.db_for_read(Expense), 'replica')
+                self.assertEqual(router.db_for_write(Expense), 'default')
+                with replicas.replica_reads(enabled=False):
+                    self.assertIsNone(router.db_for_read(Expense))
+            self.assertIsNone(router.db_for_read(Expense))
+
+    def test_no_replica_configured(self):
+        with mock.patch.object(replicas, 'replica_configured', return_value=False), replicas.replica_reads():
+            self.assertIsNone(replicas.ReplicaRouter().db_for_read(Expense))
+
+    def test_replica_reads_need_a_shared_pin(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            with self.settings(REPLICA_READS_ENABLED=False):
+                self.assertFalse(replicas.replica_configured())
+            with self.settings(REPLICA_READS_ENABLED=True):
+                self.assertTrue(replicas.replica_configured())
+
+
+@override_settings(MIDDLEWARE=[*settings.MIDDLEWARE, 'core.replicas.PinPrimaryAfterWriteMiddleware'])
+class ReplicaPinTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pinned', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_successful_writes_pin_the_user(self):
+        self.client.get('/api/groups/')
+        self.assertFalse(replicas.is_pinned(self.user.pk))
+
+        self.client.post('/api/groups/', {'name': ''}, format='json')
+        self.assertFalse(replicas.is_pinned(self.user.pk))
+
+        self.client.post('/api/groups/', {'name': 'Written'}, format='json')
+        self.assertTrue(replicas.is_pinned(self.user.pk))
+
+
+@skipUnless('replica' in settings.DATABASES, "set DATABASE_REPLICA_URL to run against a replica")
+@override_settings(REPLICA_READS_ENABLED=True)
+class ReplicaReadTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replicauser', password='password123')
+        # The replica lags: it has the user, but a group the primary doesn't know yet.
+        User.objects.using('replica').create(pk=self.user.pk, username='replicauser')
+        self.replica_group = Group.objects.using('replica').create(name='Only on replica', owner_id=self.user.pk)
+        Group.members.through.objects.using('replica').create(group_id=self.replica_group.pk, user_id=self.user.pk)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_reads_use_the_replica_until_the_user_writes(self):
+        response = self.client.get('/api/groups/')
+        self.assertEqual([group['name'] for group in response.data], ['Only on replica'])
+        self.assertEqual(self.client.get(f'/api/groups/{self.replica_group.pk}/settle/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(f'/api/groups/{self.replica_group.pk}/expenses/').status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/groups/', {'name': 'Just written'}, format='json')
+        response = self.client.get('/api/groups/')
+        self.assertEqual([group['name'] for group in response.data], ['Just written'])
+
+    def test_async_views_use_the_replica(self):
+        response = async_to_sync(AsyncGroupListView.as_view())(
+            AsyncRequestFactory().get('/api/groups/', headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+        )
+        self.assertEqual([group['name'] for group in json.loads(response.content)], ['Only on replica'])
+
+
+@override_settings(GROUP_LIST_CACHE_ENABLED=True)
+class GroupListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.owner = User.objects.create_user(username='listowner', password='password123')
+        self.member = User.objects.create_user(username='listmember', password='password123')
+        self.newcomer = User.objects.create_user(username='listnewcomer', password='password123')
+        self.clients = {}
+        for user in (self.owner, self.member, self.newcomer):
+            self.clients[user.pk] = APIClient()
+            self.clients[user.pk].force_authenticate(user)
+        response = self.write(self.owner, 'post', '/api/groups/', {'name': 'Trip'})
+        self.group_id = response.data['id']
+        self.write(self.owner, 'post', f'/api/groups/{self.group_id}/members/', {'username': 'listmember'})
+
+    def write(self, user, method, path, data=None):
+        # Lists are invalidated when the transaction commits, which TestCase never does.
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.clients[user.pk], method)(path, data, format='json')
+
+    def groups_of(self, user, query=''):
+        return self.clients[user.pk].get(f'/api/groups/{query}').data
+
+    def test_list_is_served_from_cache(self):
+        first = self.groups_of(self.member)
+        with self.assertNumQueries(0):
+            second = self.groups_of(self.member)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.groups_of(self.member, '?fields=id,name'), [{'id': self.group_id, 'name': 'Trip'}])
+        stats = get_cache_stats()
+        self.assertEqual((stats['group_list_hits'], stats['group_list_misses']), (1, 2))
+        self.assertEqual(stats['group_list_hit_ratio'], round(1 / 3, 4))
+
+    def test_writes_invalidate_every_affected_list(self):
+        for user in (self.owner, self.member, self.newcomer):
+            self.groups_of(user)
+            self.groups_of(user, '?fields=id,name')
+        reset_cache_stats()
+
+        self.write(self.owner, 'patch', f'/api/groups/{self.group_id}/', {'name': 'Renamed trip'})
+        self.assertEqual(self.groups_of(self.member, '?fields=id,name')[0]['name'], 'Renamed trip')
+        self.assertEqual(get_cache_stats()['group_list_invalidated_users'], 2)
+
+        self.write(self.owner, 'post', f'/api/groups/{self.group_id}/members/', {'username': 'listnewcomer'})
+        self.assertEqual(len(self.groups_of(self.newcomer)), 1)
+        self.assertEqual(len(self.groups_of(self.member)[0]['members']), 3)
+
+        self.write(self.member, 'patch', '/api/auth/user/', {'first_name': 'Maria'})
+        members = self.groups_of(self.owner)[0]['members']
+        self.assertIn('Maria', [member['first_name'] for member in members])
+
+        self.write(self.owner, 'delete', f'/api/groups/{self.group_id}/members/', {'username': 'listnewcomer'})
+        self.assertEqual(self.groups_of(self.newcomer), [])
+
+        self.write(self.newcomer, 'post', '/api/groups/', {'name': 'Own group'})
+        self.assertEqual([group['name'] for group in self.groups_of(self.newcomer)], ['Own group'])
+
+        self.write(self.owner, 'delete', f'/api/groups/{self.group_id}/')
+        self.assertEqual(self.groups_of(self.owner), [])
+        self.assertEqual(self.groups_of(self.member, '?fields=id,name'), [])
+
+    def test_read_before_commit_is_not_served_after_it(self):
+        # A read that saw the old data (here: the key taken before the rename) can only
+        # store it under the previous version.
+        key = get_group_list_key(self.member.pk, GroupSerializer.rendered_fields(None))
+        self.write(self.owner, 'patch', f'/api/groups/{self.group_id}/', {'name': 'Renamed trip'})
+        set_cached_group_list(key, [{'name': 'Trip'}])
+
+        self.assertEqual(self.groups_of(self.member)[0]['name'], 'Renamed trip')
+
+    @override_settings(GROUP_LIST_CACHE_ENABLED=False)
+    def test_process_local_cache_is_bypassed(self):
+        # Another worker process's write: it can't reach this process's cache.
+        self.groups_of(self.member)
+        Group.objects.filter(pk=self.group_id).update(name='Renamed elsewhere')
+
+        self.assertEqual(self.groups_of(self.member)[0]['name'], 'Renamed elsewhere')
+        self.assertNotIn('group_list_misses', get_cache_stats())
+
+
+class GroupChangesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='syncowner', password='password123')
+        self.friend = User.objects.create_user(username='syncfriend', password='password123')
+        self.outsider = User.objects.create_user(username='syncoutsider', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.group = Group.objects.create(name='Sync group', owner=self.owner)
+        self.group.members.add(self.owner)
+        self.url = f'/api/groups/{self.group.id}/changes/'
+        self.kept = self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Kept', 'amount': '10.00'}, format='json').data
+        self.removed = self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Removed', 'amount': '5.00'}, format='json').data
+
+    def test_changes_since_cursor(self):
+        cursor = self.client.get(self.url).data['cursor']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.content, b'')
+
+        expenses_url = f'/api/groups/{self.group.id}/expenses/'
+        self.client.patch(f"{expenses_url}{self.kept['id']}/", {'description': 'Kept, renamed'}, format='json')
+        self.client.delete(f"{expenses_url}{self.removed['id']}/")
+        self.client.post(f'/api/groups/{self.group.id}/members/', {'username': 'syncfriend'}, format='json')
+        added = self.client.post(expenses_url, {'description': 'Added', 'amount': '9.00'}, format='json').data
+        self.client.post(f'/api/groups/{self.group.id}/members/', {'username': 'syncoutsider'}, format='json')
+        self.client.delete(f'/api/groups/{self.group.id}/members/', {'username': 'syncoutsider'}, format='json')
+
+        response = self.client.get(self.url, {'since': cursor})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([expense['description'] for expense in response.data['expenses']], ['Kept, renamed', 'Added'])
+        self.assertEqual(len(response.data['expenses'][1]['splits']), 2)
+        self.assertGreater(response.data['expenses'][0]['updated_at'], self.kept['updated_at'])
+        self.assertEqual(response.data['deleted_expenses'], [self.removed['id']])
+        self.assertEqual([member['username'] for member in response.data['members']], ['syncfriend'])
+        self.assertEqual(response.data['removed_members'], [self.outsider.id])
+
+        next_cursor = response.data['cursor']
+        self.assertEqual(self.client.get(self.url, {'since': next_cursor}).status_code, status.HTTP_204_NO_CONTENT)
+        later = self.client.post(expenses_url, {'description': 'Later', 'amount': '1.00'}, format='json').data
+        response = self.client.get(self.url, {'since': next_cursor, 'fields': 'id,description'})
+        self.assertEqual(response.data['expenses'], [{'id': later['id'], 'description': 'Later'}])
+
+    def test_invalid_cursors_and_access(self):
+        other_group = Group.objects.create(name='Other', owner=self.owner)
+        other_group.members.add(self.owner)
+        other_cursor = self.client.get(f'/api/groups/{other_group.id}/changes/').data['cursor']
+
+        for cursor in ('garbage', other_cursor):
+            self.assertEqual(self.client.get(self.url, {'since': cursor}).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_pruned_cursors_expire(self):
+        old_cursor = self.client.get(self.url).data['cursor']
+        self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'After', 'amount': '2.00'}, format='json')
+        recent_cursor = self.client.get(self.url).data['cursor']
+        GroupChange.objects.filter(group=self.group).update(created_at=timezone.now() - datetime.timedelta(days=40))
+        self.client.post(f'/api/groups/{self.group.id}/expenses/', {'description': 'Recent', 'amount': '3.00'}, format='json')
+
+        out = StringIO()
+        call_command('prune_group_changes', '--days', '30', stdout=out)
+
+        self.assertIn("Pruned 3 change log", out.getvalue())
+        self.assertEqual(self.client.get(self.url, {'since': old_cursor}).status_code, status.HTTP_410_GONE)
+        response = self.client.get(self.url, {'since': recent_cursor})
+        self.assertEqual([expense['description'] for expense in response.data['expenses']], ['Recent'])
+
+
+class PubSubTests(SimpleTestCase):
+    async def test_in_memory_backend(self):
+        backend = InMemoryBackend()
+        async with backend.subscribe('group:1') as first, backend.subscribe('group:1') as second:
+            backend.publish('group:1', {'event': 'a'})
+            backend.publish('group:2', {'event': 'b'})
+            self.assertEqual(await first.get(timeout=1), {'event': 'a'})
+            self.assertEqual(await second.get(timeout=1), {'event': 'a'})
+            self.assertIsNone(await first.get(timeout=0.01))
+        self.assertEqual(backend.subscriber_count(), 0)
+
+    @mock.patch.object(CacheBackend, 'poll_forever')
+    async def test_cache_backend_delivers_published_messages_on_poll(self, poll_forever):
+        cache.clear()
+        backend, other_process = CacheBackend(), CacheBackend()
+        other_process.publish('group:1', {'event': 'before'})
+        async with backend.subscribe('group:1') as subscription:
+            other_process.publish('group:1', {'event': 'a'})
+            other_process.publish('group:1', {'event': 'b'})
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+            await sync_to_async(backend.poll)()
+            self.assertEqual([await subscription.get(timeout=1) for _ in range(2)], [{'event': 'a'}, {'event': 'b'}])
+            await sync_to_async(backend.poll)()
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+    async def test_slow_subscribers_overflow(self):
+        backend = InMemoryBackend()
+        with self.settings(EVENTS_QUEUE_SIZE=2):
+            async with backend.subscribe('group:1') as subscription:
+                for i in range(3):
+                    backend.publish('group:1', {'event': i})
+                await asyncio.sleep(0)
+                self.assertTrue(subscription.overflowed)
+                self.assertIsNone(await subscription.get(timeout=0.01))
+
+
+def read_sse(chunk):
+    lines = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+
+class GroupEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='eventowner', password='password123')
+        self.friend = User.objects.create_user(username='eventfriend', password='password123')
+        self.group = Group.objects.create(name='Live group', owner=self.owner)
+        self.group.members.add(self.owner, self.friend)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def write(self, method, path, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(path, data, format='json')
+
+    async def open_stream(self, user):
+        request = AsyncRequestFactory().get(f'/api/groups/{self.group.id}/events/', headers={'Authorization': f'Bearer {AccessToken.for_user(user)}'})
+        response = await AsyncGroupEventsView.as_view()(request, group_pk=self.group.id)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return aiter(response.streaming_content)
+
+    async def next_event(self, stream):
+        return read_sse(await asyncio.wait_for(anext(stream), 5))
+
+    async def test_stream_pushes_changes_and_settlement_plans(self):
+        owner_stream, friend_stream = await self.open_stream(self.owner), await self.open_stream(self.friend)
+        event, data = await self.next_event(owner_stream)
+        self.assertEqual((event, data['group']), ('ready', self.group.id))
+        self.assertEqual((await self.next_event(friend_stream))[0], 'ready')
+
+        response = await sync_to_async(self.write)('post', f'/api/groups/{self.group.id}/expenses/', {'description': 'Dinner', 'amount': '30.00'})
+        for stream in (owner_stream, friend_stream):
+            self.assertEqual(await self.next_event(stream), ('expense.created', {'group': self.group.id, 'ids': [response.data['id']]}))
+            event, data = await self.next_event(stream)
+            self.assertEqual(event, 'settlement.updated')
+            self.assertEqual([(row['from_user_username'], row['amount']) for row in data['settlements']], [('eventfriend', '15.00')])
+
+        # The cursor of the ready event catches up on what happened before subscribing.
+        late_stream = await self.open_stream(self.owner)
+        cursor = (await self.next_event(late_stream))[1]['cursor']
+        await late_stream.aclose()
+        changes = await sync_to_async(self.client.get)(f'/api/groups/{self.group.id}/changes/', {'since': cursor})
+        self.assertEqual(changes.status_code, status.HTTP_204_NO_CONTENT)
+
+        await sync_to_async(self.write)('delete', f'/api/groups/{self.group.id}/members/', {'username': 'eventfriend'})
+        self.assertEqual(await self.next_event(friend_stream), ('member.changed', {'group': self.group.id, 'added': [], 'removed': [self.friend.id]}))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(friend_stream)
+
+        await sync_to_async(self.write)('delete', f'/api/groups/{self.group.id}/')
+        # The plan following member.changed is skipped: the group is gone by the time it's read.
+        self.assertEqual((await self.next_event(owner_stream))[0], 'member.changed')
+        self.assertEqual((await self.next_event(owner_stream))[0], 'group.deleted')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(owner_stream)
+        self.assertEqual(get_hub().subscriber_count(), 0)
+
+    async def test_keepalive_and_access(self):
+        with self.settings(EVENTS_KEEPALIVE_SECONDS=0.01):
+            stream = await self.open_stream(self.owner)
+            await anext(stream)
+            self.assertEqual(await anext(stream), b': keepalive\n\n')
+            await stream.aclose()
+
+        outsider = await User.objects.acreate(username='eventoutsider')
+        request = AsyncRequestFactory().get('/', headers={'Authorization': f'Bearer {AccessToken.for_user(outsider)}'})
+        response = await AsyncGroupEventsView.as_view()(request, group_pk=self.group.id)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(
+        CACHES={**settings.CACHES, 'events': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'events_cache'}},
+        EVENTS_CACHE_ALIAS='events',
+        EVENTS_BACKEND='core.pubsub.CacheBackend',
+    )
+    @mock.patch.object(CacheBackend, 'poll_forever')
+    @mock.patch('core.pubsub._hub', None)
+    async def test_stream_over_database_cache_backend(self, poll_forever):
+        # DatabaseCache raises SynchronousOnlyOperation if it is used on the event loop.
+        await sync_to_async(call_command)('createcachetable', 'events_cache', verbosity=0)
+        stream = await self.open_stream(self.owner)
+        self.assertEqual((await self.next_event(stream))[0], 'ready')
+
+        response = await sync_to_async(self.write)('post', f'/api/groups/{self.group.id}/expenses/', {'description': 'Dinner', 'amount': '30.00'})
+        await sync_to_async(get_hub().poll)()
+        self.assertEqual(await self.next_event(stream), ('expense.created', {'group': self.group.id, 'ids': [response.data['id']]}))
+        await stream.aclose()
+
+
+class SettleBatchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='batchadmin', password='password123', is_staff=True)
+        self.users = [User.objects.create_user(username=f'batchuser{i}', password='password123') for i in range(4)]
+        self.groups = []
+        for g in range(3):
+            group = Group.objects.create(name=f'Batch {g}', owner=self.users[0])
+            group.members.add(*self.users[:g + 2])
+            client = APIClient()
+            for payer in self.users[:g + 1]:
+                client.force_authenticate(payer)
+                client.post(f'/api/groups/{group.id}/expenses/', {'description': 'Batch', 'amount': f'{10 + g}.00'}, format='json')
+            self.groups.append(group)
+        self.empty_group = Group.objects.create(name='Batch empty', owner=self.users[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def expected(self, group):
+        return [dict(settlement, amount=str(settlement['amount'])) for settlement in calculate_optimized_settlements(group.id)]
+
+    def read_lines(self, response):
+        return {line['group_id']: line for line in map(json.loads, b''.join(response.streaming_content).decode().splitlines())}
+
+    def test_batch_endpoint_streams_every_plan(self):
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/settle/batch/', {}, format='json')
+            lines = self.read_lines(response)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(set(lines), {group.id for group in self.groups} | {self.empty_group.id})
+        for group in self.groups:
+            self.assertEqual(lines[group.id], {'group_id': group.id, 'mode': 'greedy', 'settlements': self.expected(group)})
+            self.assertTrue(lines[group.id]['settlements'])
+        self.assertEqual(lines[self.empty_group.id]['settlements'], [])
+
+        response = self.client.post('/api/settle/batch/', {'group_ids': [self.groups[1].id, 999999], 'mode': 'optimal'}, format='json')
+        self.assertEqual(list(self.read_lines(response)), [self.groups[1].id])
+        self.assertEqual(self.client.post('/api/settle/batch/', {'mode': 'fastest'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.post('/api/settle/batch/', {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_large_groups_are_planned_in_worker_processes(self):
+        out = StringIO()
+        with mock.patch.dict('expenses.batch.POOL_MIN_BALANCES', {'greedy': 3}):
+            call_command('settle_batch', '--workers', '2', '--chunk-size', '1', stdout=out, stderr=StringIO())
+
+        lines = self.read_lines(mock.Mock(streaming_content=[out.getvalue().encode()]))
+        self.assertEqual(len(lines), 4)
+        for group in self.groups:
+            self.assertEqual(lines[group.id]['settlements'], self.expected(group))
@@ -1,16 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegisterView,
     CustomTokenObtainPairView,
     CustomTokenRefreshView,
     UserDetailView,
+    UserBalancesView,
     GroupListCreateView,
     GroupDetailView,
     ExpenseListCreateView,
+    BulkExpenseCreateView,
+    ExpenseExportView,
     SettleUpView,
     ExpenseDetailView,
-    ManageGroupMembersView
+    ManageGroupMembersView,
+    GroupChangesView,
+    SettleBatchView,
+    CacheStatsView
 )
+from .async_views import AsyncExpenseListView, AsyncGroupEventsView, AsyncGroupListView, AsyncSettleUpView, route_by_method
+
+
+def read_view(view_class, async_view_class):
+    """
+    The DRF view, with GET served by its async variant when settings.ASYNC_READ_VIEWS is on.
+    """
+    if not settings.ASYNC_READ_VIEWS:
+        return view_class.as_view()
+    return route_by_method(async_view_class.as_view(), view_class.as_view())
+
 
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='auth_register'),
@@ -21,16 +39,31 @@ urlpatterns = [
 
     path('auth/user/', UserDetailView.as_view(), name='auth_user_detail'),
 
-    path('groups/', GroupListCreateView.as_view(), name='group-list-create'),
+    path('auth/user/balances/', UserBalancesView.as_view(), name='auth_user_balances'),
+
+    path('groups/', read_view(GroupListCreateView, AsyncGroupListView), name='group-list-create'),
 
     path('groups/<int:pk>/', GroupDetailView.as_view(), name='group-detail'),
 
-    path('groups/<int:group_pk>/expenses/', ExpenseListCreateView.as_view(), name='group-expense-list-create'),
+    path('groups/<int:group_pk>/expenses/', read_view(ExpenseListCreateView, AsyncExpenseListView), name='group-expense-list-create'),
+
+    path('groups/<int:group_pk>/expenses/bulk/', BulkExpenseCreateView.as_view(), name='group-expense-bulk-create'),
 
-    path('groups/<int:group_pk>/settle/', SettleUpView.as_view(), name='group-settle-up'),
+    path('groups/<int:group_pk>/expenses/export/', ExpenseExportView.as_view(), name='group-expense-export'),
+
+    path('groups/<int:group_pk>/settle/', read_view(SettleUpView, AsyncSettleUpView), name='group-settle-up'),
 
     path('groups/<int:group_pk>/expenses/<int:expense_pk>/', ExpenseDetailView.as_view(), name='expense-detail'),
 
     path('groups/<int:group_pk>/members/', ManageGroupMembersView.as_view(), name='group-members-manage'),
+
+    path('groups/<int:group_pk>/changes/', GroupChangesView.as_view(), name='group-changes'),
+
+    path('settle/batch/', SettleBatchView.as_view(), name='settle-batch'),
+
+    path('stats/cache/', CacheStatsView.as_view(), name='cache-stats'),
 ]
 
+if settings.EVENTS_ENABLED:
+    # Long-lived streams: only served under ASGI, where they don't hold a worker each.
+    urlpatterns.append(path('groups/<int:group_pk>/events/', AsyncGroupEventsView.as_view(), name='group-events'))
@@ -3,91 +3,217 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth.models import User
 from .serializers import UserSerializer, RegisterSerializer
 from .models import Group
-from .serializers import GroupSerializer
-from .models import Expense, ExpenseSplit
+from .serializers import GroupSerializer, GroupSummarySerializer
+from .models import Expense
 from .serializers import ExpenseSerializer
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
-from django.db.models import Sum
+import csv
+import json
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import OptimizedSettlementSerializer
 from .serializers import ManageGroupMemberSerializer
+from .serializers import UserBalancesSerializer
+from .serializers import BulkExpenseRowSerializer
+from .serializers import SettleBatchSerializer
+from .splits import build_splits_batch, get_membership_snapshot, lock_expense, prefetch_splits
+from .allocation import EQUAL
+from .parsers import CSVParser
+from rest_framework.parsers import JSONParser
+from rest_framework.negotiation import DefaultContentNegotiation
+from django.http import StreamingHttpResponse
+from .export import EXPORT_FORMATS, buffered, iter_export_rows, streaming_response
+from .batch import iter_batch_plans
+from .models import GroupMemberBalance
+from .balances import BalanceChanges
+from .settlement import settle_balances, settle_balances_for_mode, to_cents, from_cents
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.http import parse_etags
+from django.conf import settings
+from .pagination import ExpenseCursorPagination
+from .permissions import IsGroupMember, get_request_group
+from core.replicas import ReplicaReadMixin
+from .changes import changed_objects, decode_cursor, encode_cursor, record_group_changes
+from .models import GroupChange
+from .events import publish_group_event
+from .cache import (
+    get_cache_stats,
+    get_cached_group_list,
+    get_cached_settlement,
+    get_group_list_key,
+    invalidate_group_lists,
+    invalidate_group_member_lists,
+    record_cache_event,
+    set_cached_group_list,
+    set_cached_settlement,
+    settlement_etag,
+)
+
+
+SETTLEMENT_MODES = ('greedy', 'optimal')
+
+
+def expense_queryset(fields=None):
+    """
+    Expenses with what ExpenseSerializer renders joined: the payer, and the membership
+    snapshot that compact equal splits are derived from (see expenses.splits.prefetch_splits).
+    Pass the rendered fields to skip relations that won't be rendered.
+    """
+    queryset = Expense.objects.all()
+    if fields is None or fields & {'paid_by', 'paid_by_username'}:
+        queryset = queryset.select_related('paid_by')
+    if fields is None or 'splits' in fields:
+        queryset = queryset.select_related('snapshot')
+    return queryset
 
+def group_queryset(user, fields=None):
+    queryset = user.group_memberships.all()
+    if fields is None or 'owner' in fields:
+        queryset = queryset.select_related('owner')
+    if fields is None or 'members' in fields:
+        queryset = queryset.prefetch_related('members')
+    return queryset
 
-def calculate_optimized_settlements(group_id):
-    try:
-        group = Group.objects.get(pk=group_id)
-    except Group.DoesNotExist:
-        return[]
-    
-    members = group.members.all()
-    if not members.exists():
-        return []
-    
-    balances = {}
-
-    for member in members:
-        balances[member.id] = Decimal('0.00')
-
-    group_expenses = Expense.objects.filter(group=group)
-    for expense in group_expenses:
-        if expense.paid_by_id in balances:
-            balances[expense.paid_by_id] += expense.amount
-        else:
-            balances[expense.paid_by_id] = expense.amount
-
-        expense_splits = ExpenseSplit.objects.filter(expense=expense)
-        for split in expense_splits:
-            if split.owed_by_id in balances:
-                balances[split.owed_by_id] -= split.amount
-            else:
-                balances[split.owed_by_id] = -split.amount
-
-    creditors = {}
-    debtors = {}
-
-    for user_id, balance in balances.items():
-        if balance > Decimal('0.00'):
-            creditors[user_id]=balance
-        elif balance < Decimal('0.00'):
-            debtors[user_id] = -balance
 
-    settlements = []
+GROUP_LIST_VIEWS = ('full', 'summary')
 
-    sorted_debtors = sorted(debtors.items(), key=lambda item: item[1], reverse=True)
-    sorted_creditors = sorted(creditors.items(), key=lambda item: item[1], reverse=True)
 
-    debtor_idx = 0
-    creditor_idx = 0
+def aggregate_subquery(queryset, aggregate, output_field):
+    """
+    `aggregate` over the rows of `queryset` correlated to the outer group, as a scalar
+    subquery (0 when there are none). Joining members and expenses into the outer query
+    instead would multiply the rows being counted and summed.
+    """
+    subquery = queryset.filter(group_id=OuterRef('pk')).order_by().values('group_id').annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(subquery, output_field=output_field), Value(0), output_field=output_field)
 
-    while debtor_idx < len(sorted_debtors) and creditor_idx < len(sorted_creditors):
-        debtor_id, debtor_amount = sorted_debtors[debtor_idx]
-        creditor_id, creditor_amount = sorted_creditors[creditor_idx]
 
-        amount_to_transfer = min(debtors[debtor_id], creditors[creditor_id])
+def group_summary_queryset(user):
+    """
+    The user's groups with member_count, expense_count, total_spent and the user's
+    balance (from the GroupMemberBalance ledger) annotated, in a single query.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return user.group_memberships.annotate(
+        member_count=aggregate_subquery(Group.members.through.objects.all(), Count('*'), IntegerField()),
+        expense_count=aggregate_subquery(Expense.objects.all(), Count('*'), IntegerField()),
+        total_spent=aggregate_subquery(Expense.objects.all(), Sum('amount'), money),
+        balance=aggregate_subquery(GroupMemberBalance.objects.filter(user=user), Sum('balance'), money),
+    )
 
-        if amount_to_transfer > Decimal('0.001'):
-            settlements.append({
-                'from_user_id': debtor_id,
-                'to_user_id': creditor_id,
-                'amount': amount_to_transfer.quantize(Decimal('0.01'))
-            })
 
-            debtors[debtor_id] -= amount_to_transfer
-            creditors[creditor_id] -= amount_to_transfer
+def get_group_list_view(request):
+    view = request.query_params.get('view', 'full')
+    if view not in GROUP_LIST_VIEWS:
+        raise ValidationError({'view': _("View must be one of: full, summary.")})
+    return view
 
-        if debtors[debtor_id] < Decimal('0.001'):
-            debtor_idx += 1 
-        
-        if creditors[creditor_id] < Decimal('0.001'):
-            creditor_idx += 1
 
+def group_balance_rows(group_id):
+    return (
+        GroupMemberBalance.objects.filter(group_id=group_id)
+        .exclude(balance=Decimal('0.00'))
+        .values_list('user_id', 'balance')
+    )
+
+def load_group_balances(group_id):
+    return {user_id: to_cents(balance) for user_id, balance in group_balance_rows(group_id)}
+
+def format_settlements(transfers):
+    settlements = []
+    for from_user_id, to_user_id, cents in transfers:
+        settlements.append({
+            'from_user_id': from_user_id,
+            'to_user_id': to_user_id,
+            'amount': from_cents(cents)
+        })
     return settlements
 
+def calculate_optimized_settlements(group_id):
+    return format_settlements(settle_balances(load_group_balances(group_id)))
+
+def calculate_settlement_plan(group_id, mode='greedy'):
+    """
+    Returns (settlements, mode_used). With mode='optimal' the exact minimum-transfer
+    solver is tried first and the greedy plan is used when it runs over its budget.
+    """
+    return plan_settlements(load_group_balances(group_id), mode)
+
+def get_settlement_mode(request):
+    mode = request.query_params.get('mode', 'greedy')
+    if mode not in SETTLEMENT_MODES:
+        raise ValidationError({'mode': _("Mode must be one of: greedy, optimal.")})
+    return mode
+
+# Cache counters recorded for each outcome of settle_balances_for_mode().
+PLAN_OUTCOME_EVENTS = {
+    'greedy': (),
+    'fallback': ('settlement_optimal_fallbacks',),
+    'optimal': ('settlement_optimal_solved',),
+    'optimal_win': ('settlement_optimal_solved', 'settlement_optimal_wins'),
+}
+
+def plan_settlements(balances, mode='greedy'):
+    """
+    calculate_settlement_plan() for already loaded {user_id: cents} balances.
+    """
+    return finish_plan(*settle_balances_for_mode(
+        balances, mode,
+        max_balances=settings.SETTLEMENT_OPTIMAL_MAX_BALANCES,
+        time_budget=settings.SETTLEMENT_OPTIMAL_TIME_BUDGET
+    ))
+
+def finish_plan(transfers, outcome):
+    """
+    (settlements, mode_used) from the result of settle_balances_for_mode(), counting the outcome.
+    """
+    for event in PLAN_OUTCOME_EVENTS[outcome]:
+        record_cache_event(event)
+    return format_settlements(transfers), 'greedy' if outcome in ('greedy', 'fallback') else 'optimal'
+
+def iter_batch_settlement_lines(group_ids=None, mode='greedy', chunk_size=None, workers=None):
+    """
+    One NDJSON line per group with its settlement plan, in the order plans finish.
+    """
+    for group_id, transfers, outcome in iter_batch_plans(group_ids, mode, chunk_size, workers):
+        settlements, mode_used = finish_plan(transfers, outcome)
+        yield json.dumps({
+            'group_id': group_id,
+            'mode': mode_used,
+            'settlements': [dict(settlement, amount=str(settlement['amount'])) for settlement in settlements],
+        }) + '\n'
+
+def settlement_user_ids(raw_settlements):
+    user_ids_involved = set()
+    for settlement in raw_settlements:
+        user_ids_involved.add(settlement['from_user_id'])
+        user_ids_involved.add(settlement['to_user_id'])
+    return list(user_ids_involved)
+
+def serialize_settlements(raw_settlements, users_map):
+    """
+    Settlements with the users filled in from users_map ({id: User}), as rendered by SettleUpView.
+    """
+    enriched_settlements = []
+    for rs in raw_settlements:
+        from_user_obj = users_map.get(rs['from_user_id'])
+        to_user_obj = users_map.get(rs['to_user_id'])
+        if from_user_obj and to_user_obj:
+            enriched_settlements.append({
+                'from_user': from_user_obj,
+                'to_user': to_user_obj,
+                'amount': rs['amount']
+            })
+
+    serializer = OptimizedSettlementSerializer(enriched_settlements, many=True)
+    return list(serializer.data)
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
@@ -105,13 +231,69 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
-class GroupListCreateView(generics.ListCreateAPIView):
+    def perform_update(self, serializer):
+        # Group lists render the owner and members, so the user's co-members see the change.
+        with transaction.atomic():
+            serializer.save()
+            invalidate_group_lists(
+                Group.members.through.objects.filter(group__members=self.request.user).values_list('user_id', flat=True).distinct()
+            )
+
+class UserBalancesView(APIView):
+    """
+    Returns the authenticated user's net balance in every group they belong to,
+    plus the total across groups. Reads the GroupMemberBalance ledger, so it takes two
+    queries no matter how many groups or expenses.
+    """
+    def get(self, request):
+        user = request.user
+        groups = list(user.group_memberships.order_by('-created_at').values('id', 'name'))
+        balance_by_group = dict(
+            GroupMemberBalance.objects.filter(user=user, group__members=user)
+            .values_list('group_id', 'balance')
+        )
+
+        group_balances = []
+        total_balance = Decimal('0.00')
+        for group in groups:
+            balance = balance_by_group.get(group['id'], Decimal('0.00'))
+            total_balance += balance
+            group_balances.append({'group_id': group['id'], 'group_name': group['name'], 'balance': balance})
+
+        serializer = UserBalancesSerializer({'groups': group_balances, 'total_balance': total_balance})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class GroupListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     serializer_class = GroupSerializer
 
+    def is_summary(self):
+        return self.request.method == 'GET' and get_group_list_view(self.request) == 'summary'
+
+    def get_serializer_class(self):
+        return GroupSummarySerializer if self.is_summary() else GroupSerializer
+
     def get_queryset(self):
         user = self.request.user
+        if self.is_summary():
+            return group_summary_queryset(user).order_by('-created_at')
         
-        return user.group_memberships.all().order_by('-created_at')
+        return group_queryset(user, GroupSerializer.rendered_fields(self.request)).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Served from a per-user cache, invalidated whenever a group of the user changes
+        (see expenses.cache.invalidate_group_lists), when GROUP_LIST_CACHE_ENABLED.
+        ?view=summary isn't cached: it depends on every expense, and it is a single
+        query anyway.
+        """
+        if self.is_summary() or not settings.GROUP_LIST_CACHE_ENABLED:
+            return Response(self.get_serializer(self.get_queryset(), many=True).data)
+        key = get_group_list_key(request.user.pk, GroupSerializer.rendered_fields(request))
+        groups = get_cached_group_list(key)
+        if groups is None:
+            groups = self.get_serializer(self.get_queryset(), many=True).data
+            set_cached_group_list(key, groups)
+        return Response(groups)
     
     def perform_create(self, serializer):
         serializer.save()
@@ -122,106 +304,277 @@ class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user = self.request.user
         
-        return user.group_memberships.all()
+        return group_queryset(user, GroupSerializer.rendered_fields(self.request))
     
     def perform_update(self, serializer):
-        group=self.get_object()
-        if group.owner != self.request.user:
+        group = serializer.instance
+        if group.owner_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to edit this group as you are not the owner.")
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            invalidate_group_member_lists(group.pk)
     
     def perform_destroy(self, instance):
-        if instance.owner != self.request.user:
+        if instance.owner_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to delete this group as you are not the owner.")
-        instance.delete()
+        with transaction.atomic():
+            invalidate_group_member_lists(instance.pk)
+            publish_group_event(instance.pk, 'group.deleted')
+            instance.delete()
 
-class ExpenseListCreateView(generics.ListCreateAPIView):
+class ExpenseListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     serializer_class = ExpenseSerializer
+    pagination_class = ExpenseCursorPagination
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    not_member_message = {
+        'GET': _("You are not a member of this group and cannot view its expenses."),
+        'POST': _("You are not a member of this group and cannot add expenses to it."),
+    }
 
     def get_queryset(self):
-        group_pk = self.kwargs.get('group_pk')
-        group = get_object_or_404(Group, pk=group_pk)
-        user = self.request.user
-        if not group.members.filter(id=user.id).exists():
-            raise PermissionDenied(_("You are not a member of this group and cannot view its expenses."))
-        return Expense.objects.filter(group=group).order_by('-created_at')
+        group = get_request_group(self.request, self.kwargs['group_pk'])
+        return expense_queryset(ExpenseSerializer.rendered_fields(self.request)).filter(group_id=group.pk).order_by('-created_at')
     
     def get_serializer_context(self):
         context=super().get_serializer_context()
-        group_pk = self.kwargs.get('group_pk')
-        group = get_object_or_404(Group, pk=group_pk)
-        context['group_instance'] = group
+        context['group_instance'] = get_request_group(self.request, self.kwargs['group_pk'])
         return context
 
-    def perform_create(self, serializer):
-        group_pk = self.kwargs.get('group_pk')
-        group = get_object_or_404(Group, pk=group_pk)
-        user = self.request.user
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if 'splits' in ExpenseSerializer.rendered_fields(self.request):
+            prefetch_splits(page)
+        return page
 
-        if not group.members.filter(id=user.id).exists():
-            raise PermissionDenied(_("You are not a member of this group and cannot add expenses to it."))
-        serializer.save()
+class BulkExpenseCreateView(APIView):
+    """
+    Imports many expenses at once from a JSON array or a CSV upload
+    (columns: description, amount and optionally paid_by).
+    Rows are validated in one pass, then expenses are written with batched bulk inserts
+    inside a single transaction. They are split equally among all members, which is
+    stored as one membership snapshot shared by every imported expense.
+    Any invalid row rejects the whole import, unless ?partial=true is given, in which
+    case the valid rows are imported and the invalid ones reported.
+    """
+    parser_classes = [JSONParser, CSVParser]
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    not_member_message = _("You are not a member of this group and cannot add expenses to it.")
+
+    def post(self, request, group_pk=None):
+        group = get_request_group(request, group_pk)
+        members = sorted(group.members.all(), key=lambda member: member.pk)
+
+        rows = request.data
+        if not isinstance(rows, (list, csv.DictReader)):
+            raise ValidationError({'detail': _("Expected a list of expenses.")})
+        partial = request.query_params.get('partial', '').lower() in ('true', '1')
+        max_rows = settings.BULK_IMPORT_MAX_ROWS
+        context = {'members_by_username': {member.username: member for member in members}}
+
+        expenses_to_create = []
+        errors = []
+        try:
+            for row_number, row in enumerate(rows, start=1):
+                if row_number > max_rows:
+                    raise ValidationError({'detail': _("A bulk import cannot contain more than %(max)d rows.") % {'max': max_rows}})
+                row_serializer = BulkExpenseRowSerializer(data=row, context=context)
+                if not row_serializer.is_valid():
+                    errors.append({'row': row_number, 'errors': row_serializer.errors})
+                    continue
+                expenses_to_create.append(Expense(
+                    group=group,
+                    description=row_serializer.validated_data['description'],
+                    amount=row_serializer.validated_data['amount'],
+                    paid_by=row_serializer.validated_data.get('paid_by') or request.user
+                ))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # CSV uploads are decoded and parsed lazily, while the rows are read.
+            raise ValidationError({'detail': _("The CSV upload could not be read: %(error)s") % {'error': exc}})
+
+        if errors and not partial:
+            return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_size = settings.BULK_IMPORT_BATCH_SIZE
+        with transaction.atomic():
+            # Equal splits among all members: every expense shares one snapshot, no split rows.
+            snapshot = get_membership_snapshot(group.pk, members) if expenses_to_create else None
+            balance_changes = BalanceChanges()
+            for start in range(0, len(expenses_to_create), batch_size):
+                batch = expenses_to_create[start:start + batch_size]
+                for expense in batch:
+                    expense.snapshot = snapshot
+                batch = Expense.objects.bulk_create(batch)
+                for expense, expense_splits in zip(batch, build_splits_batch([(expense, EQUAL, members, None) for expense in batch])):
+                    balance_changes.add_expense(expense, expense_splits)
+
+            if expenses_to_create:
+                balance_changes.save()
+                record_group_changes(group.pk, created_expenses=[expense.pk for expense in expenses_to_create])
+
+        return Response({'created': len(expenses_to_create), 'errors': errors}, status=status.HTTP_201_CREATED)
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    ?format= picks the export format, not a DRF renderer, so always negotiate JSON
+    (only used to render errors).
+    """
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+class ExpenseExportView(APIView):
+    """
+    Streams every expense of a group with its splits as CSV (one row per split)
+    or NDJSON (one expense per line). Rows are read from the database in chunks
+    and sent as they are produced, so memory use does not grow with the group.
+    """
+    content_negotiation_class = ExportContentNegotiation
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    not_member_message = _("You are not a member of this group and cannot export its expenses.")
+
+    def get(self, request, group_pk=None):
+        group = get_request_group(request, group_pk)
+
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'format': _("Format must be one of: csv, ndjson.")})
+        content_type, serialize = EXPORT_FORMATS[export_format]
+
+        rows = iter_export_rows(group.pk, settings.EXPORT_CHUNK_SIZE)
+        response = streaming_response(request, buffered(serialize(rows)), content_type)
+        response['Content-Disposition'] = f'attachment; filename="group-{group.pk}-expenses.{export_format}"'
+        return response
 
 class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ExpenseSerializer
     lookup_url_kwarg = 'expense_pk'
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
 
     def get_queryset(self):
-        group_pk = self.kwargs.get('group_pk')
-        group = get_object_or_404(Group, pk=group_pk)
-
-        if not group.members.filter(id=self.request.user.id).exists():
-            raise PermissionDenied(_("You are not a member of this group."))
-        
-        return Expense.objects.filter(group=group)
+        group = get_request_group(self.request, self.kwargs['group_pk'])
+        return expense_queryset(ExpenseSerializer.rendered_fields(self.request)).filter(group_id=group.pk)
     
     def perform_update(self, serializer):
-        expense_instance = self.get_object()
-        if expense_instance.paid_by != self.request.user:
+        expense_instance = serializer.instance
+        if expense_instance.paid_by_id != self.request.user.id:
             raise PermissionDenied(_("You do not have permission to edit this expense as you did not pay for it."))
         
-        serializer.save()
+        expense = serializer.save()
+        # The splits prefetched by get_object() may have been replaced, render a fresh copy.
+        serializer.instance = expense_queryset().get(pk=expense.pk)
 
     def perform_destroy(self, instance):
-        if instance.paid_by != self.request.user:
+        if instance.paid_by_id != self.request.user.id:
             raise PermissionDenied(_("You do not have permission to delete this expense as you did not pay for it."))
         
-        instance.delete()
-
-class SettleUpView(APIView):
+        with transaction.atomic():
+            expense = lock_expense(instance.pk)
+            if expense is None:
+                # Deleted by a concurrent request, which already updated the ledger.
+                return
+            balance_changes = BalanceChanges()
+            balance_changes.remove_expense(expense, expense.get_splits())
+            expense_id = expense.pk
+            _deleted, deleted_rows = expense.delete()
+            if not deleted_rows.get(Expense._meta.label):
+                return
+            balance_changes.save()
+            record_group_changes(expense.group_id, deleted_expenses=[expense_id])
+
+class SettleUpView(ReplicaReadMixin, APIView):
     """
     View for calculating and returning the optimized plan for payments for a specific group!
     It only accepts GET requests!
+    Plans are cached per group version and served with an ETag, so polling clients
+    sending If-None-Match get a 304 without the plan being recomputed.
+    ?mode=optimal asks for the exact minimum-transfer plan; the X-Settlement-Mode
+    header tells which mode actually produced it.
     """
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    not_member_message = _("You are not a member of this group and cannot view its settlement plan.")
+
     def get(self, request, group_pk=None):
-        group = get_object_or_404(Group, pk=group_pk)
-        user = request.user
+        mode = get_settlement_mode(request)
+        group = get_request_group(request, group_pk)
 
-        if not group.members.filter(id=user.id).exists():
-            raise PermissionDenied(_("You are not a member of this group and cannot view its settlement plan."))
-        
-        raw_settlements = calculate_optimized_settlements(group_pk)
-        enriched_settlements = []
-        user_ids_involved = set()
-        for settlement in raw_settlements:
-            user_ids_involved.add(settlement['from_user_id'])
-            user_ids_involved.add(settlement['to_user_id'])
-        
-        users_map = {user_obj.id: user_obj for user_obj in User.objects.filter(id__in=list(user_ids_involved))}
+        etag = settlement_etag(group, mode)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            record_cache_event('settlement_not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
-        for rs in raw_settlements:
-            from_user_obj = users_map.get(rs['from_user_id'])
-            to_user_obj = users_map.get(rs['to_user_id'])
-            if from_user_obj and to_user_obj:
-                enriched_settlements.append({
-                    'from_user': from_user_obj,
-                    'to_user': to_user_obj,
-                    'amount': rs['amount']
-                })
+        cached = get_cached_settlement(group, mode)
+        if cached is None:
+            cached = self.build_plan(group, mode)
+            set_cached_settlement(group, mode, cached)
+        plan, mode_used = cached
 
-        serializer = OptimizedSettlementSerializer(enriched_settlements, many=True)
+        return Response(plan, status=status.HTTP_200_OK, headers={'ETag': etag, 'X-Settlement-Mode': mode_used})
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def build_plan(self, group, mode):
+        raw_settlements, mode_used = calculate_settlement_plan(group.pk, mode)
+        users_map = {user_obj.id: user_obj for user_obj in User.objects.filter(id__in=settlement_user_ids(raw_settlements))}
+        return serialize_settlements(raw_settlements, users_map), mode_used
+
+class GroupChangesView(ReplicaReadMixin, APIView):
+    """
+    Delta sync: what changed in a group since a cursor.
+    Without ?since= only the current cursor is returned; take it before loading the
+    expense list, then poll with it. Each response carries the next cursor, the changed
+    expenses (with their splits) and members, and the ids of deleted expenses and
+    removed members. When nothing changed the response is an empty 204, which costs
+    only the group lookup.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsGroupMember]
+    not_member_message = _("You are not a member of this group and cannot sync its changes.")
+
+    def get(self, request, group_pk=None):
+        group = get_request_group(request, group_pk)
+        since = request.query_params.get('since')
+        if not since:
+            return Response({'cursor': encode_cursor(group.pk, group.version)}, status=status.HTTP_200_OK)
+
+        since = decode_cursor(group, since)
+        # A cursor ahead of the group comes from a more up-to-date database (a replica
+        # lagging behind the primary): nothing newer to send yet.
+        if since >= group.version:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        changes = changed_objects(group.pk, since, group.version)
+        expense_changes, member_changes = changes[GroupChange.EXPENSE], changes[GroupChange.MEMBER]
+        fields = ExpenseSerializer.rendered_fields(request)
+        expenses = list(expense_queryset(fields).filter(group_id=group.pk, pk__in=[pk for pk, deleted in expense_changes.items() if not deleted]).order_by('id'))
+        if 'splits' in fields:
+            prefetch_splits(expenses)
+        members = User.objects.filter(group_memberships=group, pk__in=[pk for pk, deleted in member_changes.items() if not deleted]).order_by('id')
+
+        return Response({
+            'cursor': encode_cursor(group.pk, group.version),
+            'expenses': ExpenseSerializer(expenses, many=True, context={'request': request}).data,
+            'deleted_expenses': sorted(pk for pk, deleted in expense_changes.items() if deleted),
+            'members': UserSerializer(members, many=True).data,
+            'removed_members': sorted(pk for pk, deleted in member_changes.items() if deleted),
+        }, status=status.HTTP_200_OK)
+
+class CacheStatsView(APIView):
+    """
+    Admin-only view exposing this process's cache hit/miss counters for scraping.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
+
+class SettleBatchView(APIView):
+    """
+    Admin-only: streams the settlement plans of the given groups (every group when
+    group_ids is omitted) as NDJSON, one group per line, as they are computed.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = SettleBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = iter_batch_settlement_lines(serializer.validated_data.get('group_ids'), serializer.validated_data['mode'])
+        return streaming_response(request, buffered(lines), 'application/x-ndjson')
 
 class ManageGroupMembersView(APIView):
     serializer_class = ManageGroupMemberSerializer
@@ -240,7 +593,10 @@ class ManageGroupMembersView(APIView):
             if group.members.filter(id=user_to_add.id).exists():
                 raise ValidationError({'detail': _("User is already a member of this group.")})
             
-            group.members.add(user_to_add)
+            with transaction.atomic():
+                group.members.add(user_to_add)
+                record_group_changes(group.pk, members=[user_to_add.pk])
+                invalidate_group_member_lists(group.pk)
             user_serializer = UserSerializer(user_to_add)
             return Response(
                 {'detail': _("User added successfully."), 'member': user_serializer.data},
@@ -265,7 +621,10 @@ class ManageGroupMembersView(APIView):
             if not group.members.filter(id=user_to_remove.id).exists():
                 raise ValidationError({'detail': _("User is not a member of this group")})
             
-            group.members.remove(user_to_remove)
+            with transaction.atomic():
+                invalidate_group_member_lists(group.pk)
+                group.members.remove(user_to_remove)
+                record_group_changes(group.pk, removed_members=[user_to_remove.pk])
 
             return Response({'detail': _("User removed successfully.")}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings. SERVER_INTERFACE picks how the app is served:
+
+- wsgi (default): core.wsgi with sync workers
+- asgi: core.asgi with uvicorn workers; GET settle-up, group list and expense list
+  are then served by async views (see ASYNC_READ_VIEWS in core/settings.py)
+
+    SERVER_INTERFACE=asgi gunicorn -c gunicorn.conf.py
+"""
+import os
+
+server_interface = os.environ.get('SERVER_INTERFACE', 'wsgi').lower()
+
+if server_interface == 'asgi':
+    wsgi_app = 'core.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'core.wsgi:application'
+    worker_class = 'sync'
+
+# Workers and bind address keep gunicorn's defaults, which honour $WEB_CONCURRENCY and $PORT.